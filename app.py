@@ -1,12 +1,25 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import json
-import time
 from datetime import datetime
 import re
-from io import StringIO
+import uuid
 import base64
+import importlib.util
+import io
+import time
+
+from bioinfo import metrics
+from bioinfo.analyzer import BioinformaticsAnalyzer
+from bioinfo.database import DEFAULT_DATABASE
+from bioinfo.align import DEFAULT_SCORING, Scoring
+from bioinfo.fastx import iter_records, parse_text
+from bioinfo.jobs import JobQueue
+from bioinfo.preprocess import SequenceError
+from bioinfo.export import MIME_TYPES, write_results
+from bioinfo.report import write_report
+from bioinfo.results import ResultSet
+from bioinfo.segments import current_snapshot
 
 # Configure Streamlit page
 st.set_page_config(
@@ -128,256 +141,136 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class BioinformaticsAnalyzer:
-    def __init__(self):
-        self.databases = {
-            'NCBI_GenBank': 'https://www.ncbi.nlm.nih.gov/nuccore/',
-            'Ensembl': 'https://www.ensembl.org/id/',
-            'dbSNP': 'https://www.ncbi.nlm.nih.gov/snp/',
-            'ClinVar': 'https://www.ncbi.nlm.nih.gov/clinvar/variation/',
-            'RefSeq': 'https://www.ncbi.nlm.nih.gov/refseq/',
-            'UniProt': 'https://www.uniprot.org/uniprot/',
-            'OMIM': 'https://www.omim.org/entry/'
-        }
-        
-        # Enhanced mock database with more comprehensive results
-        self.mock_results = [
-            {
-                'id': 1,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'NM_000546.6 (TP53 tumor protein p53)',
-                'similarity_score': 94.2,
-                'e_value': '3.2e-12',
-                'confidence': 'High',
-                'condition_association': 'Li-Fraumeni syndrome, Tumor predisposition',
-                'label': 'KNOWN',
-                'citations': {
-                    'clinvar_id': 'VCV000012345',
-                    'pubmed_pmid': '28123456',
-                    'genbank_accession': 'NM_000546.6',
-                    'ensembl_id': 'ENSG00000141510',
-                    'refseq_id': 'NM_000546.6',
-                    'uniprot_id': 'P04637',
-                    'omim_id': '191170'
-                },
-                'notes': 'Well-established tumor suppressor gene with extensive clinical validation and literature support',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '||||||||||||||||||||||||||||',
-                    'subject': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'identities': '26/27 (96%)',
-                    'gaps': '0/27 (0%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            },
-            {
-                'id': 2,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'NM_007294.4 (BRCA1 DNA repair associated)',
-                'similarity_score': 87.5,
-                'e_value': '1.8e-9',
-                'confidence': 'High',
-                'condition_association': 'Hereditary breast and ovarian cancer syndrome',
-                'label': 'KNOWN',
-                'citations': {
-                    'clinvar_id': 'VCV000067890',
-                    'pubmed_pmid': '29876543',
-                    'genbank_accession': 'NM_007294.4',
-                    'ensembl_id': 'ENSG00000012048',
-                    'refseq_id': 'NM_007294.4',
-                    'uniprot_id': 'P38398',
-                    'omim_id': '113705'
-                },
-                'notes': 'Critical DNA repair gene with established clinical significance in hereditary cancer syndromes',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '||||||||||||||||||||| ||||||',
-                    'subject': 'ATGCGATCGTAGCTAGCTAGCTGGCTAGC',
-                    'identities': '25/27 (93%)',
-                    'gaps': '0/27 (0%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            },
-            {
-                'id': 3,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'XM_024451234.1 (Novel transcript variant)',
-                'similarity_score': 76.3,
-                'e_value': '4.5e-6',
-                'confidence': 'Medium',
-                'condition_association': 'Potential neurological disorder association',
-                'label': 'PREDICTED',
-                'citations': {
-                    'genbank_accession': 'XM_024451234.1',
-                    'ensembl_id': 'ENSG00000198888',
-                    'refseq_id': 'XM_024451234.1'
-                },
-                'notes': 'Similarity-based prediction derived from sequence homology - experimental validation required',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '|||||| ||||||| |||||| ||||||',
-                    'subject': 'ATGCGACCGTAGCTGGCTAGCTGGCTAGC',
-                    'identities': '21/27 (78%)',
-                    'gaps': '0/27 (0%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            },
-            {
-                'id': 4,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'NM_001127222.2 (CFTR cystic fibrosis transmembrane conductance regulator)',
-                'similarity_score': 82.1,
-                'e_value': '2.1e-8',
-                'confidence': 'High',
-                'condition_association': 'Cystic fibrosis',
-                'label': 'KNOWN',
-                'citations': {
-                    'clinvar_id': 'VCV000045678',
-                    'pubmed_pmid': '31234567',
-                    'genbank_accession': 'NM_001127222.2',
-                    'ensembl_id': 'ENSG00000001626',
-                    'refseq_id': 'NM_001127222.2',
-                    'uniprot_id': 'P13569',
-                    'omim_id': '602421'
-                },
-                'notes': 'Well-characterized mutations associated with cystic fibrosis pathogenesis',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '|||||| ||||||||||||| |||||||',
-                    'subject': 'ATGCGACCGTAGCTAGCTAGCTGGCTAGC',
-                    'identities': '23/27 (85%)',
-                    'gaps': '0/27 (0%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            },
-            {
-                'id': 5,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'NR_046018.2 (XIST X inactive specific transcript)',
-                'similarity_score': 68.9,
-                'e_value': '8.7e-4',
-                'confidence': 'Low',
-                'condition_association': 'X-chromosome inactivation regulation',
-                'label': 'PREDICTED',
-                'citations': {
-                    'genbank_accession': 'NR_046018.2',
-                    'ensembl_id': 'ENSG00000229807',
-                    'refseq_id': 'NR_046018.2'
-                },
-                'notes': 'Low similarity match - may represent regulatory sequence similarity, requires further investigation',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '|||| | |||||| |||| | |||||| ',
-                    'subject': 'ATGCCACCGTAGCTGGCTACCGCTAGCTA',
-                    'identities': '18/27 (67%)',
-                    'gaps': '1/27 (4%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            },
-            {
-                'id': 6,
-                'input_sequence': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                'matched_sequence': 'NM_000038.6 (APC adenomatous polyposis coli)',
-                'similarity_score': 79.4,
-                'e_value': '6.3e-7',
-                'confidence': 'Medium',
-                'condition_association': 'Familial adenomatous polyposis, Colorectal cancer',
-                'label': 'KNOWN',
-                'citations': {
-                    'clinvar_id': 'VCV000098765',
-                    'pubmed_pmid': '32567890',
-                    'genbank_accession': 'NM_000038.6',
-                    'ensembl_id': 'ENSG00000134982',
-                    'refseq_id': 'NM_000038.6',
-                    'uniprot_id': 'P25054',
-                    'omim_id': '611731'
-                },
-                'notes': 'Tumor suppressor gene involved in Wnt signaling pathway regulation',
-                'alignment': {
-                    'query': 'ATGCGATCGTAGCTAGCTAGCTAGCTAGC',
-                    'match': '||||| |||||||||| |||| ||||||',
-                    'subject': 'ATGCGGTCGTAGCTAGCTGGCTAGCTAGC',
-                    'identities': '22/27 (81%)',
-                    'gaps': '0/27 (0%)',
-                    'strand': 'Plus/Plus',
-                    'frame': '+1'
-                }
-            }
-        ]
-
-    def analyze_sequence(self, sequence, similarity_threshold=0.8, evalue_threshold=1e-10, min_align_length=50):
-        """Simulate comprehensive sequence analysis with database cross-referencing"""
-        
-        # Filter results based on criteria
-        filtered_results = []
-        for result in self.mock_results:
-            similarity = result['similarity_score'] / 100
-            evalue = float(result['e_value'])
-            
-            if (similarity >= similarity_threshold and 
-                evalue <= evalue_threshold and
-                len(result['alignment']['query']) >= min_align_length):
-                filtered_results.append(result)
-        
-        # Sort by similarity score descending
-        filtered_results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        
-        return filtered_results
+# Initialize the analyzer
+@st.cache_resource(max_entries=2)
+def load_analyzer(snapshot):
+    return BioinformaticsAnalyzer(snapshot=snapshot)
 
-    def generate_citation_links(self, citations):
-        """Generate formatted citation links"""
-        links = []
-        
-        if 'clinvar_id' in citations:
-            links.append(f'<a href="{self.databases["ClinVar"]}{citations["clinvar_id"]}" target="_blank">ClinVar: {citations["clinvar_id"]}</a>')
-        if 'pubmed_pmid' in citations:
-            links.append(f'<a href="https://pubmed.ncbi.nlm.nih.gov/{citations["pubmed_pmid"]}" target="_blank">PubMed: {citations["pubmed_pmid"]}</a>')
-        if 'genbank_accession' in citations:
-            links.append(f'<a href="{self.databases["NCBI_GenBank"]}{citations["genbank_accession"]}" target="_blank">GenBank: {citations["genbank_accession"]}</a>')
-        if 'ensembl_id' in citations:
-            links.append(f'<a href="{self.databases["Ensembl"]}{citations["ensembl_id"]}" target="_blank">Ensembl: {citations["ensembl_id"]}</a>')
-        if 'refseq_id' in citations:
-            links.append(f'<a href="{self.databases["RefSeq"]}{citations["refseq_id"]}" target="_blank">RefSeq: {citations["refseq_id"]}</a>')
-        if 'uniprot_id' in citations:
-            links.append(f'<a href="{self.databases["UniProt"]}{citations["uniprot_id"]}" target="_blank">UniProt: {citations["uniprot_id"]}</a>')
-        if 'omim_id' in citations:
-            links.append(f'<a href="{self.databases["OMIM"]}{citations["omim_id"]}" target="_blank">OMIM: {citations["omim_id"]}</a>')
-        
-        return ', '.join(links)
+def get_analyzer():
+    # A segmented database's new snapshot gets a fresh analyzer on the next rerun; runs holding
+    # the previous analyzer finish on the snapshot they started with
+    return load_analyzer(current_snapshot(DEFAULT_DATABASE))
 
-    def format_structured_output(self, results):
-        """Format results according to specified output structure"""
-        formatted_output = []
-        
-        for result in results:
-            formatted_result = {
-                "Input Sequence": result['input_sequence'],
-                "Matched Sequence": result['matched_sequence'],
-                "Similarity Score": f"{result['similarity_score']}%",
-                "E-value": result['e_value'],
-                "Confidence": result['confidence'],
-                "Condition Association": result['condition_association'],
-                "Label": result['label'],
-                "Citations": self.generate_citation_links(result['citations']),
-                "Notes": result['notes']
-            }
-            formatted_output.append(formatted_result)
-        
-        return formatted_output
+analyzer = get_analyzer()
 
-# Initialize the analyzer
 @st.cache_resource
-def get_analyzer():
-    return BioinformaticsAnalyzer()
+def start_job_queue():
+    return JobQueue(analyzer).start()
 
-analyzer = get_analyzer()
+def get_job_queue():
+    job_queue = start_job_queue()
+    # Jobs started from now on use the live snapshot's analyzer
+    job_queue.analyzer = analyzer
+    return job_queue
+
+JOB_PRIORITIES = {"Low": -1, "Normal": 0, "High": 1}
+PAGE_SIZES = [10, 25, 50, 100]
+# Sort choices: display name -> (column, default ascending)
+SORT_COLUMNS = {
+    "Similarity": ('similarity_score', False),
+    "E-value": ('e_value', True),
+    "Bit Score": ('bit_score', False),
+    "Confidence": ('confidence', False),
+    "Query": ('query_id', True),
+}
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+def render_jobs(job_queue):
+    """Status, progress and actions for this session's background jobs"""
+    st.header("⏳ Background Jobs")
+    for job in reversed(job_queue.store.jobs(st.session_state['jobs'])):
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            st.write(f"**{job['name']}** · {job['status']} · {job['records_done']} records analyzed")
+            if job['status'] == 'running':
+                st.progress(job['progress'])
+            if job['error']:
+                st.error(job['error'])
+        with col2:
+            if job['records_done'] and st.button("Load results", key=f"load_{job['id']}"):
+                st.session_state['analysis'] = {'run_id': job['id'], 'results': job_queue.store.results(job['id']),
+                                                'sequence': job['name']}
+                st.rerun()
+        with col3:
+            if job['status'] in ('queued', 'running') and st.button("Cancel", key=f"cancel_{job['id']}"):
+                job_queue.store.cancel(job['id'])
 
 # Main application
+def deferred_export(write, *args):
+    """Download callable that runs write(*args, buffer) only when the button is clicked"""
+    def build():
+        buffer = io.BytesIO()
+        write(*args, buffer)
+        return buffer
+    return build
+
+
+def render_result_detail(analyzer, number, result):
+    """Metric cards, alignment, statistics and citations of one hit"""
+    with st.expander(f"Result {number}: {result['matched_sequence']}", expanded=True):
+        # Metrics
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.markdown(f'<div class="metric-card"><strong>Similarity Score</strong><br>{result["similarity_score"]}%</div>', unsafe_allow_html=True)
+        with col2:
+            st.markdown(f'<div class="metric-card"><strong>E-value</strong><br>{result["e_value"]:.1e}</div>', unsafe_allow_html=True)
+        with col3:
+            confidence_class = f"confidence-{result['confidence'].lower()}"
+            st.markdown(f'<div class="metric-card"><strong>Confidence</strong><br><span class="{confidence_class}">{result["confidence"]}</span></div>', unsafe_allow_html=True)
+        with col4:
+            label_class = f"label-{result['label'].lower()}"
+            st.markdown(f'<div class="metric-card"><strong>Evidence Level</strong><br><span class="{label_class}">{result["label"]}</span></div>', unsafe_allow_html=True)
+
+        # Sequence alignment
+        st.markdown("**Sequence Alignment:**")
+        alignment_html = f"""
+        <div class="alignment-view">
+            <div>Query:   {result['alignment']['query']}</div>
+            <div>        {result['alignment']['match']}</div>
+            <div>Subject: {result['alignment']['subject']}</div>
+        </div>
+        """
+        st.markdown(alignment_html, unsafe_allow_html=True)
+
+        # Alignment statistics
+        st.markdown("**Alignment Statistics:**")
+        st.write(f"• **Bit Score:** {result['bit_score']}")
+        st.write(f"• **Identities:** {result['alignment']['identities']}")
+        st.write(f"• **Gaps:** {result['alignment']['gaps']}")
+        st.write(f"• **Strand:** {result['alignment']['strand']}")
+        st.write(f"• **Frame:** {result['alignment']['frame']}")
+
+        # Condition association
+        st.markdown("**Condition Association:**")
+        st.write(f"**{result['condition_association']}**")
+        st.write(result['notes'])
+
+        # Citations
+        st.markdown("**Database Citations:**")
+        citation_html = f'<div class="citation-links">{analyzer.generate_citation_links(result["citations"])}</div>'
+        st.markdown(citation_html, unsafe_allow_html=True)
+
+        resolved = [xref for xref in result.get('xrefs', []) if xref['status'] == 'ok']
+        if resolved:
+            st.markdown("**Cross-References:**")
+            for xref in resolved:
+                st.write(f"• **{xref['source']} {xref['id']}:** {xref['summary']}")
+
+
+def render_metrics(run_metrics, render_seconds):
+    """Per-stage timing breakdown of the stored run, plus this rerun's render time"""
+    with st.expander("⏱️ Performance Breakdown", expanded=False):
+        rows = [{'Stage': stage, 'Seconds': round(seconds, 4), 'Calls': calls}
+                for stage, seconds, calls in metrics.breakdown(run_metrics)]
+        rows.append({'Stage': 'render (this rerun)', 'Seconds': round(render_seconds, 4), 'Calls': 1})
+        st.caption(f"Analysis wall time: {run_metrics['wall']:.3f} s. Stage times run in worker processes "
+                   "are summed, so they can exceed the wall time.")
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        if run_metrics['counters']:
+            st.write(" · ".join(f"**{name.replace('_', ' ').title()}:** {value:,}"
+                                for name, value in sorted(run_metrics['counters'].items())))
+
+
 def main():
     # Header
     st.markdown("""
@@ -397,16 +290,22 @@ def main():
         input_method = st.radio("Choose input method:", ["Text Input", "File Upload"])
         
         sequence = ""
+        records = None
         if input_method == "Text Input":
             sequence = st.text_area(
                 "Enter DNA/RNA sequence (FASTA format or raw sequence):",
-                placeholder=">Sample_Sequence\nATGCGATCGTAGCTAGCTAGCTAGCTAGC",
+                placeholder=">Sample_Sequence\nATGCGATCGTAGCTAGCTAGCTAGCTAGCGGCGGGACGAATGGACAACGACGGTTCTGTC",
                 height=150
             )
+            if sequence.strip():
+                records = parse_text(sequence)
         else:
-            uploaded_file = st.file_uploader("Upload FASTA file", type=['fasta', 'fa', 'fas', 'txt'])
+            uploaded_file = st.file_uploader(
+                "Upload FASTA/FASTQ file (optionally gzipped)",
+                type=['fasta', 'fa', 'fas', 'fna', 'fastq', 'fq', 'txt', 'gz']
+            )
             if uploaded_file is not None:
-                sequence = StringIO(uploaded_file.getvalue().decode("utf-8")).read()
+                records = iter_records(uploaded_file)
         
         st.subheader("Analysis Settings")
         
@@ -432,6 +331,9 @@ def main():
         """, unsafe_allow_html=True)
         
         min_align_length = st.number_input("Min Alignment Length", min_value=10, max_value=1000, value=50)
+        max_hits = st.number_input("Max Hits per Query", min_value=1, max_value=100000, value=100,
+                                   help="Only the best-scoring hits are aligned; extension stops early once "
+                                        "no remaining candidate can enter the top hits")
         
         st.markdown("""
         <div class="definition-box">
@@ -444,41 +346,130 @@ def main():
         st.markdown("""
         <div class="info-tooltip">
         <strong>Analysis Modes:</strong>
-        <br>• <strong>Comprehensive:</strong> Balanced speed and sensitivity
-        <br>• <strong>Fast Scan:</strong> Optimized for speed, may miss weak matches
-        <br>• <strong>High Sensitivity:</strong> Thorough search, slower but finds distant homologs
+        <br>• <strong>Comprehensive:</strong> Aligns every reference record sharing an exact 11-base seed with the query
+        <br>• <strong>Fast Scan:</strong> Ranks records by shared minimizers first and aligns only the closest 32; fastest, may miss weak matches
+        <br>• <strong>High Sensitivity:</strong> Adds spaced seeds that tolerate mismatches; slower but finds more distant homologs
+        </div>
+        """, unsafe_allow_html=True)
+        
+        with st.expander("Alignment Scoring"):
+            match_score = st.number_input("Match reward", min_value=1, max_value=10, value=DEFAULT_SCORING.match)
+            mismatch_score = st.number_input("Mismatch penalty", min_value=-10, max_value=-1, value=DEFAULT_SCORING.mismatch)
+            gap_open = st.number_input("Gap open cost", min_value=0, max_value=20, value=DEFAULT_SCORING.gap_open)
+            gap_extend = st.number_input("Gap extend cost", min_value=1, max_value=10, value=DEFAULT_SCORING.gap_extend)
+            
+            st.markdown("""
+            <div class="definition-box">
+            <strong>💡 Affine Gap Scoring:</strong> Aligned identical bases earn the match reward and differing bases pay the mismatch penalty. A gap of length L costs open + L × extend, so one long gap is cheaper than several short ones. The defaults (+2/-3, 5/2) match BLASTN.
+            </div>
+            """, unsafe_allow_html=True)
+        scoring = Scoring(match_score, mismatch_score, gap_open, gap_extend)
+        
+        search_strands = st.radio("Search Strands", ["Both strands", "Plus strand only"], horizontal=True)
+        translated_search = st.checkbox("Six-frame translated search")
+        mask_low_complexity = st.checkbox("Mask low-complexity regions (DUST)", value=True,
+                                          help="Simple repeats such as AGCTAGCT... are not used as seeds, "
+                                               "but are still aligned when a seed elsewhere reaches them.")
+        long_query = st.checkbox("Long-query mode (scaffolds, long reads)",
+                                 help="Searches each sequence in overlapping windows in parallel and joins hits "
+                                      "across window boundaries. Each hit reports the query region it covers.")
+        resolve_xrefs = st.checkbox("Resolve cross-references online", value=True)
+        run_in_background = st.checkbox("Run as background job")
+        if run_in_background:
+            job_priority = st.select_slider("Job priority", list(JOB_PRIORITIES), value="Normal")
+        
+        st.markdown("""
+        <div class="definition-box">
+        <strong>💡 Strands and Frames:</strong> Both-strand search also matches the reverse complement of your sequence (reported as Plus/Minus). Six-frame translated search translates all three forward and three reverse reading frames and compares them with the UniProt-linked protein entries using BLOSUM62, which can detect coding homologs whose DNA has diverged.
         </div>
         """, unsafe_allow_html=True)
         
         # Analysis button
         analyze_button = st.button("🔍 Analyze Sequence", type="primary", use_container_width=True)
 
+    batch_params = {
+        'similarity_threshold': similarity_threshold,
+        'evalue_threshold': evalue_options[evalue_threshold],
+        'min_align_length': min_align_length,
+        'scoring': scoring,
+        'strands': 'both' if search_strands == "Both strands" else 'plus',
+        'translated': translated_search,
+        'analysis_mode': analysis_mode,
+        'max_hits': max_hits,
+        'dust': mask_low_complexity,
+        'long_query': long_query
+    }
+
     # Main content area
-    if analyze_button and sequence.strip():
+    if analyze_button and records is not None and run_in_background:
+        job_queue = get_job_queue()
+        params = dict(batch_params, resolve_xrefs=resolve_xrefs)
+        if input_method == "Text Input":
+            job_id = job_queue.submit(params, text=sequence, name="Text input",
+                                      priority=JOB_PRIORITIES[job_priority])
+        else:
+            uploaded_file.seek(0)
+            job_id = job_queue.submit(params, stream=uploaded_file, name=uploaded_file.name,
+                                      priority=JOB_PRIORITIES[job_priority])
+        st.session_state.setdefault('jobs', []).append(job_id)
+    elif analyze_button and records is not None:
         # Show analysis progress
-        with st.spinner("Analyzing sequence and cross-referencing databases..."):
+        started = time.perf_counter()
+        with metrics.recording() as recorder, st.spinner("Analyzing sequence and cross-referencing databases..."):
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            # Simulate analysis steps
-            databases = ["NCBI GenBank", "Ensembl", "dbSNP", "ClinVar", "RefSeq", "UniProt", "OMIM"]
-            for i, db in enumerate(databases):
-                status_text.text(f"Querying {db}...")
-                progress_bar.progress((i + 1) / len(databases))
-                time.sleep(0.5)
+            # Perform analysis, streaming records through the worker pool
+            per_record = []
+            try:
+                for record_count, (index, record, record_results) in enumerate(
+                        analyzer.analyze_batch(metrics.timed_iter(records, 'parse'), **batch_params), 1):
+                    per_record.append((index, record_results))
+                    status_text.text(f"Analyzed {record_count} records...")
+                    if input_method != "Text Input" and uploaded_file.size:
+                        progress_bar.progress(min(uploaded_file.tell() / uploaded_file.size, 1.0))
+            except SequenceError as error:
+                st.error(f"Invalid sequence input: {error}")
+                st.stop()
+            per_record.sort(key=lambda item: item[0])
+            results = ResultSet.concat(record_results for _, record_results in per_record)
+            if input_method != "Text Input":
+                sequence = f"{uploaded_file.name} ({len(per_record)} records)"
             
-            # Perform analysis
-            results = analyzer.analyze_sequence(
-                sequence, 
-                similarity_threshold, 
-                evalue_options[evalue_threshold], 
-                min_align_length
-            )
+            # Resolve citation IDs against the source databases, one progress step per finished batch
+            if resolve_xrefs and results:
+                def xref_progress(done, total):
+                    status_text.text(f"Cross-referencing databases ({done}/{total} requests)...")
+                    progress_bar.progress(done / total if total else 1.0)
+                with metrics.timer('cross_reference'):
+                    xrefs = analyzer.xrefs.resolve_citations(results.frame['citations'], xref_progress)
+                results.set_column('xrefs', xrefs)
             
             progress_bar.empty()
             status_text.empty()
+        
+        run_metrics = None
+        if recorder is not None:
+            run_metrics = dict(recorder.snapshot(), wall=time.perf_counter() - started)
+            metrics.publish(run_metrics)
+        
+        # Keep the run so filter, search and export reruns only re-slice it
+        st.session_state['analysis'] = {'run_id': uuid.uuid4().hex, 'results': results, 'sequence': sequence,
+                                        'metrics': run_metrics}
+    elif analyze_button:
+        st.error("Please enter a sequence or upload a FASTA file to analyze.")
 
-        if results:
+    # Poll this session's jobs every two seconds while any of them is still active
+    if st.session_state.get('jobs'):
+        job_queue = get_job_queue()
+        active = any(job['status'] in ('queued', 'running') for job in job_queue.store.jobs(st.session_state['jobs']))
+        st.fragment(render_jobs, run_every=2 if active else None)(job_queue)
+
+    analysis = st.session_state.get('analysis')
+    render_started = time.perf_counter()
+    if analysis is not None:
+        results, sequence = analysis['results'], analysis['sequence']
+        if len(results):
             # Results summary
             st.header("📊 Analysis Results")
             
@@ -486,13 +477,13 @@ def main():
             with col1:
                 st.metric("Total Matches", len(results))
             with col2:
-                known_count = sum(1 for r in results if r['label'] == 'KNOWN')
+                known_count = results.count('label', 'KNOWN')
                 st.metric("Known Associations", known_count)
             with col3:
-                predicted_count = sum(1 for r in results if r['label'] == 'PREDICTED')
+                predicted_count = results.count('label', 'PREDICTED')
                 st.metric("Predicted Associations", predicted_count)
             with col4:
-                high_conf_count = sum(1 for r in results if r['confidence'] == 'High')
+                high_conf_count = results.count('confidence', 'High')
                 st.metric("High Confidence", high_conf_count)
 
             # Filters
@@ -507,129 +498,92 @@ def main():
                 search_term = st.text_input("Search in results", placeholder="Gene, condition, etc.")
 
             # Apply filters
-            filtered_results = results.copy()
-            if label_filter != "All":
-                filtered_results = [r for r in filtered_results if r['label'] == label_filter]
-            if confidence_filter != "All":
-                conf_levels = {"High": 3, "Medium": 2, "Low": 1}
-                min_level = conf_levels[confidence_filter]
-                filtered_results = [r for r in filtered_results if conf_levels[r['confidence']] >= min_level]
-            if search_term:
-                filtered_results = [r for r in filtered_results if 
-                                  search_term.lower() in r['matched_sequence'].lower() or 
-                                  search_term.lower() in r['condition_association'].lower()]
-
-            # Results table
+            filtered_results = results.filter(
+                label=label_filter if label_filter != "All" else None,
+                min_confidence=confidence_filter if confidence_filter != "All" else None,
+                search=search_term
+            )
+
+            # Results table: sorted and sliced server-side, so only one page is sent to the browser
             st.subheader("📋 Detailed Results")
             
-            if filtered_results:
-                # Create DataFrame for display
-                df_data = []
-                for result in filtered_results:
-                    df_data.append({
-                        "Matched Sequence": result['matched_sequence'],
-                        "Similarity (%)": result['similarity_score'],
-                        "E-value": result['e_value'],
-                        "Confidence": result['confidence'],
-                        "Condition": result['condition_association'],
-                        "Label": result['label']
-                    })
+            if len(filtered_results):
+                sort_col1, sort_col2, sort_col3, sort_col4 = st.columns(4)
+                with sort_col1:
+                    sort_label = st.selectbox("Sort by", list(SORT_COLUMNS))
+                with sort_col2:
+                    ascending = st.toggle("Ascending", value=SORT_COLUMNS[sort_label][1])
+                with sort_col3:
+                    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+                page_count = max(1, -(-len(filtered_results) // page_size))
+                if st.session_state.get('results_page', 1) > page_count:
+                    st.session_state['results_page'] = 1
+                with sort_col4:
+                    page = st.number_input("Page", min_value=1, max_value=page_count, key='results_page')
                 
-                df = pd.DataFrame(df_data)
-                st.dataframe(df, use_container_width=True)
+                page_results = filtered_results.sort_by(SORT_COLUMNS[sort_label][0], ascending).page(page, page_size)
+                first = (page - 1) * page_size + 1
+                df = page_results.table()
+                df.index = range(first, first + len(df))
+                selection = st.dataframe(
+                    df,
+                    use_container_width=True,
+                    column_config={"E-value": st.column_config.NumberColumn(format="%.1e")},
+                    on_select="rerun",
+                    selection_mode="multi-row",
+                    # A new page, sort or filter starts with an empty selection
+                    key=f"results_table_{hash((analysis['run_id'], label_filter, confidence_filter, search_term, sort_label, ascending, page_size, page))}"
+                )
+                st.caption(f"Page {page} of {page_count}: results {first}-{first + len(df) - 1} of "
+                           f"{len(filtered_results)}")
                 
-                # Detailed view for each result
+                # Alignment blocks and citations only for the selected rows
                 st.subheader("📖 Detailed Analysis")
-                
-                for i, result in enumerate(filtered_results):
-                    with st.expander(f"Result {i+1}: {result['matched_sequence']}", expanded=False):
-                        
-                        # Metrics
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.markdown(f'<div class="metric-card"><strong>Similarity Score</strong><br>{result["similarity_score"]}%</div>', unsafe_allow_html=True)
-                        with col2:
-                            st.markdown(f'<div class="metric-card"><strong>E-value</strong><br>{result["e_value"]}</div>', unsafe_allow_html=True)
-                        with col3:
-                            confidence_class = f"confidence-{result['confidence'].lower()}"
-                            st.markdown(f'<div class="metric-card"><strong>Confidence</strong><br><span class="{confidence_class}">{result["confidence"]}</span></div>', unsafe_allow_html=True)
-                        with col4:
-                            label_class = f"label-{result['label'].lower()}"
-                            st.markdown(f'<div class="metric-card"><strong>Evidence Level</strong><br><span class="{label_class}">{result["label"]}</span></div>', unsafe_allow_html=True)
-                        
-                        # Sequence alignment
-                        st.markdown("**Sequence Alignment:**")
-                        alignment_html = f"""
-                        <div class="alignment-view">
-                            <div>Query:   {result['alignment']['query']}</div>
-                            <div>        {result['alignment']['match']}</div>
-                            <div>Subject: {result['alignment']['subject']}</div>
-                        </div>
-                        """
-                        st.markdown(alignment_html, unsafe_allow_html=True)
-                        
-                        # Alignment statistics
-                        st.markdown("**Alignment Statistics:**")
-                        st.write(f"• **Identities:** {result['alignment']['identities']}")
-                        st.write(f"• **Gaps:** {result['alignment']['gaps']}")
-                        st.write(f"• **Strand:** {result['alignment']['strand']}")
-                        st.write(f"• **Frame:** {result['alignment']['frame']}")
-                        
-                        # Condition association
-                        st.markdown("**Condition Association:**")
-                        st.write(f"**{result['condition_association']}**")
-                        st.write(result['notes'])
-                        
-                        # Citations
-                        st.markdown("**Database Citations:**")
-                        citation_html = f'<div class="citation-links">{analyzer.generate_citation_links(result["citations"])}</div>'
-                        st.markdown(citation_html, unsafe_allow_html=True)
-
-                # Export options
+                selected_rows = selection.selection.rows
+                if not selected_rows:
+                    st.info("Select rows in the table to view their alignments and citations.")
+                for row in sorted(selected_rows):
+                    render_result_detail(analyzer, first + row, page_results[row])
+
+                # Export options: each file is written chunk by chunk when its button is clicked
                 st.subheader("📥 Export Results")
-                export_col1, export_col2, export_col3 = st.columns(3)
+                stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                exports = [("📄 Export JSONL", 'jsonl'), ("📊 Export CSV", 'csv')]
+                if PARQUET_AVAILABLE:
+                    exports.append(("🗃️ Export Parquet", 'parquet'))
+                export_columns = st.columns(len(exports) + 1)
                 
-                with export_col1:
-                    if st.button("📄 Export JSON", use_container_width=True):
-                        formatted_results = analyzer.format_structured_output(filtered_results)
-                        json_str = json.dumps(formatted_results, indent=2)
+                for column, (label, format) in zip(export_columns, exports):
+                    with column:
                         st.download_button(
-                            label="Download JSON",
-                            data=json_str,
-                            file_name=f"bioinformatics_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json"
+                            label=label,
+                            data=deferred_export(write_results, filtered_results, format),
+                            file_name=f"bioinformatics_results_{stamp}.{format}",
+                            mime=MIME_TYPES[format],
+                            on_click="ignore",
+                            use_container_width=True
                         )
                 
-                with export_col2:
-                    if st.button("📊 Export CSV", use_container_width=True):
-                        csv_data = df.to_csv(index=False)
-                        st.download_button(
-                            label="Download CSV",
-                            data=csv_data,
-                            file_name=f"bioinformatics_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
-                
-                with export_col3:
-                    if st.button("📋 Generate Report", use_container_width=True):
-                        # Generate comprehensive report
-                        report = generate_comprehensive_report(filtered_results, sequence)
-                        st.download_button(
-                            label="Download Report",
-                            data=report,
-                            file_name=f"bioinformatics_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                            mime="text/plain"
-                        )
+                with export_columns[-1]:
+                    st.download_button(
+                        label="📋 Generate Report",
+                        data=deferred_export(write_report, filtered_results, sequence),
+                        file_name=f"bioinformatics_report_{stamp}.txt",
+                        mime="text/plain",
+                        on_click="ignore",
+                        use_container_width=True
+                    )
             else:
                 st.warning("No results match the current filters.")
         else:
             st.warning("No significant matches found with the current parameters. Try adjusting the similarity threshold or E-value cutoff.")
+
+        if analysis.get('metrics'):
+            render_metrics(analysis['metrics'], time.perf_counter() - render_started)
     
-    elif analyze_button:
-        st.error("Please enter a sequence or upload a FASTA file to analyze.")
 
     # Information section
-    if not analyze_button:
+    if analysis is None:
         st.header("🔬 About BioinfoAnalyzer")
         
         col1, col2 = st.columns(2)
@@ -663,7 +617,7 @@ def main():
             st.subheader("Sample Input")
             st.code("""
 >Sample_Sequence
-ATGCGATCGTAGCTAGCTAGCTAGCTAGC
+ATGCGATCGTAGCTAGCTAGCTAGCTAGCGGCGGGACGAATGGACAACGACGGTTCTGTC
             """)
             
             st.subheader("Output Format")
@@ -690,67 +644,5 @@ ATGCGATCGTAGCTAGCTAGCTAGCTAGC
             • Low: Weak evidence, requires further investigation
             """)
 
-def generate_comprehensive_report(results, input_sequence):
-    """Generate a comprehensive text report"""
-    report = f"""
-BIOINFORMATICS ANALYSIS REPORT
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-INPUT SEQUENCE:
-{input_sequence}
-
-ANALYSIS SUMMARY:
-Total Matches: {len(results)}
-Known Associations: {sum(1 for r in results if r['label'] == 'KNOWN')}
-Predicted Associations: {sum(1 for r in results if r['label'] == 'PREDICTED')}
-
-DETAILED RESULTS:
-{'='*80}
-
-"""
-    
-    for i, result in enumerate(results, 1):
-        report += f"""
-Result {i}:
------------
-Input Sequence: {result['input_sequence']}
-Matched Sequence: {result['matched_sequence']}
-Similarity Score: {result['similarity_score']}%
-E-value: {result['e_value']}
-Confidence: {result['confidence']}
-Condition Association: {result['condition_association']}
-Label: {result['label']}
-
-Sequence Alignment:
-Query:   {result['alignment']['query']}
-         {result['alignment']['match']}
-Subject: {result['alignment']['subject']}
-
-Alignment Statistics:
-• Identities: {result['alignment']['identities']}
-• Gaps: {result['alignment']['gaps']}
-• Strand: {result['alignment']['strand']}
-• Frame: {result['alignment']['frame']}
-
-Citations:
-{analyzer.generate_citation_links(result['citations']).replace('<a href="', '').replace('" target="_blank">', ': ').replace('</a>', '')}
-
-Notes: {result['notes']}
-
-{'='*80}
-"""
-    
-    report += f"""
-
-DISCLAIMER:
-This tool performs comparative analysis and literature-backed associations only.
-No clinical claims are made. Experimental validation is required for PREDICTED results.
-All sources are cited and should be consulted for detailed information.
-
-Analysis completed using BioinfoAnalyzer v1.0
-"""
-    
-    return report
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""Reproducible benchmarks for the analysis, formatting, export and report paths.
+
+A synthetic reference (random records, about half of them annotated) and a
+query set are generated from a seed. Queries are reference fragments with
+substitution and indel errors, taken from either strand, plus a share of
+random non-matching sequences. Each case reports throughput, latency
+percentiles and the process's peak RSS so far. The analysis cases run once
+per analysis mode and also report recall: the share of sampled queries
+whose source record is among the hits. The long-query case searches one
+synthetic scaffold (random sequence with a reference record inserted every
+--long-query-length / 10 bases) in windows, once for every hit and once for
+the --top-hits best records per window. The search cases also report how
+many candidates got a gapped extension and how many the top-k bound skipped.
+
+    python benchmarks/bench.py --queries 200 --save-baseline baseline.json
+    python benchmarks/bench.py --queries 200 --baseline baseline.json
+
+With --baseline, any case whose throughput falls, or whose p50/p99 latency
+rises, by more than --tolerance is flagged, and the exit status is 1.
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bioinfo import metrics  # noqa: E402
+from bioinfo.analyzer import BioinformaticsAnalyzer  # noqa: E402
+from bioinfo.export import WRITERS, write_results  # noqa: E402
+from bioinfo.preprocess import dust_mask  # noqa: E402
+from bioinfo.report import generate_comprehensive_report  # noqa: E402
+from bioinfo.results import ResultSet  # noqa: E402
+from bioinfo.search import SEARCH_MODES  # noqa: E402
+from bioinfo.sequence import COMPLEMENT, encode_bases  # noqa: E402
+from bioinfo.synthetic import mutate, random_bases  # noqa: E402
+
+LATENCY_METRICS = ('p50_ms', 'p99_ms')
+# Search counters reported with the analysis cases
+SEARCH_COUNTERS = ('extensions', 'extensions_skipped')
+# Benchmark case name per analysis mode
+MODE_CASES = {'Comprehensive': 'analyze_sequence', 'Fast Scan': 'analyze_fast_scan',
+              'High Sensitivity': 'analyze_high_sensitivity'}
+
+
+def make_reference(directory, rng, records, record_length):
+    """Write reference.fasta and annotations.json; returns (fasta path, annotation path, sequences)"""
+    sequences, annotations = [], {}
+    fasta_path = os.path.join(directory, 'reference.fasta')
+    with open(fasta_path, 'wb') as handle:
+        for number in range(records):
+            name = f'SYN_{number:06d}.1'
+            bases = random_bases(rng, record_length)
+            sequences.append(bases)
+            handle.write(b'>' + name.encode() + b' synthetic record\n')
+            for start in range(0, record_length, 80):
+                handle.write(bases[start:start + 80].tobytes() + b'\n')
+            if number % 2 == 0:
+                annotations[name] = {
+                    'description': f'Synthetic gene {number}',
+                    'condition_association': f'Synthetic condition {number % 17}',
+                    'label': 'KNOWN' if number % 4 == 0 else 'PREDICTED',
+                    'citations': {'clinvar_id': f'VCV{number:09d}', 'pubmed_pmid': str(30000000 + number),
+                                  'genbank_accession': name, 'ensembl_id': f'ENSG{number:011d}',
+                                  'refseq_id': name, 'uniprot_id': f'Q{number:05d}', 'omim_id': str(100000 + number)},
+                    'notes': 'Synthetic benchmark record',
+                }
+    annotation_path = os.path.join(directory, 'annotations.json')
+    with open(annotation_path, 'w') as handle:
+        json.dump(annotations, handle)
+    return fasta_path, annotation_path, sequences
+
+
+def make_queries(rng, sequences, count, length, error_rate, random_fraction):
+    """(queries, source record index of each query, None for random ones)"""
+    queries, sources = [], []
+    for _ in range(count):
+        if rng.random() < random_fraction:
+            queries.append(random_bases(rng, length).tobytes().decode())
+            sources.append(None)
+            continue
+        number = int(rng.integers(len(sequences)))
+        source = sequences[number]
+        start = int(rng.integers(0, max(1, len(source) - length)))
+        fragment = mutate(rng, source[start:start + length], error_rate)
+        if rng.random() < 0.5:
+            fragment = COMPLEMENT[fragment][::-1]
+        queries.append(fragment.tobytes().decode())
+        sources.append(number)
+    return queries, sources
+
+
+def make_long_query(rng, sequences, length):
+    """Random bases with a copy of a random reference record every length // 10 bases"""
+    bases = random_bases(rng, length)
+    for start in range(length // 20, length, max(1, length // 10)):
+        source = sequences[int(rng.integers(len(sequences)))]
+        end = min(start + len(source), length)
+        bases[start:end] = source[:end - start]
+    return bases.tobytes().decode()
+
+
+def recall(collected, sources):
+    """Share of sampled queries whose source record is among their hits"""
+    found = [any(name.startswith(f'SYN_{source:06d}.') for name in results.frame['matched_sequence'])
+             for results, source in zip(collected, sources) if source is not None]
+    return round(sum(found) / len(found), 4) if found else None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def measure(function, items, repeat=1):
+    """Call function on every item, repeat times; returns (latencies in s, wall time in s)"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter()
+            function(item)
+            latencies.append(time.perf_counter() - t0)
+    return np.array(latencies), time.perf_counter() - started
+
+
+def measure_search(function, items):
+    """measure() under metrics recording; returns (latencies, wall time, SEARCH_COUNTERS totals)"""
+    with metrics.recording() as recorder:
+        latencies, wall = measure(function, items)
+    counters = recorder.snapshot()['counters'] if recorder else {}
+    return latencies, wall, {name: counters.get(name, 0) for name in SEARCH_COUNTERS}
+
+
+def summarize(latencies, wall, units=None, bases=None):
+    summary = {
+        'calls': len(latencies),
+        'per_s': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1e3, 3),
+        'p90_ms': round(float(np.percentile(latencies, 90)) * 1e3, 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1e3, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if units is not None:
+        summary['items_per_s'] = round(units / wall, 2)
+    if bases is not None:
+        summary['bases_per_s'] = round(bases / wall, 1)
+    return summary
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        fasta_path, annotation_path, sequences = make_reference(directory, rng, args.records, args.record_length)
+        queries, sources = make_queries(rng, sequences, args.queries, args.query_length, args.error_rate,
+                                        args.random_fraction)
+
+        started = time.perf_counter()
+        analyzer = BioinformaticsAnalyzer(fasta_path, annotation_path, protein_path=None,
+                                          database_path=os.path.join(directory, 'missing.bdb'), cache_path=None)
+        analyzer.cache.memory_entries = 0
+        cases = {'load_reference': {'seconds': round(time.perf_counter() - started, 3), 'peak_rss_mb': peak_rss_mb()}}
+
+        codes = [encode_bases(query) for query in queries]
+        latencies, wall = measure(dust_mask, codes, args.repeat)
+        cases['dust_mask'] = summarize(latencies, wall, bases=sum(map(len, codes)) * args.repeat)
+
+        params = (args.similarity, args.evalue, args.min_length)
+        for mode in ['Comprehensive'] + [mode for mode in args.modes if mode != 'Comprehensive']:
+            collected = []
+            latencies, wall, counters = measure_search(lambda query: collected.append(
+                analyzer.analyze_sequence(query, *params, analysis_mode=mode)), queries)
+            case = MODE_CASES[mode]
+            cases[case] = summarize(latencies, wall, bases=sum(map(len, queries)))
+            cases[case].update(counters)
+            cases[case]['hits'] = sum(map(len, collected))
+            cases[case]['recall'] = recall(collected, sources)
+            if mode == 'Comprehensive':
+                results = ResultSet.concat(collected)
+
+        if args.long_query_length:
+            long_query = make_long_query(rng, sequences, args.long_query_length)
+            for case, max_hits in (('analyze_long_sequence', None), ('analyze_long_sequence_top', args.top_hits)):
+                collected = []
+                latencies, wall, counters = measure_search(lambda query: collected.extend(
+                    analyzer.analyze_long_sequence(query, *params, max_hits=max_hits)), [long_query])
+                cases[case] = summarize(latencies, wall, bases=len(long_query))
+                cases[case]['hits'] = sum(map(len, collected))
+                cases[case].update(counters)
+
+        if len(results):
+            latencies, wall = measure(analyzer.format_structured_output, [results], args.repeat)
+            cases['format_structured_output'] = summarize(latencies, wall, units=len(results) * args.repeat)
+
+            citations = list(results.frame['citations'])
+            latencies, wall = measure(analyzer.generate_citation_links, citations, args.repeat)
+            cases['generate_citation_links'] = summarize(latencies, wall)
+
+            latencies, wall = measure(lambda rs: generate_comprehensive_report(rs, 'benchmark queries'),
+                                      [results], args.repeat)
+            cases['generate_comprehensive_report'] = summarize(latencies, wall, units=len(results) * args.repeat)
+
+            for format in WRITERS:
+                if format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+                    continue
+                latencies, wall = measure(lambda rs: write_results(rs, format, io.BytesIO()), [results], args.repeat)
+                cases[f'export_{format}'] = summarize(latencies, wall, units=len(results) * args.repeat)
+
+    return {
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('baseline', 'save_baseline', 'tolerance')},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'cases': cases,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """List of regression messages for cases present in both runs"""
+    regressions = []
+    if baseline.get('config') != report['config']:
+        print('warning: baseline was recorded with a different configuration', file=sys.stderr)
+    for case, current in report['cases'].items():
+        previous = baseline.get('cases', {}).get(case)
+        if not previous:
+            continue
+        if previous.get('per_s') and current.get('per_s') is not None:
+            if current['per_s'] < previous['per_s'] * (1 - tolerance):
+                regressions.append(f"{case}: throughput {current['per_s']}/s vs baseline {previous['per_s']}/s")
+        for metric in LATENCY_METRICS:
+            if previous.get(metric) and current.get(metric, 0) > previous[metric] * (1 + tolerance):
+                regressions.append(f'{case}: {metric} {current[metric]} vs baseline {previous[metric]}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the BioinfoAnalyzer engine on synthetic data')
+    parser.add_argument('--records', type=int, default=200, help='synthetic reference records')
+    parser.add_argument('--record-length', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--query-length', type=int, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.05, help='per-base error rate of sampled queries')
+    parser.add_argument('--random-fraction', type=float, default=0.2, help='share of non-matching queries')
+    parser.add_argument('--similarity', type=float, default=0.8)
+    parser.add_argument('--evalue', type=float, default=1e-10)
+    parser.add_argument('--min-length', type=int, default=50)
+    parser.add_argument('--long-query-length', type=int, default=50_000,
+                        help='length of the long-query case scaffold (0 skips it)')
+    parser.add_argument('--top-hits', type=int, default=1,
+                        help='records kept per window by the top-k long-query case')
+    parser.add_argument('--modes', nargs='+', default=list(SEARCH_MODES), choices=list(SEARCH_MODES),
+                        help='analysis modes to time (Comprehensive always runs)')
+    parser.add_argument('--repeat', type=int, default=20, help='repetitions of the formatting/report cases')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', help='compare against this baseline JSON')
+    parser.add_argument('--save-baseline', help='write this run as a baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative slowdown (default 0.10)')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
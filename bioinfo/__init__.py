@@ -0,0 +1,20 @@
+"""Sequence search engine behind the BioinfoAnalyzer Streamlit app.
+
+The top-level names are imported lazily, so `import bioinfo` stays cheap and
+never pulls in Streamlit.
+"""
+
+_EXPORTS = {
+    'BioinformaticsAnalyzer': 'analyzer',
+    'ResultSet': 'results',
+    'generate_comprehensive_report': 'report',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
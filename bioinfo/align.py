@@ -0,0 +1,315 @@
+"""Banded affine-gap pairwise alignment vectorized with NumPy.
+
+Candidates are seed diagonals. Each one is aligned inside a band of +/- band
+diagonals around its seed, and all candidates for a query are filled
+together: one NumPy step per query base updates a (candidates x band) slab.
+The horizontal-gap dependency inside a row is resolved with a prefix-max
+scan, so no step loops over cells. Scoring is two-pass. Every candidate is
+scored first, and traceback matrices are only kept for the few alignments
+that will actually be reported. ungapped_scores is the cheap X-drop
+extension along a seed's diagonal that decides which candidates are worth
+the banded fill.
+
+A gap of length L costs gap_open + L * gap_extend. Local mode is
+Smith-Waterman. Global mode is Needleman-Wunsch end-to-end in the query,
+with free leading and trailing subject overhangs.
+"""
+import numpy as np
+
+from .sequence import BASES, PackedSequence, match_line
+
+NEG = -(1 << 28)
+PAD = 254
+GAP = ord('-')
+
+
+class Scoring:
+    """Nucleotide scoring scheme with affine gap costs
+
+    matrix is a 256 x 256 substitution lookup indexed by (query code,
+    subject code); the PAD column scores NEG so alignments never leave the
+    subject. xdrop_bits and gap_trigger_bits are the ungapped X-drop and the
+    ungapped score a candidate needs before gapped extension, in bits
+    (BLASTN's defaults).
+    """
+
+    xdrop_bits = 20
+    gap_trigger_bits = 27
+
+    def __init__(self, match=2, mismatch=-3, gap_open=5, gap_extend=2):
+        self.match = int(match)
+        self.mismatch = int(mismatch)
+        self.gap_open = int(gap_open)
+        self.gap_extend = int(gap_extend)
+        self.matrix = np.full((256, 256), self.mismatch, dtype=np.int32)
+        self.matrix[np.arange(4), np.arange(4)] = self.match
+        self.matrix[:, PAD] = NEG
+
+    def as_tuple(self):
+        return (self.match, self.mismatch, self.gap_open, self.gap_extend)
+
+    def __eq__(self, other):
+        return isinstance(other, Scoring) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return 'Scoring(match={}, mismatch={}, gap_open={}, gap_extend={})'.format(*self.as_tuple())
+
+
+DEFAULT_SCORING = Scoring()
+
+
+def subject_window(subject, start, end):
+    """Codes for subject[start:end], padded with PAD where the range leaves the sequence"""
+    window = np.full(end - start, PAD, dtype=np.uint8)
+    lo, hi = max(start, 0), min(end, len(subject))
+    if lo < hi:
+        window[lo - start:hi - start] = subject.codes(lo, hi)
+    return window
+
+
+def ungapped_scores(query_codes, windows, anchors, scoring, xdrop, band=16, step=32):
+    """Best ungapped score through each anchor on its window's central diagonal (ungapped X-drop)
+
+    anchors[c] is a query position on candidate c's diagonal (a seed start).
+    The diagonal is extended right from it and left from the position
+    before it, step columns at a time. Each direction stops at the first
+    column where its running score falls more than xdrop below its best,
+    or where it leaves the query or the subject, and contributes its best.
+    """
+    m = len(query_codes)
+    total = np.zeros(len(windows), dtype=np.int64)
+    offsets = np.arange(step)
+    for direction in (1, -1):
+        position = anchors.astype(np.int64) - (direction < 0)
+        running = np.zeros(len(windows), dtype=np.int64)
+        best = np.zeros(len(windows), dtype=np.int64)
+        alive = np.flatnonzero((position >= 0) & (position < m))
+        while len(alive):
+            columns = position[alive, None] + direction * offsets
+            inside = (columns >= 0) & (columns < m)
+            columns = np.clip(columns, 0, m - 1)
+            sub = scoring.matrix[query_codes[columns], windows[alive[:, None], columns + band]].astype(np.int64)
+            sub[~inside] = NEG
+            path = running[alive, None] + np.cumsum(sub, axis=1)
+            peak = np.maximum(np.maximum.accumulate(path, axis=1), best[alive, None])
+            dropped = path < peak - xdrop
+            stopped = dropped.any(axis=1)
+            # peak never falls, and the first dropped column is below it, so it holds the best before the drop
+            best[alive] = peak[np.arange(len(alive)), np.where(stopped, dropped.argmax(axis=1), step - 1)]
+            running[alive] = path[:, -1]
+            position[alive] += direction * step
+            alive = alive[~stopped]
+        total += best
+    return total
+
+
+def _banded_dp(query_codes, windows, scoring, band, local, trace, min_score=None, prune_every=16):
+    """Fill the band for every candidate; optionally keep traceback matrices
+
+    With min_score (local, score-only mode), candidates whose best possible
+    final score falls below it are dropped from the slab every prune_every
+    rows and reported with score NEG. In local mode only the rows whose band
+    reaches some candidate's subject are filled: before them every cell is
+    padding, after them no score can improve. Traceback matrices hold those
+    rows only, from row first_row on.
+
+    Padding outside the subject scores NEG. A local alignment may still
+    start fresh on the subject's first base, so the diagonal step takes
+    its predecessor floored at 0. In global mode the padding before the
+    subject is the matrix's first column: the query bases so far are one
+    leading gap.
+    """
+    m = len(query_codes)
+    n_cand, width = windows.shape[0], 2 * band + 1
+    # Per candidate, the window columns holding subject bases are [starts, ends)
+    subject = windows != PAD
+    starts = subject.argmax(axis=1)
+    ends = windows.shape[1] - subject[:, ::-1].argmax(axis=1)
+    first_row, last_row = 0, m
+    if local:
+        # Start on an all-padding row, so the first filled row sees NEG above it as before
+        first_row, last_row = max(0, int(starts.min()) - width), min(m, int(ends.max()))
+    prune = min_score is not None and local and not trace
+    alive = np.arange(n_cand)
+    final = np.full(n_cand, NEG, dtype=np.int32)
+    go, ge = scoring.gap_open, scoring.gap_extend
+    ramp = ge * np.arange(width, dtype=np.int32)
+    columns = np.arange(width)
+
+    h_prev = np.zeros((n_cand, width), dtype=np.int32)
+    f_prev = np.full((n_cand, width), NEG, dtype=np.int32)
+    best = np.full(n_cand, NEG, dtype=np.int32)
+    best_row = np.zeros(n_cand, dtype=np.int64)
+    best_col = np.zeros(n_cand, dtype=np.int64)
+    neg_col = np.full((n_cand, 1), NEG, dtype=np.int32)
+    if trace:
+        rows = max(last_row - first_row, 0)
+        h0_src = np.zeros((rows, n_cand, width), dtype=np.uint8)
+        from_e = np.zeros((rows, n_cand, width), dtype=bool)
+        f_ext = np.zeros((rows, n_cand, width), dtype=bool)
+        e_arg = np.zeros((rows, n_cand, width), dtype=np.int16)
+
+    for i in range(first_row, last_row):
+        window = windows[:, i:i + width]
+        sub = scoring.matrix[query_codes[i]][window]
+        padded = window == PAD
+
+        diag = (np.maximum(h_prev, 0) if local else h_prev) + sub
+        f_open = np.concatenate([h_prev[:, 1:], neg_col], axis=1) - (go + ge)
+        f_extend = np.concatenate([f_prev[:, 1:], neg_col], axis=1) - ge
+        f = np.maximum(f_open, f_extend)
+        h0 = np.maximum(diag, f)
+        if local:
+            h0 = np.maximum(h0, 0)
+        else:
+            leading = i + columns < starts[:, None]
+            h0[leading] = -(go + (i + 1) * ge)
+            padded &= ~leading
+
+        shifted = h0 + ramp
+        running = np.maximum.accumulate(shifted, axis=1)
+        e = np.full((n_cand, width), NEG, dtype=np.int32)
+        e[:, 1:] = running[:, :-1] - go - ramp[1:]
+        h = np.maximum(h0, e)
+        h[padded] = NEG
+        f[padded] = NEG
+        np.maximum(h, NEG, out=h)
+        np.maximum(f, NEG, out=f)
+
+        if trace:
+            src = np.where(h0 == diag, 1, np.where(h0 == f, 2, 0)).astype(np.uint8)
+            if local:
+                src[h0 <= 0] = 0
+            row = i - first_row
+            h0_src[row] = src
+            from_e[row] = e > h0
+            f_ext[row] = f_extend > f_open
+            arg = np.maximum.accumulate(np.where(shifted == running, columns, 0), axis=1)
+            e_arg[row, :, 1:] = arg[:, :-1]
+
+        if local or i == m - 1:
+            row_best = h.argmax(axis=1)
+            row_score = h[np.arange(n_cand), row_best]
+            improved = row_score > best
+            best = np.where(improved, row_score, best)
+            best_row = np.where(improved, i, best_row)
+            best_col = np.where(improved, row_best, best_col)
+        h_prev, f_prev = h, f
+
+        if prune and i % prune_every == prune_every - 1 and i < m - 1:
+            # A local alignment can still start afresh at 0 (e.g. after leading padding), and can
+            # only gain on the remaining rows that reach the subject
+            remaining = np.maximum(np.minimum(m, ends) - 1 - i, 0)
+            bound = np.maximum(best, np.maximum(h.max(axis=1), 0) + scoring.match * remaining)
+            viable = bound >= min_score
+            if not viable.all():
+                alive, windows, ends = alive[viable], windows[viable], ends[viable]
+                h_prev, f_prev = h_prev[viable], f_prev[viable]
+                best, best_row, best_col = best[viable], best_row[viable], best_col[viable]
+                n_cand = len(alive)
+                neg_col = neg_col[:n_cand]
+                if not n_cand:
+                    break
+
+    if prune:
+        final[alive] = best
+        best = final
+    traceback = (h0_src, from_e, f_ext, e_arg, first_row) if trace else None
+    return best, best_row, best_col, traceback
+
+
+def band_scores(query_codes, windows, scoring=DEFAULT_SCORING, band=16, local=True, min_score=None):
+    """Best alignment score per candidate window (no traceback)
+
+    Candidates that provably cannot reach min_score are abandoned part-way
+    through the fill and scored NEG.
+    """
+    if not len(windows) or not len(query_codes):
+        return np.empty(0, dtype=np.int32)
+    return _banded_dp(query_codes, windows, scoring, band, local, trace=False, min_score=min_score)[0]
+
+
+def band_alignments(query_codes, windows, scoring=DEFAULT_SCORING, band=16, local=True):
+    """Align each candidate window and return (score, query_index, window_index) per candidate
+
+    query_index / window_index give, column by column, the aligned position in
+    the query and in the window, with -1 marking a gap.
+    """
+    if not len(windows) or not len(query_codes):
+        return []
+    best, best_row, best_col, (h0_src, from_e, f_ext, e_arg, first_row) = _banded_dp(
+        query_codes, windows, scoring, band, local, trace=True)
+
+    alignments = []
+    for c in range(len(windows)):
+        q_idx, s_idx = [], []
+        i, k, state = int(best_row[c]), int(best_col[c]), 'H'
+        while i >= first_row:
+            if state == 'H':
+                if from_e[i - first_row, c, k]:
+                    origin = int(e_arg[i - first_row, c, k])
+                    for col in range(k, origin, -1):
+                        q_idx.append(-1)
+                        s_idx.append(i + col)
+                    k = origin
+                state = 'H0'
+            if state == 'H0':
+                src = h0_src[i - first_row, c, k]
+                if src == 0:
+                    break
+                if src == 1:
+                    q_idx.append(i)
+                    s_idx.append(i + k)
+                    i -= 1
+                    state = 'H'
+                    continue
+                state = 'F'
+            q_idx.append(i)
+            s_idx.append(-1)
+            state = 'F' if f_ext[i - first_row, c, k] else 'H'
+            i, k = i - 1, k + 1
+        if not local:
+            # Stopped in the padding before the subject: the rest of the query is a leading gap
+            q_idx.extend(range(i, -1, -1))
+            s_idx.extend([-1] * (i + 1))
+        alignments.append((int(best[c]), np.array(q_idx[::-1], dtype=np.int64),
+                           np.array(s_idx[::-1], dtype=np.int64)))
+    return alignments
+
+
+def alignment_block(query, subject, query_index, subject_index, strand='Plus/Plus'):
+    """Build the result 'alignment' fields from aligned query/subject positions
+
+    Returns (alignment dict, identities, alignment length). The query and
+    subject rows are PackedSequence objects with '-' for gap columns. A
+    nucleotide alignment has no reading frame, so 'frame' is 'N/A'; only
+    translated hits carry one.
+    """
+    q_aligned, s_aligned = query_index >= 0, subject_index >= 0
+    q_lo, q_hi = query_index[q_aligned].min(), query_index[q_aligned].max() + 1
+    s_lo, s_hi = subject_index[s_aligned].min(), subject_index[s_aligned].max() + 1
+
+    q_symbols = np.full(len(query_index), GAP, dtype=np.uint8)
+    s_symbols = np.full(len(subject_index), GAP, dtype=np.uint8)
+    q_symbols[q_aligned] = np.frombuffer(query.decode(q_lo, q_hi).encode('ascii'),
+                                         dtype=np.uint8)[query_index[q_aligned] - q_lo]
+    s_symbols[s_aligned] = np.frombuffer(subject.decode(s_lo, s_hi).encode('ascii'),
+                                         dtype=np.uint8)[subject_index[s_aligned] - s_lo]
+
+    matches = (q_symbols == s_symbols) & np.isin(q_symbols, BASES)
+    length = len(query_index)
+    identities = int(matches.sum())
+    gaps = int(length - (q_aligned & s_aligned).sum())
+    block = {
+        'query': PackedSequence.encode(q_symbols.tobytes()),
+        'match': match_line(matches),
+        'subject': PackedSequence.encode(s_symbols.tobytes()),
+        'identities': f"{identities}/{length} ({round(100 * identities / length)}%)",
+        'gaps': f"{gaps}/{length} ({round(100 * gaps / length)}%)",
+        'strand': strand,
+        'frame': 'N/A'
+    }
+    return block, identities, length
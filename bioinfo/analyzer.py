@@ -0,0 +1,242 @@
+"""Headless analysis API: BioinformaticsAnalyzer and its structured output.
+
+Nothing here imports Streamlit. The Streamlit app, the bioinfo-analyze CLI,
+background jobs and pipelines all share this one analyzer. The HTTP
+cross-reference fetcher is only imported the first time it is used.
+"""
+import pandas as pd
+
+from . import metrics
+from .align import DEFAULT_SCORING, alignment_block
+from .batch import run_batch
+from .cache import DEFAULT_CACHE, ResultCache, cache_key
+from .citations import DATABASES, citation_links
+from .database import DEFAULT_DATABASE, file_version, is_current, load_database
+from .fastx import FastxRecord, as_packed
+from .longquery import LONG_QUERY_OVERLAP, LONG_QUERY_WINDOW, HitChainer, query_windows, window_hits
+from .reference import DEFAULT_ANNOTATIONS, DEFAULT_REFERENCE, ReferenceDatabase
+from .results import ResultSet
+from .search import SearchEngine
+from .segments import SegmentedEngine, is_segmented
+from .sequence import decode_shared
+from .shard import DEFAULT_SHARDS, ShardedEngine
+from .stats import karlin_altschul
+from .translate import DEFAULT_PROTEIN_SCORING, DEFAULT_PROTEINS, load_proteins, protein_alignment_block
+
+
+class BioinformaticsAnalyzer:
+    def __init__(self, reference_path=DEFAULT_REFERENCE, annotation_path=DEFAULT_ANNOTATIONS,
+                 protein_path=DEFAULT_PROTEINS, database_path=DEFAULT_DATABASE, cache_path=DEFAULT_CACHE,
+                 shards=DEFAULT_SHARDS, snapshot=None):
+        self.databases = DATABASES
+
+        # Search shard servers if given, or a segmented database directory (snapshot: its live one by
+        # default); otherwise prefer the prebuilt memory-mapped database, and index the FASTA in memory
+        # if it is missing or stale
+        if shards or is_segmented(database_path):
+            self.engine = ShardedEngine(shards) if shards else SegmentedEngine(database_path, snapshot)
+            self.reference = self.engine.reference
+            self.db_version = self.engine.version
+        elif is_current(database_path, reference_path, annotation_path, protein_path):
+            database = load_database(database_path)
+            self.reference = database.reference
+            self.engine = SearchEngine(self.reference, proteins=database.proteins, index=database.index,
+                                       protein_index=database.protein_index, sketch=database.sketch)
+            self.db_version = database.version
+        else:
+            self.reference = ReferenceDatabase.from_fasta(reference_path, annotation_path)
+            self.engine = SearchEngine(self.reference, proteins=load_proteins(protein_path))
+            self.db_version = file_version(reference_path, annotation_path, protein_path)
+        self.uniprot_records = self.reference.records_by_citation('uniprot_id')
+        self.cache = ResultCache(self.db_version, cache_path)
+        self._xrefs = None
+
+    @property
+    def xrefs(self):
+        """CrossReferenceFetcher, created on first use"""
+        if self._xrefs is None:
+            from .xref import CrossReferenceFetcher
+            self._xrefs = CrossReferenceFetcher()
+        return self._xrefs
+
+    @staticmethod
+    def confidence_level(similarity_score):
+        if similarity_score >= 80:
+            return 'High'
+        if similarity_score >= 70:
+            return 'Medium'
+        return 'Low'
+
+    def analyze_sequence(self, sequence, similarity_threshold=0.8, evalue_threshold=1e-10, min_align_length=50,
+                         scoring=DEFAULT_SCORING, strands='both', translated=False, analysis_mode='Comprehensive',
+                         max_hits=None, dust=True):
+        """Seed-and-extend search of one query record against the local reference database
+
+        sequence may be a parsed FastxRecord, a PackedSequence or pasted text
+        (FASTA or raw); pasted text contributes its first record. strands is
+        'both' or 'plus'; translated adds a six-frame search against the
+        UniProt-linked protein index. analysis_mode picks the candidate set
+        (see search.SEARCH_MODES): Fast Scan extends only the records with
+        the best minimizer-sketch containment, High Sensitivity adds spaced
+        seeds. max_hits keeps only the best-scoring
+        max_hits records of each search and at most max_hits results overall,
+        so repeat-rich queries do bounded work. dust keeps low-complexity
+        regions of the query out of seeding. Results are cached by sequence
+        digest, parameters and database version.
+        """
+        query = as_packed(sequence)
+        query_id = sequence.name if isinstance(sequence, FastxRecord) else 'query'
+        params = (similarity_threshold, evalue_threshold, min_align_length, analysis_mode, scoring, strands,
+                  translated, max_hits, dust)
+        key = cache_key(query.digest(), params, self.db_version)
+        results = self.cache.get(key)
+        metrics.count('cache_misses' if results is None else 'cache_hits')
+        if results is None:
+            results = self._search(query, similarity_threshold, evalue_threshold, min_align_length, scoring,
+                                   strands, translated, max_hits, analysis_mode, dust)
+            self.cache.put(key, results)
+        return results.with_query(query_id, query)
+
+    def _search(self, query, similarity_threshold, evalue_threshold, min_align_length, scoring, strands,
+                translated, max_hits=None, analysis_mode='Comprehensive', dust=True):
+        """Filtered ResultSet for one packed query, sorted by similarity, without the per-call query fields"""
+        hits = self.engine.search(query, scoring, evalue_threshold, strands, max_hits, analysis_mode, dust)
+        if translated:
+            hits += self.engine.search_translated(query, evalue_threshold=evalue_threshold, max_hits=max_hits)
+        with metrics.timer('format'):
+            matches = [self._match(hit) for hit in hits]
+            results = self._result_set(matches, similarity_threshold, evalue_threshold, min_align_length)
+        return results if max_hits is None else results.page(1, max_hits)
+
+    def _match(self, hit):
+        """(record index or None, matched name, hit, alignment, identities, columns, query bases covered)"""
+        if 'record' in hit:
+            alignment, identities, length = alignment_block(
+                hit['query'], hit['subject'], hit['query_index'], hit['subject_index'], hit['strand'])
+            return hit['record'], self.reference.names[hit['record']], hit, alignment, identities, length, length
+        uniprot_id = self.engine.protein_names[hit['protein']]
+        alignment, identities, length = protein_alignment_block(
+            hit['query'], hit['subject'], hit['query_index'], hit['subject_index'], hit['frame'])
+        return self.uniprot_records.get(uniprot_id), uniprot_id, hit, alignment, identities, length, 3 * length
+
+    def _result_set(self, matches, similarity_threshold, evalue_threshold, min_align_length):
+        """Apply the reporting thresholds to matches and annotate the survivors
+
+        The query fields are left empty unless the hit carries them (long-query hits).
+        Hits are sorted by similarity, and id is the 1-based rank in that order.
+        """
+        filtered_results = []
+        for record, name, hit, alignment, identities, columns, length in matches:
+            similarity = round(100 * identities / columns, 1)
+            
+            if (similarity / 100 >= similarity_threshold and
+                hit['e_value'] <= evalue_threshold and
+                length >= min_align_length):
+                if record is not None:
+                    annotation = self.reference.annotation(record)
+                else:
+                    annotation = self.reference.default_annotation(name, 'uniprot_id')
+                filtered_results.append({
+                    'id': None,
+                    'query_id': hit.get('query_id'),
+                    'input_sequence': hit.get('input_sequence'),
+                    'matched_sequence': f"{name} ({annotation['description']})",
+                    'similarity_score': similarity,
+                    'e_value': hit['e_value'],
+                    'bit_score': round(hit['bit_score'], 1),
+                    'confidence': self.confidence_level(similarity),
+                    'condition_association': annotation['condition_association'],
+                    'label': annotation['label'],
+                    'citations': annotation['citations'],
+                    'notes': annotation['notes'],
+                    'alignment': alignment
+                })
+        
+        # Sort by similarity score descending, then number the hits in that order
+        results = ResultSet.from_rows(filtered_results).sort_by_similarity()
+        results.frame['id'] = range(1, len(results) + 1)
+        return results
+
+    def analyze_long_sequence(self, sequence, similarity_threshold=0.8, evalue_threshold=1e-10, min_align_length=50,
+                              scoring=DEFAULT_SCORING, strands='both', translated=False,
+                              analysis_mode='Comprehensive', max_hits=None, dust=True, window=LONG_QUERY_WINDOW,
+                              overlap=LONG_QUERY_OVERLAP, workers=None):
+        """Search a long query (a scaffold or long read) in overlapping windows, yielding ResultSets as hits finish
+
+        The windows are searched on the process pool and hits spanning window
+        boundaries are chained (see longquery). Each result's query_id is
+        'name:start-end' and its input_sequence only the plus-strand bases
+        the hit covers, so memory follows the window, not the query. max_hits
+        applies per window. Results are not cached.
+        """
+        query = as_packed(sequence)
+        query_id = sequence.name if isinstance(sequence, FastxRecord) else 'query'
+        spans = query_windows(len(query), window, overlap)
+        metrics.count('query_windows', len(spans))
+        chainer = HitChainer(query, spans, scoring)
+        nucleotide_stats, protein_stats = karlin_altschul(scoring), karlin_altschul(DEFAULT_PROTEIN_SCORING)
+        search_spaces = (
+            nucleotide_stats.search_space(len(query), self.engine.db_length, self.engine.num_sequences),
+            protein_stats.search_space(len(query) // 3, self.engine.protein_length, self.engine.num_proteins))
+        windows = ((start, query.slice(start, end)) for start, end in spans)
+        params = (len(query), scoring, evalue_threshold, strands, translated, max_hits, analysis_mode, dust)
+        for number, _, hits in run_batch(self._window_hits, windows, params, workers, chunk_size=1):
+            finished = chainer.add(number, hits)
+            if not finished:
+                continue
+            with metrics.timer('format'):
+                for hit in finished:
+                    stats, search_space = ((nucleotide_stats, search_spaces[0]) if 'record' in hit
+                                           else (protein_stats, search_spaces[1]))
+                    hit['bit_score'] = stats.bit_score(hit['score'])
+                    hit['e_value'] = stats.evalue(hit['score'], search_space)
+                    hit['query_id'] = f"{query_id}:{hit['query_start'] + 1}-{hit['query_end']}"
+                    hit['input_sequence'] = query.slice(hit['query_start'], hit['query_end'])
+                results = self._result_set([self._match(hit) for hit in finished], similarity_threshold,
+                                           evalue_threshold, min_align_length)
+            if len(results):
+                yield results
+
+    def _window_hits(self, window, *params):
+        start, sequence = window
+        return window_hits(self.engine, start, sequence, *params)
+
+    def analyze_batch(self, records, similarity_threshold=0.8, evalue_threshold=1e-10, min_align_length=50,
+                      scoring=DEFAULT_SCORING, strands='both', translated=False, analysis_mode='Comprehensive',
+                      max_hits=None, dust=True, workers=None, chunk_size=8, long_query=False):
+        """Analyze many query records on a process pool
+
+        Yields (record index, record, results) as each record completes. The
+        reference index is shared with the workers through fork copy-on-write.
+        With long_query, records are taken one at a time and each one's
+        windows are spread over the pool (see analyze_long_sequence).
+        """
+        params = (similarity_threshold, evalue_threshold, min_align_length, scoring, strands, translated,
+                  analysis_mode, max_hits, dust)
+        if long_query:
+            return ((index, record, ResultSet.concat(self.analyze_long_sequence(record, *params, workers=workers)))
+                    for index, record in enumerate(records))
+        return run_batch(self.analyze_sequence, records, params, workers, chunk_size)
+
+    def generate_citation_links(self, citations):
+        """Generate formatted citation links (memoized per citation set)"""
+        return citation_links(citations)
+
+    def format_structured_output(self, results):
+        """Format results according to specified output structure"""
+        frame = results.frame
+        formatted_output = pd.DataFrame({
+            "Query ID": frame['query_id'],
+            "Input Sequence": decode_shared(frame['input_sequence']),
+            "Matched Sequence": frame['matched_sequence'],
+            "Similarity Score": frame['similarity_score'].astype(str) + '%',
+            "E-value": frame['e_value'],
+            "Bit Score": frame['bit_score'],
+            "Confidence": frame['confidence'].astype(str),
+            "Condition Association": frame['condition_association'],
+            "Label": frame['label'].astype(str),
+            "Citations": frame['citations'].map(citation_links),
+            "Notes": frame['notes']
+        })
+        
+        return formatted_output.to_dict('records')
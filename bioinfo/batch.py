@@ -0,0 +1,84 @@
+"""Process-pool batch analysis across query records.
+
+Each pool's workers are forked with its analyze callable as their
+initializer argument, so the read-only reference and k-mer index are
+inherited copy-on-write and never pickled. The callable is parked in a
+slot of the worker process only, so concurrent batches in one process
+(job queue runners, app sessions, long-query windows) never see each
+other's. Only query records and their results cross process
+boundaries. Platforms without fork, and batches small enough for one chunk,
+run in-process.
+"""
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import metrics
+
+_WORKER = {}
+
+
+def _start_worker(analyze):
+    _WORKER['analyze'] = analyze
+
+
+def _analyze_chunk(chunk, params, record_metrics):
+    analyze = _WORKER['analyze']
+    if not record_metrics:
+        return [(index, record, analyze(record, *params)) for index, record in chunk], None
+    with metrics.recording() as recorder:
+        rows = [(index, record, analyze(record, *params)) for index, record in chunk]
+    return rows, recorder.snapshot() if recorder else None
+
+
+def _chunks(records, chunk_size):
+    numbered = enumerate(records)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def default_workers():
+    return int(os.environ.get('BIOINFO_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def run_batch(analyze, records, params, workers=None, chunk_size=8):
+    """Yield (record index, record, results) for every record, in completion order
+
+    analyze(record, *params) is called once per record. At most two chunks
+    per worker are in flight, so a streamed record iterator is never fully
+    materialized.
+    """
+    workers = workers or default_workers()
+    chunks = _chunks(records, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    if workers <= 1 or second is None or 'fork' not in multiprocessing.get_all_start_methods():
+        for chunk in itertools.chain([first], [second] if second else [], chunks):
+            yield from ((index, record, analyze(record, *params)) for index, record in chunk)
+        return
+
+    recorder = metrics.current()
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'), initializer=_start_worker,
+                               initargs=(analyze,))
+    try:
+        queued = itertools.chain([first, second], chunks)
+        pending = {pool.submit(_analyze_chunk, chunk, params, recorder is not None)
+                   for chunk in itertools.islice(queued, 2 * workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows, snapshot = future.result()
+                if snapshot:
+                    recorder.merge(snapshot)
+                yield from rows
+                chunk = next(queued, None)
+                if chunk is not None:
+                    pending.add(pool.submit(_analyze_chunk, chunk, params, recorder is not None))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
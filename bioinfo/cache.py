@@ -0,0 +1,139 @@
+"""Two-tier result cache for analyze_sequence.
+
+Results are keyed by the query's canonical sequence digest, the analysis
+parameters and the reference database version. Lookups check an in-process
+LRU first, then a shared SQLite file, so a repeat query from any session or
+worker process skips the search. The SQLite tier is trimmed, least recently
+used first, to a byte budget. The version is part of every key and of
+every lookup, so a version mismatch can never hit. Analyzers on different
+database versions can share the file (an app reloading onto a new snapshot
+keeps serving the old one meanwhile); rows of another version are only
+purged once they have gone unused for STALE_SECONDS, when the next put
+trims the file.
+"""
+import collections
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from .reference import DATA_DIR
+
+# Bump when cached values change (type or contents) so older rows are purged like a database change
+RESULT_FORMAT = 5
+# Rows of another database version (or result format) unused this long are purged when the file is trimmed
+STALE_SECONDS = 3600
+DEFAULT_CACHE = os.environ.get('BIOINFO_CACHE', os.path.join(DATA_DIR, 'results.sqlite'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    db_version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def cache_key(digest, params, db_version):
+    """Stable key for one query digest, parameter tuple and database version"""
+    payload = json.dumps([digest, [repr(param) for param in params], db_version, RESULT_FORMAT])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU in front of an optional size-bounded SQLite store
+
+    path=None (or '') keeps the cache in memory only. Connections are opened
+    lazily per process, so forked batch workers never share a handle.
+    """
+
+    def __init__(self, db_version, path=DEFAULT_CACHE, memory_entries=256, max_bytes=256 << 20):
+        self.db_version = db_version
+        self.tag = f'{db_version}/{RESULT_FORMAT}'
+        self.path = path or None
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self.hits = self.misses = 0
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.executescript(_SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            row = None
+            if self.path:
+                connection = self._connect()
+                row = connection.execute('SELECT value FROM results WHERE key = ? AND db_version = ?',
+                                         (key, self.tag)).fetchone()
+                if row is not None:
+                    connection.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+            if row is None:
+                self.misses += 1
+                return None
+            value = pickle.loads(row[0])
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value in both tiers, evicting old SQLite rows beyond max_bytes"""
+        with self._lock:
+            self._remember(key, value)
+            if not self.path:
+                return
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                               (key, self.tag, blob, len(blob), time.time()))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(connection, total - self.max_bytes)
+
+    def _evict(self, connection, excess):
+        """Purge stale rows of other versions, then free least recently used rows until excess bytes are gone"""
+        stale = (self.tag, time.time() - STALE_SECONDS)
+        freed = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results WHERE db_version != ? AND accessed < ?',
+                                   stale).fetchone()[0]
+        connection.execute('DELETE FROM results WHERE db_version != ? AND accessed < ?', stale)
+        doomed = []
+        rows = connection.execute('SELECT key, size FROM results ORDER BY accessed')
+        for key, size in rows:
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += size
+        rows.close()
+        connection.executemany('DELETE FROM results WHERE key = ?', doomed)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.path:
+                self._connect().execute('DELETE FROM results')
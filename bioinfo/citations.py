@@ -0,0 +1,53 @@
+"""Citation rendering.
+
+A result's citations are a dict of citation keys (clinvar_id, uniprot_id,
+...) to accession IDs. The renderings for the expanders (HTML links) and
+for the report (plain text) are built together once per distinct citation
+set and kept in a bounded LRU cache. Hits that share a reference record
+share its citation set, so rendering a large result set costs one cache
+lookup per hit.
+"""
+import functools
+
+DATABASES = {
+    'NCBI_GenBank': 'https://www.ncbi.nlm.nih.gov/nuccore/',
+    'Ensembl': 'https://www.ensembl.org/id/',
+    'dbSNP': 'https://www.ncbi.nlm.nih.gov/snp/',
+    'ClinVar': 'https://www.ncbi.nlm.nih.gov/clinvar/variation/',
+    'RefSeq': 'https://www.ncbi.nlm.nih.gov/refseq/',
+    'UniProt': 'https://www.uniprot.org/uniprot/',
+    'OMIM': 'https://www.omim.org/entry/'
+}
+
+# (citation key, link label, URL prefix) in display order
+CITATION_LINKS = [
+    ('clinvar_id', 'ClinVar', DATABASES['ClinVar']),
+    ('pubmed_pmid', 'PubMed', 'https://pubmed.ncbi.nlm.nih.gov/'),
+    ('genbank_accession', 'GenBank', DATABASES['NCBI_GenBank']),
+    ('ensembl_id', 'Ensembl', DATABASES['Ensembl']),
+    ('refseq_id', 'RefSeq', DATABASES['RefSeq']),
+    ('uniprot_id', 'UniProt', DATABASES['UniProt']),
+    ('omim_id', 'OMIM', DATABASES['OMIM']),
+]
+CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def render_citations(items):
+    """(HTML links, plain text) for a tuple of (citation key, ID) pairs"""
+    citations = dict(items)
+    links = [(label, f'{prefix}{citations[key]}', citations[key])
+             for key, label, prefix in CITATION_LINKS if key in citations]
+    html = ', '.join(f'<a href="{url}" target="_blank">{label}: {value}</a>' for label, url, value in links)
+    text = ', '.join(f'{url}: {label}: {value}' for label, url, value in links)
+    return html, text
+
+
+def citation_links(citations):
+    """Comma-separated HTML links for a citations dict"""
+    return render_citations(tuple(citations.items()))[0]
+
+
+def citation_text(citations):
+    """Comma-separated 'url: Label: ID' text for a citations dict"""
+    return render_citations(tuple(citations.items()))[1]
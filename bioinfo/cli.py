@@ -0,0 +1,115 @@
+"""bioinfo-analyze: stream FASTA/FASTQ queries in, write hits as JSONL, CSV or Parquet.
+
+Records are streamed through BioinformaticsAnalyzer.analyze_batch, and each
+record's hits go to a streaming writer from bioinfo.export and are flushed
+as soon as the record finishes. With --long-query, each record is searched
+in overlapping windows instead and its hits are flushed as they finish.
+Streamlit is never imported. Input may be a path, a gzip file or '-' for
+stdin.
+"""
+import argparse
+import contextlib
+import sys
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='bioinfo-analyze', description=__doc__.split('\n')[0])
+    parser.add_argument('input', help="FASTA/FASTQ file (optionally gzipped), or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file (default: stdout)")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv', 'parquet'], default='jsonl',
+                        help='parquet needs pyarrow')
+    parser.add_argument('--similarity', type=float, default=0.8, help='minimum identity fraction (default 0.8)')
+    parser.add_argument('--evalue', type=float, default=1e-10, help='maximum E-value (default 1e-10)')
+    parser.add_argument('--min-length', type=int, default=50, help='minimum alignment length in bases')
+    parser.add_argument('--max-hits', type=int, default=None,
+                        help='keep only the best-scoring hits per query (default: all)')
+    parser.add_argument('--strands', choices=['both', 'plus'], default='both')
+    parser.add_argument('--translated', action='store_true', help='add a six-frame translated protein search')
+    parser.add_argument('--mode', default='Comprehensive', choices=['Comprehensive', 'Fast Scan', 'High Sensitivity'])
+    parser.add_argument('--no-dust', action='store_true', help='seed low-complexity regions too (no DUST masking)')
+    parser.add_argument('--long-query', action='store_true',
+                        help='search each record in overlapping windows (scaffolds, long reads)')
+    parser.add_argument('--window', type=int, default=None, help='long-query window length in bases')
+    parser.add_argument('--overlap', type=int, default=None, help='bases shared by neighbouring long-query windows')
+    parser.add_argument('--xrefs', action='store_true', help='resolve citation IDs online')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default BIOINFO_WORKERS or all cores)')
+    parser.add_argument('--database', default=None, help='prebuilt .bdb database (default BIOINFO_DATABASE)')
+    parser.add_argument('--shards', default=None,
+                        help='comma-separated host:port shard servers (default BIOINFO_SHARDS)')
+    parser.add_argument('--no-cache', action='store_true', help='skip the on-disk result cache')
+    parser.add_argument('--metrics', action='store_true',
+                        help='print a per-stage timing breakdown to stderr and update BIOINFO_METRICS_FILE')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    from . import metrics
+    from .analyzer import BioinformaticsAnalyzer
+    from .fastx import iter_records
+    from .export import WRITERS
+    from .longquery import LONG_QUERY_OVERLAP, LONG_QUERY_WINDOW
+    from .preprocess import SequenceError
+
+    window = args.window or LONG_QUERY_WINDOW
+    overlap = LONG_QUERY_OVERLAP if args.overlap is None else args.overlap
+    if not 0 <= overlap < window:
+        parser.error(f'the window overlap ({overlap}) must be smaller than the window ({window})')
+
+    options = {}
+    if args.database:
+        options['database_path'] = args.database
+    if args.shards:
+        options['shards'] = args.shards
+    if args.no_cache:
+        options['cache_path'] = None
+    analyzer = BioinformaticsAnalyzer(**options)
+
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    sink = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    writer = WRITERS[args.format](sink)
+    try:
+        with metrics.recording() if args.metrics else contextlib.nullcontext() as recorder:
+            records = metrics.timed_iter(iter_records(source), 'parse')
+            params = dict(strands=args.strands, translated=args.translated, analysis_mode=args.mode,
+                          max_hits=args.max_hits, dust=not args.no_dust, workers=args.workers)
+            if args.long_query:
+                batch = ((index, record, results) for index, record in enumerate(records)
+                         for results in analyzer.analyze_long_sequence(
+                             record, args.similarity, args.evalue, args.min_length,
+                             window=window, overlap=overlap, **params))
+            else:
+                batch = analyzer.analyze_batch(records, args.similarity, args.evalue, args.min_length, **params)
+            for _, _, results in batch:
+                if args.xrefs and len(results):
+                    with metrics.timer('cross_reference'):
+                        xrefs = analyzer.xrefs.resolve_citations(results.frame['citations'])
+                    results.set_column('xrefs', xrefs)
+                with metrics.timer('write'):
+                    writer.write(results)
+                    sink.flush()
+            writer.close()
+    except BrokenPipeError:
+        pass
+    except SequenceError as error:
+        print(f'bioinfo-analyze: {error}', file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+    if recorder is not None:
+        snapshot = recorder.snapshot()
+        metrics.publish(snapshot)
+        for stage, seconds, calls in metrics.breakdown(snapshot):
+            print(f'{stage:<16} {seconds:10.4f} s {calls:8d} calls', file=sys.stderr)
+        for name, value in sorted(snapshot['counters'].items()):
+            print(f'{name:<16} {value:10d}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Memory-mapped on-disk reference database.
+
+`python -m bioinfo.database build-db` writes the packed reference sequences,
+k-mer index, minimizer sketch, protein index and annotation table into one
+versioned binary file:
+
+    magic (8 bytes) | format version (u32) | reserved (u32) | header length (u64)
+    header (JSON: metadata and an array table) | arrays, each 64-byte aligned
+
+load_database() maps that file with np.memmap and hands out zero-copy array
+views, so startup does no parsing or index building. Streamlit worker
+processes mapping the same file share one page-cached copy. Files written
+before the sketch arrays existed still load; their sketch is built in
+memory on the first Fast Scan.
+
+A database built from files records their resolved paths. It is only
+current for the same source files, and only while none of them is newer
+than the database.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from .index import KmerIndex
+from .reference import DATA_DIR, DEFAULT_ANNOTATIONS, DEFAULT_REFERENCE, ReferenceDatabase
+from .sequence import PackedSequence
+from .sketch import MinimizerSketch
+from .translate import DEFAULT_PROTEINS, STANDARD_RESIDUES, ProteinSequence, load_proteins
+
+MAGIC = b'BIOINFDB'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+DEFAULT_DATABASE = os.environ.get('BIOINFO_DATABASE', os.path.join(DATA_DIR, 'reference.bdb'))
+
+
+class DatabaseFormatError(ValueError):
+    """The file is not a database this version of the code can read"""
+
+
+def file_version(*paths):
+    """Content digest of source files, used as the version of an unbuilt database"""
+    digest = hashlib.sha256()
+    for path in paths:
+        if path and os.path.exists(path):
+            with open(path, 'rb') as handle:
+                for block in iter(lambda: handle.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def source_paths(*sources):
+    """Resolved source file paths, as recorded in the header of a database built from them"""
+    return [os.path.realpath(source) if source else None for source in sources]
+
+
+def is_current(path, *sources):
+    """True if the database file exists, was built from these source files and is newer than all of them"""
+    if not os.path.exists(path):
+        return False
+    if read_header(path)[0].get('sources') != source_paths(*sources):
+        return False
+    built = os.path.getmtime(path)
+    return all(os.path.getmtime(source) <= built for source in sources if source and os.path.exists(source))
+
+
+class PackedSequenceTable:
+    """Read-only list-like view of PackedSequences stored in concatenated arrays"""
+
+    def __init__(self, packed, packed_offsets, lengths, mask_positions, mask_symbols, mask_offsets):
+        self.packed = packed
+        self.packed_offsets = packed_offsets
+        self.lengths = lengths
+        self.mask_positions = mask_positions
+        self.mask_symbols = mask_symbols
+        self.mask_offsets = mask_offsets
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, i):
+        m0, m1 = self.mask_offsets[i], self.mask_offsets[i + 1]
+        return PackedSequence(self.packed[self.packed_offsets[i]:self.packed_offsets[i + 1]],
+                              int(self.lengths[i]), self.mask_positions[m0:m1], self.mask_symbols[m0:m1])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class ProteinTable:
+    """Read-only list-like view of ProteinSequences stored in one residue array"""
+
+    def __init__(self, residues, offsets):
+        self.residues = residues
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return ProteinSequence(self.residues[self.offsets[i]:self.offsets[i + 1]])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class Database:
+    """A loaded (or freshly built) reference database and its indexes"""
+
+    def __init__(self, reference, index, proteins, protein_index, version, sketch=None):
+        self.reference = reference
+        self.index = index
+        self.proteins = proteins
+        self.protein_index = protein_index
+        self.version = version
+        self.sketch = sketch
+
+
+def _offsets(lengths):
+    return np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))).astype(np.int64)
+
+
+def build_database(fasta_path=DEFAULT_REFERENCE, annotation_path=DEFAULT_ANNOTATIONS,
+                   protein_path=DEFAULT_PROTEINS, output_path=DEFAULT_DATABASE, k=11, protein_k=3):
+    """Parse and index the reference, then write it to output_path; returns the Database version"""
+    reference = ReferenceDatabase.from_fasta(fasta_path, annotation_path)
+    return write_database(reference, load_proteins(protein_path), output_path, k, protein_k,
+                          source_paths(fasta_path, annotation_path, protein_path))
+
+
+def write_database(reference, proteins, output_path, k=11, protein_k=3, sources=None):
+    """Index a ReferenceDatabase and its (names, proteins) and write them to output_path; returns the version
+
+    sources are the source_paths() the database was built from, if any.
+    """
+    index = KmerIndex(reference.sequences, k=k)
+    sketch = MinimizerSketch(reference.sequences, max_occurrences=index.max_occurrences)
+    protein_names, proteins = proteins
+    protein_index = KmerIndex(proteins, k=protein_k, bits=5, alphabet_size=STANDARD_RESIDUES)
+
+    sequences = reference.sequences
+    empty_u8 = np.empty(0, dtype=np.uint8)
+    arrays = {
+        'packed': np.concatenate([seq.packed for seq in sequences]) if sequences else empty_u8,
+        'packed_offsets': _offsets([len(seq.packed) for seq in sequences]),
+        'lengths': np.array([len(seq) for seq in sequences], dtype=np.int64),
+        'mask_positions': (np.concatenate([seq.mask_positions for seq in sequences]).astype(np.int64)
+                           if sequences else np.empty(0, dtype=np.int64)),
+        'mask_symbols': np.concatenate([seq.mask_symbols for seq in sequences]) if sequences else empty_u8,
+        'mask_offsets': _offsets([len(seq.mask_positions) for seq in sequences]),
+        'index_kmers': index.kmers,
+        'index_positions': index.positions.astype(np.int64),
+        'index_offsets': index.offsets.astype(np.int64),
+        'sketch_hashes': sketch.hashes,
+        'sketch_records': sketch.records.astype(np.int64),
+        'protein_residues': np.concatenate([p.residues for p in proteins]) if proteins else empty_u8,
+        'protein_offsets': _offsets([len(p) for p in proteins]),
+        'protein_kmers': protein_index.kmers,
+        'protein_positions': protein_index.positions.astype(np.int64),
+        'protein_index_offsets': protein_index.offsets.astype(np.int64),
+    }
+
+    digest = hashlib.sha256()
+    table, cursor = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        digest.update(name.encode('ascii'))
+        digest.update(array.tobytes())
+        table[name] = {'offset': cursor, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        cursor += (array.nbytes + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    digest.update(json.dumps([reference.names, reference.annotations, protein_names], sort_keys=True).encode())
+
+    header = json.dumps({
+        'version': digest.hexdigest()[:16],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'k': index.k,
+        'protein_k': protein_index.k,
+        'sketch_k': sketch.k,
+        'sketch_w': sketch.w,
+        'max_occurrences': index.max_occurrences,
+        'total_length': int(arrays['lengths'].sum()),
+        'names': reference.names,
+        'annotations': reference.annotations,
+        'protein_names': protein_names,
+        'sources': sources,
+        'arrays': table,
+    }).encode('utf-8')
+
+    preamble = MAGIC + np.array([FORMAT_VERSION, 0], dtype='<u4').tobytes() + np.array([len(header)], dtype='<u8').tobytes()
+    data_start = (len(preamble) + len(header) + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(preamble)
+        handle.write(header)
+        for name, array in arrays.items():
+            handle.seek(data_start + table[name]['offset'])
+            handle.write(array.tobytes())
+        handle.truncate(data_start + cursor)
+    os.replace(tmp_path, output_path)
+    return json.loads(header)['version']
+
+
+def read_header(path):
+    """(header, offset of the array data) of a database file"""
+    with open(path, 'rb') as handle:
+        preamble = handle.read(24)
+        if preamble[:8] != MAGIC:
+            raise DatabaseFormatError(f'{path} is not a BioinfoAnalyzer database')
+        format_version = int(np.frombuffer(preamble[8:12], dtype='<u4')[0])
+        if format_version != FORMAT_VERSION:
+            raise DatabaseFormatError(f'{path} has format version {format_version}, expected {FORMAT_VERSION}')
+        header_length = int(np.frombuffer(preamble[16:24], dtype='<u8')[0])
+        header = json.loads(handle.read(header_length).decode('utf-8'))
+    return header, (24 + header_length + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def load_database(path=DEFAULT_DATABASE):
+    """Memory-map a database file built by build_database()"""
+    header, data_start = read_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+
+    def array(name):
+        spec = header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+        start = data_start + spec['offset']
+        return mapped[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+    sequences = PackedSequenceTable(array('packed'), array('packed_offsets'), array('lengths'),
+                                    array('mask_positions'), array('mask_symbols'), array('mask_offsets'))
+    reference = ReferenceDatabase(header['names'], sequences, header['annotations'],
+                                  total_length=header['total_length'])
+    index = KmerIndex.from_arrays(array('index_kmers'), array('index_positions'), array('index_offsets'),
+                                  k=header['k'], max_occurrences=header['max_occurrences'])
+    sketch = None
+    if 'sketch_hashes' in header['arrays']:
+        sketch = MinimizerSketch.from_arrays(array('sketch_hashes'), array('sketch_records'), len(sequences),
+                                             k=header['sketch_k'], w=header['sketch_w'],
+                                             max_occurrences=header['max_occurrences'])
+    proteins = ProteinTable(array('protein_residues'), array('protein_offsets'))
+    protein_index = None
+    if len(proteins):
+        protein_index = KmerIndex.from_arrays(array('protein_kmers'), array('protein_positions'),
+                                              array('protein_index_offsets'), k=header['protein_k'],
+                                              max_occurrences=header['max_occurrences'],
+                                              bits=5, alphabet_size=STANDARD_RESIDUES)
+    return Database(reference, index, (header['protein_names'], proteins), protein_index, header['version'],
+                    sketch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bioinfo.database',
+                                     description='Build the memory-mapped reference database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build-db', help='Index a reference FASTA into a database file')
+    build.add_argument('fasta', nargs='?', default=DEFAULT_REFERENCE)
+    build.add_argument('--annotations', default=DEFAULT_ANNOTATIONS)
+    build.add_argument('--proteins', default=DEFAULT_PROTEINS)
+    build.add_argument('-o', '--output', default=DEFAULT_DATABASE)
+    build.add_argument('-k', type=int, default=11, help='nucleotide seed length')
+    build.add_argument('--protein-k', type=int, default=3, help='protein seed length')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    version = build_database(args.fasta, args.annotations, args.proteins, args.output, args.k, args.protein_k)
+    print(f'Wrote {args.output} (version {version}) in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
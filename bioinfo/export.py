@@ -0,0 +1,130 @@
+"""Streaming result exporters.
+
+Each writer wraps a binary sink and takes ResultSets one at a time. Large
+sets are cut into chunks of CHUNK_ROWS rows, and each chunk is serialized
+with one column-wise pandas/pyarrow call and written out before the next
+chunk is built. Memory stays bounded by the chunk, not by the export, so
+the CLI can also feed a writer one query record at a time.
+
+    with open('hits.parquet', 'wb') as sink:
+        write_results(results, 'parquet', sink)
+
+Parquet needs pyarrow (the 'parquet' extra). The JSON Lines and CSV writers
+only need pandas.
+"""
+import json
+
+import pandas as pd
+
+from .results import FLOAT_COLUMNS, TABLE_COLUMNS
+from .sequence import decode_many, decode_shared
+
+CHUNK_ROWS = 50_000
+JSON_FIELDS = ['query_id', 'input_sequence', 'matched_sequence', 'similarity_score', 'e_value', 'bit_score',
+               'confidence', 'condition_association', 'label', 'citations', 'notes']
+ALIGNMENT_FIELDS = ['query', 'match', 'subject', 'identities', 'gaps', 'strand', 'frame']
+MIME_TYPES = {'jsonl': 'application/jsonl', 'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def alignment_columns(frame):
+    """Alignment fields as {field: list of str}, decoding all packed alignment rows at once"""
+    alignments = frame['alignment'].tolist()
+    columns = {field: [alignment[field] for alignment in alignments] for field in ALIGNMENT_FIELDS}
+    columns['query'], columns['subject'] = decode_many(columns['query']), decode_many(columns['subject'])
+    return columns
+
+
+def json_frame(results):
+    """One row per hit with plain JSON-serializable columns: scalars, citations, alignment and xrefs"""
+    frame = results.frame
+    out = frame[JSON_FIELDS].copy()
+    out['input_sequence'] = decode_shared(frame['input_sequence'])
+    for column in ('confidence', 'label'):
+        out[column] = out[column].astype(str)
+    columns = alignment_columns(frame)
+    out['alignment'] = [dict(zip(ALIGNMENT_FIELDS, values)) for values in zip(*columns.values())]
+    if 'xrefs' in frame:
+        out['xrefs'] = frame['xrefs']
+    return out
+
+
+class JsonlWriter:
+    """One JSON object per hit, one hit per line"""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write(self, results):
+        for chunk in results.chunks(CHUNK_ROWS):
+            text = json_frame(chunk).to_json(orient='records', lines=True, double_precision=15,
+                                             force_ascii=False)
+            self.sink.write(text.encode())
+
+    def close(self):
+        self.sink.flush()
+
+
+class CsvWriter:
+    """The summary table (display column headers), header row written once"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.header = True
+
+    def write(self, results):
+        for chunk in results.chunks(CHUNK_ROWS):
+            self.sink.write(chunk.table().to_csv(index=False, header=self.header).encode())
+            self.header = False
+
+    def close(self):
+        if self.header:
+            self.sink.write(pd.DataFrame(columns=list(TABLE_COLUMNS.values())).to_csv(index=False).encode())
+        self.sink.flush()
+
+
+class ParquetWriter:
+    """Flat Parquet columns, one row group per chunk
+
+    Alignment fields become alignment_<field> string columns; citations and
+    xrefs are stored as JSON text.
+    """
+
+    def __init__(self, sink):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema(
+            [(field, pa.float64() if field in FLOAT_COLUMNS else pa.string()) for field in JSON_FIELDS] +
+            [(f'alignment_{field}', pa.string()) for field in ALIGNMENT_FIELDS] + [('xrefs', pa.string())])
+        self.writer = pq.ParquetWriter(sink, self.schema)
+
+    def table(self, results):
+        frame = results.frame
+        data = {field: frame[field] for field in JSON_FIELDS}
+        data['input_sequence'] = decode_shared(frame['input_sequence'])
+        data['confidence'] = frame['confidence'].astype(str)
+        data['label'] = frame['label'].astype(str)
+        data['citations'] = [json.dumps(citations) for citations in frame['citations']]
+        for field, values in alignment_columns(frame).items():
+            data[f'alignment_{field}'] = values
+        data['xrefs'] = ([json.dumps(xrefs) for xrefs in frame['xrefs']] if 'xrefs' in frame
+                         else [None] * len(frame))
+        return self.pa.Table.from_pandas(pd.DataFrame(data), schema=self.schema, preserve_index=False)
+
+    def write(self, results):
+        for chunk in results.chunks(CHUNK_ROWS):
+            self.writer.write_table(self.table(chunk))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+def write_results(results, format, sink):
+    """Write a whole ResultSet to a binary sink, chunk by chunk"""
+    writer = WRITERS[format](sink)
+    writer.write(results)
+    writer.close()
@@ -0,0 +1,94 @@
+"""Streaming FASTA/FASTQ parsing.
+
+Records are read line by line from a binary stream (an open file, a
+Streamlit UploadedFile, a gzip stream) and yielded one at a time. Only the
+current record is held in memory. Its sequence lines are stripped of
+whitespace and digits, normalized (see preprocess.normalize) and packed
+into a PackedSequence straight from the raw bytes, with no text decoding.
+A symbol outside the IUPAC nucleotide alphabet raises SequenceError.
+"""
+import collections
+import gzip
+import io
+
+from .preprocess import normalize
+from .sequence import PackedSequence
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Dropped from sequence lines: whitespace and the position numbers of GenBank-style text
+_IGNORED = b' \t\r\n0123456789'
+
+FastxRecord = collections.namedtuple('FastxRecord', ['name', 'description', 'sequence', 'quality'])
+FastxRecord.__doc__ = 'One parsed FASTA/FASTQ record; sequence is a PackedSequence, quality is bytes or None'
+
+
+def open_stream(stream):
+    """Wrap a binary stream for line iteration, transparently un-gzipping it"""
+    buffered = stream if hasattr(stream, 'peek') else io.BufferedReader(stream)
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        return io.BufferedReader(gzip.GzipFile(fileobj=buffered))
+    return buffered
+
+
+def _header(line):
+    fields = line[1:].strip().decode('utf-8', 'replace').split(None, 1)
+    if not fields:
+        return 'query', ''
+    return fields[0], fields[1] if len(fields) > 1 else ''
+
+
+def iter_records(stream, default_name='query'):
+    """Yield FastxRecord objects from a FASTA, FASTQ or raw-sequence binary stream
+
+    Input without a '>' or '@' header is treated as one raw sequence named
+    default_name. Gzip-compressed input is detected from its magic bytes.
+    """
+    lines = open_stream(stream)
+    name, description, chunks = None, '', []
+    for line in lines:
+        if not line.strip():
+            continue
+        if line.startswith(b'@') and name is None and not chunks:
+            yield from _iter_fastq(line, lines)
+            return
+        if line.startswith(b'>'):
+            if name is not None or chunks:
+                yield FastxRecord(name or default_name, description,
+                                  _encode(chunks, name or default_name), None)
+            (name, description), chunks = _header(line), []
+        else:
+            chunks.append(line.translate(None, _IGNORED))
+    if name is not None or chunks:
+        yield FastxRecord(name or default_name, description, _encode(chunks, name or default_name), None)
+
+
+def _encode(chunks, name):
+    return PackedSequence.encode(normalize(b''.join(chunks), name))
+
+
+def _iter_fastq(first_header, lines):
+    header = first_header
+    while header:
+        name, description = _header(header)
+        sequence = next(lines, b'').translate(None, _IGNORED)
+        next(lines, b'')
+        quality = next(lines, b'').strip()
+        yield FastxRecord(name, description, _encode([sequence], name), quality)
+        header = next(lines, b'')
+        while header and not header.strip():
+            header = next(lines, b'')
+
+
+def parse_text(text, default_name='query'):
+    """Yield records from pasted text (FASTA, FASTQ or a bare sequence)"""
+    return iter_records(io.BytesIO(text.encode('utf-8')), default_name)
+
+
+def as_packed(query):
+    """Coerce a FastxRecord, PackedSequence or pasted text to a PackedSequence"""
+    if isinstance(query, FastxRecord):
+        return query.sequence
+    if isinstance(query, PackedSequence):
+        return query
+    record = next(parse_text(query), None)
+    return record.sequence if record is not None else PackedSequence.encode(b'')
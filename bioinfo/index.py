@@ -0,0 +1,127 @@
+"""k-mer seed index over the reference sequences.
+
+All k-mers of every reference record are packed into 2-bit integer codes and
+stored sorted next to their global positions, so a query k-mer is resolved
+with one binary search and its hits are a contiguous slice.
+
+A spaced seed pattern such as '111010010100110111' compares only the '1'
+positions of each window. That tolerates mismatches at the '0' positions,
+so diverged homologs get seeds that contiguous k-mers of the same weight
+would miss.
+"""
+import numpy as np
+
+
+def kmer_codes(codes, k, bits=2, alphabet_size=4, pattern=None):
+    """Return (kmers, valid) for every window of length k in an encoded sequence
+
+    Codes at or above alphabet_size (N, ambiguity, stop) invalidate a window.
+    With a spaced seed pattern, windows span len(pattern) symbols and only
+    the '1' positions are packed and checked.
+    """
+    span = k if pattern is None else len(pattern)
+    n = len(codes) - span + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+    offsets = range(k) if pattern is None else [j for j, care in enumerate(pattern) if care == '1']
+    kmers = np.zeros(n, dtype=np.uint64)
+    mask = (1 << bits) - 1
+    for j in offsets:
+        kmers <<= np.uint64(bits)
+        kmers |= (codes[j:j + n] & mask).astype(np.uint64)
+    if pattern is None:
+        invalid = np.concatenate(([0], np.cumsum(codes >= alphabet_size)))
+        return kmers, (invalid[k:] - invalid[:-k]) == 0
+    valid = np.ones(n, dtype=bool)
+    for j in offsets:
+        valid &= codes[j:j + n] < alphabet_size
+    return kmers, valid
+
+
+class KmerIndex:
+    """Sorted k-mer -> position index over sequences exposing codes()
+
+    Nucleotides use 2 bits per symbol; a protein index uses bits=5 over the
+    20 standard residues. With a spaced seed pattern, k is its weight.
+    """
+
+    def __init__(self, sequences, k=11, max_occurrences=1000, bits=2, alphabet_size=4, pattern=None):
+        self.pattern = pattern
+        self.k = k if pattern is None else pattern.count('1')
+        self.max_occurrences = max_occurrences
+        self.bits = bits
+        self.alphabet_size = alphabet_size
+        lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        all_kmers, all_positions = [], []
+        for start, seq in zip(self.offsets[:-1], sequences):
+            kmers, valid = kmer_codes(seq.codes(), self.k, bits, alphabet_size, pattern)
+            positions = np.flatnonzero(valid)
+            all_kmers.append(kmers[positions])
+            all_positions.append(positions + start)
+        kmers = np.concatenate(all_kmers) if all_kmers else np.empty(0, dtype=np.uint64)
+        positions = np.concatenate(all_positions) if all_positions else np.empty(0, dtype=np.int64)
+
+        order = np.argsort(kmers, kind='stable')
+        self.kmers = kmers[order]
+        self.positions = positions[order]
+
+    @classmethod
+    def from_arrays(cls, kmers, positions, offsets, k=11, max_occurrences=1000, bits=2, alphabet_size=4,
+                    pattern=None):
+        """Wrap prebuilt (e.g. memory-mapped) sorted kmers, positions and record offsets"""
+        index = cls.__new__(cls)
+        index.pattern = pattern
+        index.k = k
+        index.max_occurrences = max_occurrences
+        index.bits = bits
+        index.alphabet_size = alphabet_size
+        index.offsets = offsets
+        index.kmers = kmers
+        index.positions = positions
+        return index
+
+    def __len__(self):
+        return len(self.kmers)
+
+    def seeds(self, query_codes):
+        """Return (query_pos, subject_pos) arrays for every exact k-mer hit of the query"""
+        _, qpos, spos = self.seeds_many([query_codes])
+        return qpos, spos
+
+    def seeds_many(self, queries):
+        """Seed several encoded queries (strands, frames) in one index pass
+
+        Returns (query number, query_pos, subject_pos) arrays.
+        """
+        all_kmers, all_qpos, all_ids = [], [], []
+        for number, query_codes in enumerate(queries):
+            kmers, valid = kmer_codes(query_codes, self.k, self.bits, self.alphabet_size, self.pattern)
+            qpos = np.flatnonzero(valid)
+            all_kmers.append(kmers[qpos])
+            all_qpos.append(qpos)
+            all_ids.append(np.full(len(qpos), number, dtype=np.int64))
+        empty = np.empty(0, dtype=np.int64)
+        if not all_kmers:
+            return empty, empty, empty
+        kmers, qpos, ids = np.concatenate(all_kmers), np.concatenate(all_qpos), np.concatenate(all_ids)
+
+        lo = np.searchsorted(self.kmers, kmers, side='left')
+        hi = np.searchsorted(self.kmers, kmers, side='right')
+        counts = hi - lo
+        keep = (counts > 0) & (counts <= self.max_occurrences)
+        ids, qpos, lo, counts = ids[keep], qpos[keep], lo[keep], counts[keep]
+        if not len(qpos):
+            return empty, empty, empty
+
+        # Expand each [lo, lo + count) slice without a Python loop
+        total = int(counts.sum())
+        run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        slots = np.repeat(lo, counts) + (np.arange(total) - run_starts)
+        return np.repeat(ids, counts), np.repeat(qpos, counts), self.positions[slots]
+
+    def locate(self, global_positions):
+        """Map global positions to (record index, local position)"""
+        records = np.searchsorted(self.offsets, global_positions, side='right') - 1
+        return records, global_positions - self.offsets[records]
@@ -0,0 +1,220 @@
+"""Local background job queue for long analyses.
+
+Jobs live in a SQLite file, and uploaded inputs are spooled next to it, so
+there is no external broker. Any process sharing the directory can submit
+jobs, poll them, or run them. Runners claim the highest-priority queued job
+with a conditional UPDATE, so a job is never run twice. A runner stores each
+query record's ResultSet as soon as that record finishes, and pollers can
+read these partial results before the job completes. A bounded number of
+runner threads per process caps how many jobs run at once. Each job still
+fans out over the analyzer's fork-based process pool.
+"""
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from .fastx import iter_records, parse_text
+from .reference import DATA_DIR
+from .results import ResultSet
+
+DEFAULT_JOBS = os.environ.get('BIOINFO_JOBS', os.path.join(DATA_DIR, 'jobs'))
+ACTIVE = ('queued', 'running')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    params BLOB NOT NULL,
+    input_text TEXT,
+    input_path TEXT,
+    records_done INTEGER NOT NULL DEFAULT 0,
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, submitted);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    record_index INTEGER NOT NULL,
+    results BLOB NOT NULL,
+    PRIMARY KEY (job_id, record_index)
+);
+"""
+_FIELDS = ('id', 'name', 'status', 'priority', 'submitted', 'started', 'finished', 'records_done', 'progress',
+           'error')
+
+
+class JobStore:
+    """SQLite-backed job table plus spooled input files"""
+
+    def __init__(self, directory=DEFAULT_JOBS):
+        self.directory = directory
+        self.path = os.path.join(directory, 'jobs.sqlite')
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def submit(self, params, text=None, stream=None, name='query', priority=0):
+        """Queue a job for pasted text or a binary stream (spooled to disk); returns the job ID"""
+        job_id = uuid.uuid4().hex
+        input_path = None
+        if stream is not None:
+            input_path = os.path.join(self.directory, f'{job_id}.input')
+            with open(input_path, 'wb') as spool:
+                shutil.copyfileobj(stream, spool, 1 << 20)
+        self._db().execute(
+            'INSERT INTO jobs (id, name, status, priority, submitted, params, input_text, input_path) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, name, 'queued', priority, time.time(), pickle.dumps(params), text, input_path))
+        return job_id
+
+    def claim(self, owner):
+        """Atomically move the best queued job to running; returns (id, params, text, path) or None"""
+        db = self._db()
+        while True:
+            row = db.execute("SELECT id, params, input_text, input_path FROM jobs WHERE status = 'queued' "
+                             "ORDER BY priority DESC, submitted LIMIT 1").fetchone()
+            if row is None:
+                return None
+            claimed = db.execute("UPDATE jobs SET status = 'running', started = ?, owner = ? "
+                                 "WHERE id = ? AND status = 'queued'", (time.time(), owner, row[0])).rowcount
+            if claimed:
+                return row[0], pickle.loads(row[1]), row[2], row[3]
+
+    def requeue_orphans(self, is_alive):
+        """Return running jobs whose owner is gone to the queue"""
+        db = self._db()
+        for job_id, owner in db.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall():
+            if not is_alive(owner):
+                db.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+                db.execute("UPDATE jobs SET status = 'queued', owner = NULL, records_done = 0, progress = 0 "
+                           "WHERE id = ? AND status = 'running'", (job_id,))
+
+    def add_result(self, job_id, record_index, results, progress):
+        db = self._db()
+        db.execute('INSERT OR REPLACE INTO job_results VALUES (?, ?, ?)',
+                   (job_id, record_index, pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)))
+        db.execute('UPDATE jobs SET records_done = records_done + 1, progress = ? WHERE id = ?',
+                   (progress, job_id))
+
+    def finish(self, job_id, status, error=None):
+        db = self._db()
+        db.execute("UPDATE jobs SET status = ?, finished = ?, error = ?, progress = CASE WHEN ? = 'done' "
+                   "THEN 1 ELSE progress END WHERE id = ? AND status = 'running'",
+                   (status, time.time(), error, status, job_id))
+        path = db.execute('SELECT input_path FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if path and path[0] and os.path.exists(path[0]):
+            os.remove(path[0])
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or ask a running one to stop after its current record"""
+        self._db().execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN (?, ?)",
+                           (time.time(), job_id) + ACTIVE)
+
+    def status(self, job_id):
+        row = self._db().execute(f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_FIELDS, row)) if row else None
+
+    def jobs(self, job_ids):
+        return [job for job in map(self.status, job_ids) if job is not None]
+
+    def results(self, job_id):
+        """ResultSet of every record finished so far, in input order"""
+        rows = self._db().execute('SELECT results FROM job_results WHERE job_id = ? ORDER BY record_index',
+                                  (job_id,)).fetchall()
+        return ResultSet.concat(pickle.loads(row[0]) for row in rows)
+
+
+class JobQueue:
+    """Runs queued jobs on a bounded pool of runner threads in this process
+
+    params is a dict of analyze_batch keyword arguments plus an optional
+    'resolve_xrefs' flag for the cross-reference step.
+    """
+
+    def __init__(self, analyzer, store=None, runners=2, poll_interval=1.0):
+        self.analyzer = analyzer
+        self.store = store or JobStore()
+        self.runners = runners
+        self.poll_interval = poll_interval
+        self.owner = f'{os.uname().nodename}:{os.getpid()}'
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        hostname = os.uname().nodename
+
+        def is_alive(owner):
+            host, _, pid = (owner or '').rpartition(':')
+            if host != hostname or not pid.isdigit():
+                return True
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+            return True
+
+        self.store.requeue_orphans(is_alive)
+        for number in range(self.runners):
+            thread = threading.Thread(target=self._run, name=f'job-runner-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, params, text=None, stream=None, name='query', priority=0):
+        job_id = self.store.submit(params, text, stream, name, priority)
+        self._wake.set()
+        return job_id
+
+    def _run(self):
+        while True:
+            job = self.store.claim(self.owner)
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            job_id = job[0]
+            try:
+                self._execute(*job)
+                self.store.finish(job_id, 'done')
+            except Exception as error:
+                self.store.finish(job_id, 'failed', f'{type(error).__name__}: {error}')
+
+    def _execute(self, job_id, params, text, path):
+        params = dict(params)
+        resolve_xrefs = params.pop('resolve_xrefs', False)
+        # The whole job runs on the analyzer (database snapshot) current when it starts
+        analyzer = self.analyzer
+        handle = open(path, 'rb') if path else None
+        try:
+            size = os.path.getsize(path) if path else 0
+            records = iter_records(handle) if handle else parse_text(text)
+            for done, (index, record, results) in enumerate(analyzer.analyze_batch(records, **params), 1):
+                if self.store.status(job_id)['status'] == 'cancelled':
+                    return
+                if resolve_xrefs and len(results):
+                    results.set_column('xrefs', analyzer.xrefs.resolve_citations(results.frame['citations']))
+                progress = min(handle.tell() / size, 0.99) if size else 0.0
+                self.store.add_result(job_id, index, results, progress)
+        finally:
+            if handle:
+                handle.close()
@@ -0,0 +1,230 @@
+"""Chunked search of long queries: genome scaffolds and long reads.
+
+A query longer than a few thousand bases is cut into windows of
+LONG_QUERY_WINDOW bases that overlap by LONG_QUERY_OVERLAP. Window starts
+are multiples of 3, so translated frames keep their numbering. Each window
+is an ordinary SearchEngine search. Windows are searched on the batch
+process pool (see batch.run_batch), and their hits are mapped to the
+coordinates of the whole query.
+
+HitChainer joins the hits of neighbouring windows, in window order, as
+the windows finish:
+
+- Nucleotide hits to the same record on the same strand whose alignments
+  pass through a common (query, subject) cell are the same locus, seen
+  from both sides of a window boundary. They are spliced at the common
+  cell that gives the best combined score. The score is recomputed from
+  the alignment columns, so a chain can cover any number of windows.
+- Translated hits are not spliced. Overlapping duplicates of the same
+  protein and strand keep the higher-scoring copy.
+
+A hit is finished once it ends before the next window's start, since no
+later window can reach it, so hits stream out while later windows are
+still being searched. Windows keep one hit per record each (the best),
+and max_hits applies per window. E-values use the length of the whole
+query.
+
+The search itself only ever sees one window. Seed arrays, DP slabs and
+traceback matrices are sized by the window, not the query, and at most
+two windows per worker are in flight. The query stays packed at 2 bits
+per base, and every hit carries only its aligned slices of the query and
+subject.
+"""
+import numpy as np
+
+from .search import trim_subject
+from .sequence import PackedSequence
+
+LONG_QUERY_WINDOW = 12_000
+LONG_QUERY_OVERLAP = 1_500
+
+
+def query_windows(length, window=LONG_QUERY_WINDOW, overlap=LONG_QUERY_OVERLAP):
+    """[(start, end)] of the overlapping windows covering a query of length bases"""
+    if not 0 <= overlap < window:
+        raise ValueError('the window overlap must be smaller than the window')
+    step = max(3, (window - overlap) // 3 * 3)
+    spans = []
+    for start in range(0, length, step):
+        spans.append((start, min(start + window, length)))
+        if start + window >= length:
+            break
+    return spans
+
+
+def _shift(index, offset):
+    return np.where(index >= 0, index + offset, -1)
+
+
+def window_hits(engine, start, window, length, scoring, evalue_threshold, strands, translated, max_hits, mode,
+                dust):
+    """Search one window; hits are trimmed to their aligned slices and placed in whole-query coordinates
+
+    Nucleotide hits get query_index positions in the oriented whole query
+    (the reverse complement for Plus/Minus) and no query. Translated hits
+    keep only their aligned residues as query, and get whole-query frame
+    labels and span, the plus-strand bases they cover.
+    """
+    end = start + len(window)
+    hits = []
+    for hit in engine.search(window, scoring, evalue_threshold, strands, max_hits, mode, dust):
+        hit = trim_subject(hit)
+        del hit['query']
+        hit['query_index'] = _shift(hit['query_index'], start if hit['strand'] == 'Plus/Plus' else length - end)
+        hits.append(hit)
+    if translated:
+        for hit in engine.search_translated(window, evalue_threshold=evalue_threshold, max_hits=max_hits):
+            hit = trim_subject(hit)
+            index = hit['query_index']
+            aligned = index[index >= 0]
+            lo, hi = int(aligned.min()), int(aligned.max()) + 1
+            shift = int(hit['frame'][1:]) - 1
+            if hit['frame'][0] == '+':
+                hit['span'] = (start + shift + 3 * lo, start + shift + 3 * hi)
+            else:
+                hit['span'] = (end - shift - 3 * hi, end - shift - 3 * lo)
+                hit['frame'] = f'-{(length - end + shift) % 3 + 1}'
+            hit['query'] = np.array(hit['query'][lo:hi])
+            hit['query_index'] = _shift(index, -lo)
+            hits.append(hit)
+    return hits
+
+
+def oriented_slice(query, lo, hi, strand):
+    """Bases [lo, hi) of the query as oriented by strand (Plus/Minus: of its reverse complement)"""
+    if strand == 'Plus/Plus':
+        return query.slice(lo, hi)
+    return query.slice(len(query) - hi, len(query) - lo).reverse_complement()
+
+
+def column_scores(query_codes, subject_codes, query_index, subject_index, scoring):
+    """Score of each alignment column; a gap run pays gap_open on its first column"""
+    both = (query_index >= 0) & (subject_index >= 0)
+    scores = np.full(len(query_index), -scoring.gap_extend, dtype=np.int32)
+    scores[both] = scoring.matrix[query_codes[query_index[both]], subject_codes[subject_index[both]]]
+    for gap in (query_index < 0, subject_index < 0):
+        opened = gap.copy()
+        opened[1:] &= ~gap[:-1]
+        scores[opened] -= scoring.gap_open
+    return scores
+
+
+def _joined_subject(first, first_start, second, second_start):
+    """(PackedSequence, start) covering two overlapping or adjacent subject slices"""
+    if second_start < first_start:
+        first, first_start, second, second_start = second, second_start, first, first_start
+    first_end = first_start + len(first)
+    text = first.decode()
+    if second_start + len(second) > first_end:
+        text += second.decode(first_end - second_start)
+    return PackedSequence.encode(text), first_start
+
+
+class HitChainer:
+    """Joins the window hits of one long query and hands back the finished ones
+
+    add(number, hits) takes the hits of window number as windows finish,
+    in any order, and returns the hits that no later window can extend, in
+    query order. Finished hits look like SearchEngine hits (oriented query
+    and subject slices, with indexes into them) plus query_start and
+    query_end, the plus-strand bases they cover; they have no E-value yet.
+    """
+
+    def __init__(self, query, spans, scoring):
+        self.query = query
+        self.spans = spans
+        self.scoring = scoring
+        self.waiting = {}
+        self.next = 0
+        self.open = []
+
+    def add(self, number, hits):
+        self.waiting[number] = hits
+        finished = []
+        while self.next in self.waiting:
+            for hit in self.waiting.pop(self.next):
+                self._join(hit)
+            self.next += 1
+            limit = self.spans[self.next][0] if self.next < len(self.spans) else None
+            done = [hit for hit in self.open if limit is None or hit['span'][1] <= limit]
+            self.open = [hit for hit in self.open if limit is not None and hit['span'][1] > limit]
+            finished += sorted(done, key=lambda hit: hit['span'])
+        return [self._finish(hit) for hit in finished]
+
+    def _join(self, hit):
+        if 'protein' in hit:
+            for other in list(self.open):
+                if ('protein' in other and other['protein'] == hit['protein'] and other['frame'][0] == hit['frame'][0]
+                        and other['span'][0] < hit['span'][1] and hit['span'][0] < other['span'][1]):
+                    if other['score'] >= hit['score']:
+                        return
+                    self.open.remove(other)
+            self.open.append(hit)
+            return
+
+        query_index = hit['query_index']
+        aligned = query_index[query_index >= 0]
+        lo, hi = int(aligned.min()), int(aligned.max()) + 1
+        hit['subject_index'] = _shift(hit['subject_index'], hit['subject_start'])
+        region = oriented_slice(self.query, lo, hi, hit['strand']).codes()
+        hit['columns'] = column_scores(region, hit['subject'].codes(), _shift(query_index, -lo),
+                                       _shift(hit['subject_index'], -hit['subject_start']), self.scoring)
+        for other in list(self.open):
+            if 'record' in other and other['record'] == hit['record'] and other['strand'] == hit['strand']:
+                joined = self._splice(other, hit)
+                if joined is not None:
+                    self.open.remove(other)
+                    hit = joined
+        hit['span'] = self._span(hit)
+        self.open.append(hit)
+
+    def _span(self, hit):
+        aligned = hit['query_index'][hit['query_index'] >= 0]
+        lo, hi = int(aligned.min()), int(aligned.max()) + 1
+        return (lo, hi) if hit['strand'] == 'Plus/Plus' else (len(self.query) - hi, len(self.query) - lo)
+
+    @staticmethod
+    def _cells(hit):
+        """Columns aligning two bases, and their (query, subject) cells as one key each"""
+        columns = np.flatnonzero((hit['query_index'] >= 0) & (hit['subject_index'] >= 0))
+        return columns, hit['query_index'][columns] * (1 << 32) + hit['subject_index'][columns]
+
+    def _splice(self, first, second):
+        """The best of first, second and their splices at a shared cell; None if they share no cell"""
+        first_columns, first_cells = self._cells(first)
+        second_columns, second_cells = self._cells(second)
+        _, in_first, in_second = np.intersect1d(first_cells, second_cells, assume_unique=True, return_indices=True)
+        if not len(in_first):
+            return None
+        cut_first, cut_second = first_columns[in_first], second_columns[in_second]
+        prefix_first, prefix_second = np.cumsum(first['columns']), np.cumsum(second['columns'])
+        candidates = [(int(prefix_first[-1]), first, None, None), (int(prefix_second[-1]), second, None, None)]
+        for head, tail, head_cut, tail_cut, head_prefix, tail_prefix in (
+                (first, second, cut_first, cut_second, prefix_first, prefix_second),
+                (second, first, cut_second, cut_first, prefix_second, prefix_first)):
+            scores = head_prefix[head_cut] + tail_prefix[-1] - tail_prefix[tail_cut]
+            best = int(np.argmax(scores))
+            candidates.append((int(scores[best]), head, tail, (int(head_cut[best]), int(tail_cut[best]))))
+        score, head, tail, cuts = max(candidates, key=lambda candidate: candidate[0])
+        if tail is None:
+            return head
+        (head_cut, tail_cut), joined = cuts, dict(head)
+        for key in ('query_index', 'subject_index', 'columns'):
+            joined[key] = np.concatenate([head[key][:head_cut + 1], tail[key][tail_cut + 1:]])
+        joined['subject'], joined['subject_start'] = _joined_subject(head['subject'], head['subject_start'],
+                                                                      tail['subject'], tail['subject_start'])
+        joined['score'] = score
+        return joined
+
+    def _finish(self, hit):
+        """An engine-style hit with oriented query/subject slices and query_start/query_end"""
+        hit = dict(hit, query_start=hit['span'][0], query_end=hit['span'][1])
+        if 'protein' in hit:
+            return hit
+        aligned = hit['query_index'][hit['query_index'] >= 0]
+        lo, hi = int(aligned.min()), int(aligned.max()) + 1
+        hit['query'] = oriented_slice(self.query, lo, hi, hit['strand'])
+        hit['query_index'] = _shift(hit['query_index'], -lo)
+        hit['subject_index'] = _shift(hit['subject_index'], -hit['subject_start'])
+        del hit['columns']
+        return hit
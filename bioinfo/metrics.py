@@ -0,0 +1,156 @@
+"""Per-stage timers and counters.
+
+Instrumentation is active only inside a `recording()` block, which installs a
+Recorder for the current thread. Outside such a block, `timer()` returns a
+shared no-op context manager and `count()` returns immediately, so
+instrumented code costs one thread-local lookup per call. Setting
+BIOINFO_METRICS=0 turns recording off entirely.
+
+Worker processes record their own chunks, and the batch runner merges those
+snapshots back into the caller's recorder. publish() folds each run into
+process totals and writes them as a Prometheus text-format file, ready for a
+node-exporter textfile collector to scrape.
+"""
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+
+from .reference import DATA_DIR
+
+ENABLED = os.environ.get('BIOINFO_METRICS', '1') != '0'
+DEFAULT_METRICS_FILE = os.environ.get('BIOINFO_METRICS_FILE', os.path.join(DATA_DIR, 'metrics.prom'))
+
+_state = threading.local()
+_NULL = contextlib.nullcontext()
+
+
+class Recorder:
+    """Accumulated seconds and call counts per stage, plus named counters"""
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counters = collections.defaultdict(int)
+
+    def add_time(self, stage, seconds, calls=1):
+        self.seconds[stage] += seconds
+        self.calls[stage] += calls
+
+    def snapshot(self):
+        return {'seconds': dict(self.seconds), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+
+    def merge(self, snapshot):
+        for stage, seconds in snapshot['seconds'].items():
+            self.add_time(stage, seconds, snapshot['calls'].get(stage, 0))
+        for name, value in snapshot['counters'].items():
+            self.counters[name] += value
+
+
+class _Timer:
+    __slots__ = ('stage', 'recorder', 'started')
+
+    def __init__(self, stage, recorder):
+        self.stage = stage
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add_time(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def current():
+    """The active Recorder for this thread, or None"""
+    return getattr(_state, 'recorder', None)
+
+
+@contextlib.contextmanager
+def recording():
+    """Collect metrics for the enclosed block on this thread; yields the Recorder (None if disabled)"""
+    if not ENABLED:
+        yield None
+        return
+    previous = current()
+    recorder = _state.recorder = Recorder()
+    try:
+        yield recorder
+    finally:
+        _state.recorder = previous
+
+
+def timer(stage):
+    """Context manager adding the block's wall time to stage"""
+    recorder = getattr(_state, 'recorder', None)
+    if recorder is None:
+        return _NULL
+    return _Timer(stage, recorder)
+
+
+def timed(stage):
+    """Decorator form of timer()"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1):
+    recorder = getattr(_state, 'recorder', None)
+    if recorder is not None:
+        recorder.counters[name] += value
+
+
+def timed_iter(iterable, stage):
+    """Yield from iterable, charging the time spent producing each item to stage"""
+    iterator = iter(iterable)
+    while True:
+        with timer(stage):
+            item = next(iterator, _NULL)
+        if item is _NULL:
+            return
+        yield item
+
+
+_TOTALS = Recorder()
+_totals_lock = threading.Lock()
+
+
+def breakdown(snapshot):
+    """Rows of (stage, seconds, calls) sorted by time, for display"""
+    return sorted(((stage, seconds, snapshot['calls'].get(stage, 0))
+                   for stage, seconds in snapshot['seconds'].items()), key=lambda row: -row[1])
+
+
+def publish(snapshot, path=DEFAULT_METRICS_FILE):
+    """Add one run to this process's totals and rewrite path in Prometheus text format
+
+    The file holds cumulative counters and is replaced atomically, because
+    repeated samples of one series are not valid in a scraped text file.
+    """
+    with _totals_lock:
+        _TOTALS.merge(snapshot)
+        _TOTALS.counters['runs'] += 1
+        totals = _TOTALS.snapshot()
+    if not path:
+        return
+    lines = ['# HELP bioinfo_stage_seconds_total Wall time spent per pipeline stage',
+             '# TYPE bioinfo_stage_seconds_total counter']
+    lines += [f'bioinfo_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+              for stage, seconds in sorted(totals['seconds'].items())]
+    lines += ['# TYPE bioinfo_stage_calls_total counter']
+    lines += [f'bioinfo_stage_calls_total{{stage="{stage}"}} {calls}' for stage, calls in sorted(totals['calls'].items())]
+    for name, value in sorted(totals['counters'].items()):
+        lines += [f'# TYPE bioinfo_{name}_total counter', f'bioinfo_{name}_total {value}']
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as handle:
+        handle.write('\n'.join(lines) + '\n')
+    os.replace(temporary, path)
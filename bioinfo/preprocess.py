@@ -0,0 +1,105 @@
+"""Query preprocessing: alphabet normalization and low-complexity masking.
+
+normalize() passes raw sequence bytes through one 256-entry lookup table.
+Lowercase is folded to uppercase, RNA U becomes T, and alignment gaps are
+dropped. Anything outside the IUPAC nucleotide alphabet raises
+SequenceError. The parser has already removed whitespace and digits (as
+in GenBank-formatted text) line by line.
+
+dust_mask() flags low-complexity regions with the DUST score. The
+sequence's triplets are counted in windows of DUST_WINDOW triplets that
+start every DUST_WINDOW // 2 triplets. A window with triplet counts c_t
+scores
+
+    10 * sum(c_t * (c_t - 1) / 2) / (l - 1)
+
+where l is its number of valid triplets, and windows scoring above
+DUST_LEVEL are masked. Random sequence scores around 5, a tetranucleotide
+repeat around 76 and a homopolymer 320. The counts of all windows come from
+one bincount over the triplet codes, so masking costs a few array passes
+and no per-window Python work. Masked bases are excluded from seeding and
+the sketch, but are still aligned when a seed elsewhere reaches them.
+"""
+import numpy as np
+
+from .sequence import INVALID
+
+DUST_WINDOW = 64
+DUST_LEVEL = 20
+
+IUPAC_SYMBOLS = b'ACGTRYSWKMBDHVN'
+_DROP = 0
+_BAD = 1
+
+NORMALIZE = np.full(256, _BAD, dtype=np.uint8)
+for _symbol in IUPAC_SYMBOLS:
+    NORMALIZE[_symbol] = NORMALIZE[_symbol + 32] = _symbol
+NORMALIZE[ord('U')] = NORMALIZE[ord('u')] = ord('T')
+NORMALIZE[ord('-')] = NORMALIZE[ord('.')] = _DROP
+
+
+class SequenceError(ValueError):
+    """The input contains a symbol that is not an IUPAC nucleotide code"""
+
+
+def normalize(raw, name='query'):
+    """Uppercase IUPAC bytes for raw sequence bytes (U -> T, gaps dropped)"""
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    symbols = NORMALIZE[raw]
+    if symbols.min(initial=255) <= _BAD:
+        bad = np.flatnonzero(symbols == _BAD)
+        if len(bad):
+            position = int(bad[0])
+            more = f' and {len(bad) - 1} more' if len(bad) > 1 else ''
+            raise SequenceError(f'{name}: invalid symbol {chr(raw[position])!r} at position {position + 1}{more}')
+        symbols = symbols[symbols != _DROP]
+    return symbols.tobytes()
+
+
+def dust_mask(codes, window=DUST_WINDOW, level=DUST_LEVEL):
+    """Boolean mask of the low-complexity bases of 2-bit codes (INVALID codes never match)"""
+    n = len(codes)
+    masked = np.zeros(n, dtype=bool)
+    if n < 3:
+        return masked
+    # Triplet codes, with bin 64 collecting the triplets that touch an INVALID code,
+    # laid out in rows of half a window and offset so each row counts into its own 65 bins
+    half = window // 2
+    count = n - 2
+    blocks = -(-count // half)
+    triplets = np.full(blocks * half, 64, dtype=np.intp)
+    head = triplets[:count]
+    np.left_shift(codes[:-2], 4, out=head, casting='unsafe')
+    head |= codes[1:-1].astype(np.intp) << 2
+    head |= codes[2:]
+    invalid = np.flatnonzero(codes >= 4)
+    if len(invalid):
+        touched = (invalid[:, None] - np.arange(3)).ravel()
+        triplets[touched[(touched >= 0) & (touched < count)]] = 64
+    triplets.reshape(blocks, half)[:] += 65 * np.arange(blocks, dtype=np.intp)[:, None]
+    counts = np.bincount(triplets, minlength=blocks * 65).reshape(blocks, 65)[:, :64]
+
+    # sum(c * (c - 1) / 2) == (sum(c * c) - l) / 2
+    counts = counts.astype(np.int16)
+    windows = counts[:-1] + counts[1:] if blocks > 1 else counts
+    sizes = windows.sum(axis=1, dtype=np.int32)
+    squares = np.einsum('ij,ij->i', windows, windows, dtype=np.int32)
+    scores = 5 * (squares - sizes) / np.maximum(sizes - 1, 1)
+    high = np.flatnonzero(scores > level)
+    if not len(high):
+        return masked
+
+    # Window w covers triplets [w * half, w * half + window), i.e. two more bases
+    delta = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(delta, high * half, 1)
+    np.add.at(delta, np.minimum(high * half + window + 2, n), -1)
+    return np.cumsum(delta[:-1]) > 0
+
+
+def masked_codes(codes, mask):
+    """Copy of codes with the masked positions set to INVALID, so no seed covers them"""
+    if mask is None or not mask.any():
+        return codes
+    codes = codes.copy()
+    codes[mask] = INVALID
+    return codes
@@ -0,0 +1,72 @@
+"""Local reference sequences and their annotation table."""
+import json
+import os
+
+from .fastx import iter_records
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_REFERENCE = os.environ.get('BIOINFO_REFERENCE', os.path.join(DATA_DIR, 'reference.fasta'))
+DEFAULT_ANNOTATIONS = os.environ.get('BIOINFO_ANNOTATIONS', os.path.join(DATA_DIR, 'annotations.json'))
+
+
+class ReferenceDatabase:
+    """Packed reference records plus per-accession annotations"""
+
+    def __init__(self, names, sequences, annotations, total_length=None):
+        self.names = list(names)
+        self.sequences = sequences if hasattr(sequences, '__getitem__') else list(sequences)
+        self.annotations = annotations
+        self._total_length = total_length
+
+    @classmethod
+    def from_fasta(cls, fasta_path=DEFAULT_REFERENCE, annotation_path=DEFAULT_ANNOTATIONS):
+        names, sequences = [], []
+        with open(fasta_path, 'rb') as handle:
+            for record in iter_records(handle):
+                names.append(record.name)
+                sequences.append(record.sequence)
+        annotations = {}
+        if annotation_path and os.path.exists(annotation_path):
+            with open(annotation_path) as handle:
+                annotations = json.load(handle)
+        return cls(names, sequences, annotations)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def total_length(self):
+        if self._total_length is None:
+            self._total_length = sum(len(seq) for seq in self.sequences)
+        return self._total_length
+
+    @property
+    def nbytes(self):
+        return sum(seq.nbytes for seq in self.sequences)
+
+    def annotation(self, idx):
+        """Annotation dict for record idx, with defaults for unannotated accessions"""
+        name = self.names[idx]
+        entry = self.annotations.get(name, {})
+        defaults = self.default_annotation(name)
+        return {key: entry.get(key, value) for key, value in defaults.items()}
+
+    @staticmethod
+    def default_annotation(accession, citation_key='genbank_accession'):
+        """Annotation for a sequence with no entry in the annotation table"""
+        return {
+            'description': 'Unannotated reference sequence',
+            'condition_association': 'No known association',
+            'label': 'PREDICTED',
+            'citations': {citation_key: accession},
+            'notes': 'Similarity-based match against an unannotated reference record',
+        }
+
+    def records_by_citation(self, key):
+        """Map citation value -> record index for one citation key (e.g. 'uniprot_id')"""
+        mapping = {}
+        for idx, name in enumerate(self.names):
+            citations = self.annotations.get(name, {}).get('citations', {})
+            if key in citations:
+                mapping[citations[key]] = idx
+        return mapping
@@ -0,0 +1,118 @@
+"""Plain-text analysis report.
+
+iter_report yields the report in pieces (header, one block per chunk of
+hits, footer), so write_report can stream it to a file. Building the
+whole string joins the pieces once, so the cost stays linear in the number
+of hits. Input sequences longer than PREVIEW_SYMBOLS are cut short, so a
+scaffold or long read does not end up in the report in full, once per hit.
+"""
+from datetime import datetime
+
+from .citations import citation_text
+from .export import alignment_columns
+from .sequence import decode_shared
+
+CHUNK_ROWS = 1000
+PREVIEW_SYMBOLS = 1000
+RULE = '=' * 80
+
+HEADER = """
+BIOINFORMATICS ANALYSIS REPORT
+Generated: {generated}
+
+INPUT SEQUENCE:
+{input_sequence}
+
+ANALYSIS SUMMARY:
+Total Matches: {total}
+Known Associations: {known}
+Predicted Associations: {predicted}
+
+DETAILED RESULTS:
+{rule}
+
+"""
+
+ENTRY = """
+Result {number}:
+-----------
+Query ID: {query_id}
+Input Sequence: {input_sequence}
+Matched Sequence: {matched_sequence}
+Similarity Score: {similarity_score}%
+E-value: {e_value:.1e}
+Bit Score: {bit_score}
+Confidence: {confidence}
+Condition Association: {condition_association}
+Label: {label}
+
+Sequence Alignment:
+Query:   {alignment_query}
+         {alignment_match}
+Subject: {alignment_subject}
+
+Alignment Statistics:
+• Identities: {alignment_identities}
+• Gaps: {alignment_gaps}
+• Strand: {alignment_strand}
+• Frame: {alignment_frame}
+
+Citations:
+{citations}
+
+Notes: {notes}
+
+{rule}
+"""
+
+ENTRY_FIELDS = ['query_id', 'matched_sequence', 'similarity_score', 'e_value', 'bit_score', 'confidence',
+                'condition_association', 'label', 'notes']
+
+FOOTER = """
+
+DISCLAIMER:
+This tool performs comparative analysis and literature-backed associations only.
+No clinical claims are made. Experimental validation is required for PREDICTED results.
+All sources are cited and should be consulted for detailed information.
+
+Analysis completed using BioinfoAnalyzer v1.0
+"""
+
+
+def preview(sequence, limit=PREVIEW_SYMBOLS):
+    """Text of a sequence (str or PackedSequence), cut after limit symbols with a note of its length"""
+    if len(sequence) <= limit:
+        return str(sequence)
+    return f'{sequence[:limit]}... [{len(sequence):,} symbols in total]'
+
+
+def iter_report(results, input_sequence):
+    """Yield the report text piece by piece"""
+    yield HEADER.format(generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), input_sequence=preview(input_sequence),
+                        total=len(results), known=results.count('label', 'KNOWN'),
+                        predicted=results.count('label', 'PREDICTED'), rule=RULE)
+    number = 0
+    for chunk in results.chunks(CHUNK_ROWS):
+        frame = chunk.frame
+        columns = {field: frame[field].tolist() for field in ENTRY_FIELDS}
+        columns['input_sequence'] = decode_shared(frame['input_sequence'], preview)
+        columns['citations'] = [citation_text(citations) for citations in frame['citations']]
+        for field, values in alignment_columns(frame).items():
+            columns[f'alignment_{field}'] = values
+        entries = []
+        for values in zip(*columns.values()):
+            number += 1
+            entries.append(ENTRY.format(number=number, rule=RULE, **dict(zip(columns, values))))
+        yield ''.join(entries)
+    yield FOOTER
+
+
+def write_report(results, input_sequence, sink):
+    """Stream the report to a binary sink"""
+    for piece in iter_report(results, input_sequence):
+        sink.write(piece.encode())
+
+
+def generate_comprehensive_report(results, input_sequence):
+    """Generate a comprehensive text report"""
+    return ''.join(iter_report(results, input_sequence))
@@ -0,0 +1,124 @@
+"""Columnar result sets.
+
+A ResultSet wraps one pandas DataFrame row per hit. label and confidence are
+categoricals (confidence ordered Low < Medium < High), and the numeric
+scores are float columns. Filtering, counting and export are column
+operations. Per-hit payloads (input sequence, citations, alignment) stay in
+object columns and are only touched when a row is rendered.
+"""
+import pandas as pd
+
+CONFIDENCE_LEVELS = ['Low', 'Medium', 'High']
+LABELS = ['KNOWN', 'PREDICTED']
+COLUMNS = ['id', 'query_id', 'input_sequence', 'matched_sequence', 'similarity_score', 'e_value', 'bit_score',
+           'confidence', 'condition_association', 'label', 'citations', 'notes', 'alignment']
+OBJECT_COLUMNS = {'input_sequence', 'citations', 'alignment', 'xrefs'}
+FLOAT_COLUMNS = {'similarity_score', 'e_value', 'bit_score'}
+
+# Display/CSV column headers for the results table
+TABLE_COLUMNS = {
+    'query_id': 'Query',
+    'matched_sequence': 'Matched Sequence',
+    'similarity_score': 'Similarity (%)',
+    'e_value': 'E-value',
+    'bit_score': 'Bit Score',
+    'confidence': 'Confidence',
+    'condition_association': 'Condition',
+    'label': 'Label',
+}
+
+
+def _coerce(frame):
+    """Apply the canonical column dtypes in place and return the frame"""
+    for column in FLOAT_COLUMNS:
+        frame[column] = frame[column].astype('float64')
+    frame['confidence'] = pd.Categorical(frame['confidence'], categories=CONFIDENCE_LEVELS, ordered=True)
+    labels = LABELS + sorted(set(frame['label'].dropna().astype(str)) - set(LABELS))
+    frame['label'] = pd.Categorical(frame['label'], categories=labels)
+    return frame
+
+
+class ResultSet:
+    """Analysis hits as one DataFrame; iterating yields one dict per hit"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from result dicts keyed by COLUMNS"""
+        data = {}
+        for column in COLUMNS:
+            values = [row[column] for row in rows]
+            data[column] = pd.Series(values, dtype=object) if column in OBJECT_COLUMNS else values
+        return cls(_coerce(pd.DataFrame(data, columns=COLUMNS)))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_rows([])
+
+    @classmethod
+    def concat(cls, result_sets):
+        frames = [results.frame for results in result_sets if len(results)]
+        if not frames:
+            return cls.empty()
+        return cls(_coerce(pd.concat(frames, ignore_index=True)))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __iter__(self):
+        return iter(self.frame.to_dict('records'))
+
+    def __getitem__(self, position):
+        return self.frame.iloc[position].to_dict()
+
+    def chunks(self, size):
+        """Consecutive ResultSets of at most size rows"""
+        for start in range(0, len(self.frame), size):
+            yield ResultSet(self.frame.iloc[start:start + size])
+
+    def with_query(self, query_id, query):
+        """Copy with the query_id / input_sequence columns filled in"""
+        return ResultSet(self.frame.assign(query_id=query_id,
+                                           input_sequence=pd.Series([query] * len(self.frame), dtype=object,
+                                                                    index=self.frame.index)))
+
+    def set_column(self, name, values):
+        """Add or replace a column (object dtype for per-hit payloads)"""
+        self.frame[name] = pd.Series(list(values), dtype=object, index=self.frame.index)
+
+    def sort_by_similarity(self):
+        return self.sort_by('similarity_score')
+
+    def sort_by(self, column, ascending=False):
+        """Stable sort on one column; ties keep their current order"""
+        return ResultSet(self.frame.sort_values(column, ascending=ascending, kind='stable'))
+
+    def page(self, number, size):
+        """ResultSet of the rows on 1-based page number of the given size"""
+        start = (number - 1) * size
+        return ResultSet(self.frame.iloc[start:start + size])
+
+    def filter(self, label=None, min_confidence=None, search=None):
+        """Rows matching a label, at least a confidence level, and a case-insensitive search term"""
+        frame = self.frame
+        keep = pd.Series(True, index=frame.index)
+        if label:
+            keep &= frame['label'] == label
+        if min_confidence:
+            keep &= frame['confidence'] >= min_confidence
+        if search:
+            keep &= (frame['matched_sequence'].str.contains(search, case=False, regex=False) |
+                     frame['condition_association'].str.contains(search, case=False, regex=False))
+        return ResultSet(frame[keep])
+
+    def count(self, column, value):
+        return int((self.frame[column] == value).sum())
+
+    def table(self):
+        """Summary table with display column headers"""
+        return self.frame[list(TABLE_COLUMNS)].rename(columns=TABLE_COLUMNS).reset_index(drop=True)
+
+    def to_csv(self):
+        return self.table().to_csv(index=False)
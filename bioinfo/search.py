@@ -0,0 +1,443 @@
+"""Seed-and-extend search of a query against the indexed reference."""
+import heapq
+
+import numpy as np
+
+from . import metrics
+from .align import DEFAULT_SCORING, NEG, band_alignments, band_scores, subject_window, ungapped_scores
+from .index import KmerIndex
+from .preprocess import dust_mask, masked_codes
+from .sketch import MinimizerSketch
+from .stats import karlin_altschul
+from .sequence import PackedSequence
+from .translate import DEFAULT_PROTEIN_SCORING, STANDARD_RESIDUES, ProteinSequence, six_frames
+
+# Candidates extended per block when only the top max_hits records are wanted
+EXTEND_BLOCK = 256
+# PatternHunter's weight-11 spaced seed
+SPACED_SEED = '111010010100110111'
+
+# Analysis modes, from fewest to most candidates per nucleotide query:
+#   sketch_candidates: extend only the records with the best minimizer-sketch
+#                      containment (None: every record with a seed hit)
+#   spaced_seeds:      also seed with SPACED_SEED, reaching diverged homologs
+#                      that share no exact k-mer with the query
+SEARCH_MODES = {
+    'Fast Scan': {'sketch_candidates': 32, 'spaced_seeds': False},
+    'Comprehensive': {'sketch_candidates': None, 'spaced_seeds': False},
+    'High Sensitivity': {'sketch_candidates': None, 'spaced_seeds': True},
+}
+
+
+def cluster_diagonals(records, diagonals, band):
+    """Collapse seed hits into one candidate diagonal per (record, band-wide cluster)
+
+    Returns (records, diagonals, seed counts) of the representative diagonal of
+    each cluster, chosen as the diagonal carrying the most seeds, and the
+    cluster number of every seed hit.
+    """
+    order = np.lexsort((diagonals, records))
+    pairs, inverse, counts = np.unique(np.stack([records[order], diagonals[order]], axis=1), axis=0,
+                                       return_inverse=True, return_counts=True)
+    rec, diag = pairs[:, 0], pairs[:, 1]
+    new_cluster = np.ones(len(rec), dtype=bool)
+    new_cluster[1:] = (rec[1:] != rec[:-1]) | (diag[1:] - diag[:-1] > band)
+    cluster_id = np.cumsum(new_cluster) - 1
+
+    # Representative: the most-seeded diagonal of each cluster
+    by_count = np.lexsort((-counts, cluster_id))
+    first = np.ones(len(by_count), dtype=bool)
+    first[1:] = cluster_id[by_count][1:] != cluster_id[by_count][:-1]
+    chosen = by_count[first]
+    seeds = np.bincount(cluster_id, weights=counts).astype(np.int64)
+    clusters = np.empty(len(order), dtype=np.int64)
+    clusters[order] = cluster_id[inverse.ravel()]
+    return rec[chosen], diag[chosen], seeds, clusters
+
+
+def trim_subject(hit):
+    """Copy of a hit holding only the aligned slice of its subject, which starts at subject_start
+
+    A hit trimmed before keeps counting subject_start from its original subject.
+    """
+    hit = dict(hit)
+    index = hit['subject_index']
+    aligned = index[index >= 0]
+    lo, hi = int(aligned.min()), int(aligned.max()) + 1
+    subject = hit['subject']
+    if isinstance(subject, PackedSequence):
+        hit['subject'] = subject.slice(lo, hi)
+    else:
+        hit['subject'] = ProteinSequence(np.array(subject.residues[lo:hi]))
+    hit['subject_index'] = np.where(index >= 0, index - lo, -1)
+    hit['subject_start'] = hit.get('subject_start', 0) + lo
+    return hit
+
+
+class SearchEngine:
+    """k-mer seeded, banded gapped extension search over a ReferenceDatabase
+
+    Nucleotide queries are searched on both strands, and optionally as six
+    translated frames against a protein index. Every strand or frame goes
+    through a single seeding pass of its index. The minimizer sketch (Fast
+    Scan) and the spaced-seed index (High Sensitivity) are built on first
+    use unless given.
+    """
+
+    def __init__(self, reference, k=11, band=16, proteins=None, protein_k=3, index=None, protein_index=None,
+                 sketch=None):
+        self.reference = reference
+        self.band = band
+        self.index = index if index is not None else KmerIndex(reference.sequences, k=k)
+        self._sketch = sketch
+        self._spaced_index = None
+        self.db_length = reference.total_length
+        self.num_sequences = len(reference)
+
+        self.protein_names, self.proteins = proteins if proteins else ([], [])
+        self.protein_index = protein_index
+        if self.proteins and protein_index is None:
+            self.protein_index = KmerIndex(self.proteins, k=protein_k, bits=5,
+                                           alphabet_size=STANDARD_RESIDUES)
+        self.protein_length = sum(len(protein) for protein in self.proteins)
+        self.num_proteins = len(self.proteins)
+
+    @property
+    def sketch(self):
+        if self._sketch is None:
+            self._sketch = MinimizerSketch(self.reference.sequences)
+        return self._sketch
+
+    @property
+    def spaced_index(self):
+        if self._spaced_index is None:
+            self._spaced_index = KmerIndex(self.reference.sequences, pattern=SPACED_SEED,
+                                           max_occurrences=self.index.max_occurrences)
+        return self._spaced_index
+
+    def windows(self, subjects, records, diagonals, query_length):
+        """Stack the banded subject window of every candidate"""
+        return np.stack([
+            subject_window(subjects[record], diag - self.band, diag + query_length + self.band)
+            for record, diag in zip(records.tolist(), diagonals.tolist())
+        ])
+
+    def extend(self, indexes, subjects, queries, scoring, min_score, max_hits=None, allowed=None,
+               seed_queries=None):
+        """Seed every query variant in one pass per index and align the best candidate per record
+
+        indexes are KmerIndexes over the same subjects (contiguous and
+        spaced seeds). queries is a list of encoded variants of one query
+        (strands or frames). Returns [(variant number, record, score,
+        query_index, subject_index)] with gaps marked -1. Only candidates
+        with a seed whose ungapped X-drop extension reaches the scoring's
+        gap trigger (or min_score, if lower) get the banded gapped
+        extension. With max_hits,
+        only the max_hits best-scoring records are aligned (see top_scores);
+        with allowed, only those records are considered at all. seed_queries,
+        if given, are the variants seeded in place of queries (low-complexity
+        bases masked); extension always uses queries.
+        """
+        with metrics.timer('seed'):
+            seeded = [index.seeds_many(queries if seed_queries is None else seed_queries) for index in indexes]
+            numbers, qpos, spos = (np.concatenate(arrays) for arrays in zip(*seeded))
+            index = indexes[0]
+            records, local = index.locate(spos)
+            if allowed is not None:
+                inside = np.isin(records, allowed)
+                numbers, qpos, records, local = numbers[inside], qpos[inside], records[inside], local[inside]
+            metrics.count('seeds', len(qpos))
+            if not len(qpos):
+                return []
+            n_records = len(index.offsets) - 1
+            keys, diagonals, seeds, clusters = cluster_diagonals(numbers * n_records + records, local - qpos,
+                                                                 self.band)
+            numbers, records = keys // n_records, keys % n_records
+
+        with metrics.timer('ungapped'):
+            # Seeds found by both indexes are extended once
+            distinct = np.unique(np.stack([clusters, local - qpos, qpos]), axis=1)
+            stats = karlin_altschul(scoring)
+            seed_scores = self.ungapped(subjects, queries, numbers[distinct[0]], records[distinct[0]], distinct[1],
+                                        distinct[2], scoring, stats.score_drop(scoring.xdrop_bits))
+            metrics.count('ungapped_extensions', distinct.shape[1])
+            ungapped = np.full(len(keys), NEG, dtype=np.int64)
+            np.maximum.at(ungapped, distinct[0], seed_scores)
+            # A seed's ungapped path lies inside the band of any candidate within band diagonals of it, so the best
+            # such path is a lower bound on the candidate's gapped score
+            near = np.abs(distinct[1] - diagonals[distinct[0]]) <= self.band
+            lower = np.zeros(len(keys), dtype=np.int64)
+            np.maximum.at(lower, distinct[0][near], seed_scores[near])
+            gated = ungapped >= min(min_score, stats.raw_score(scoring.gap_trigger_bits))
+            keys, numbers, records, diagonals, seeds, lower = (
+                array[gated] for array in (keys, numbers, records, diagonals, seeds, lower))
+
+        with metrics.timer('extend'):
+            if max_hits is None:
+                scores = self.scores(subjects, queries, numbers, records, diagonals, scoring, min_score,
+                                     np.arange(len(keys)))
+                metrics.count('extensions', len(keys))
+            else:
+                # No alignment can pair more bases than the query and the subject in its window both hold
+                lengths = np.array([len(query) for query in queries])[numbers]
+                overlap = (np.minimum(diagonals + lengths + self.band, np.diff(index.offsets)[records])
+                           - np.maximum(diagonals - self.band, 0))
+                upper = scoring.match * np.clip(np.minimum(lengths, overlap), 0, None)
+                scores = self.top_scores(subjects, queries, numbers, records, diagonals, seeds, lower, upper,
+                                         scoring, min_score, max_hits)
+
+        # Keep only the best-scoring candidate per record before traceback
+        order = np.lexsort((-scores, records))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = records[order][1:] != records[order][:-1]
+        keep = order[first]
+        keep = keep[scores[keep] >= min_score]
+        if max_hits is not None and len(keep) > max_hits:
+            keep = keep[np.lexsort((records[keep], -scores[keep]))[:max_hits]]
+
+        metrics.count('alignments', len(keep))
+        hits = []
+        with metrics.timer('traceback'):
+            for number in np.unique(numbers[keep]).tolist():
+                sel = keep[numbers[keep] == number]
+                windows = self.windows(subjects, records[sel], diagonals[sel], len(queries[number]))
+                alignments = band_alignments(queries[number], windows, scoring, self.band)
+                for c, (score, q_idx, s_idx) in zip(sel.tolist(), alignments):
+                    start = int(diagonals[c]) - self.band
+                    hits.append((number, int(records[c]), score, q_idx, np.where(s_idx >= 0, s_idx + start, -1)))
+        return hits
+
+    def ungapped(self, subjects, queries, numbers, records, diagonals, anchors, scoring, xdrop):
+        """Ungapped X-drop score through every seed, given by its diagonal and query position (anchor)"""
+        scores = np.empty(len(records), dtype=np.int64)
+        for number in np.unique(numbers).tolist():
+            part = np.flatnonzero(numbers == number)
+            length = len(queries[number])
+            for start in range(0, len(part), EXTEND_BLOCK):
+                sel = part[start:start + EXTEND_BLOCK]
+                windows = np.stack([subject_window(subjects[record], diag, diag + length)
+                                    for record, diag in zip(records[sel].tolist(), diagonals[sel].tolist())])
+                scores[sel] = ungapped_scores(queries[number], windows, anchors[sel], scoring, xdrop, band=0)
+        return scores
+
+    def scores(self, subjects, queries, numbers, records, diagonals, scoring, min_score, sel):
+        """Banded extension scores of the candidates sel (NEG where abandoned below min_score)"""
+        scores = np.empty(len(sel), dtype=np.int32)
+        for number in np.unique(numbers[sel]).tolist():
+            part = np.flatnonzero(numbers[sel] == number)
+            chosen = sel[part]
+            windows = self.windows(subjects, records[chosen], diagonals[chosen], len(queries[number]))
+            scores[part] = band_scores(queries[number], windows, scoring, self.band, min_score=min_score)
+        return scores
+
+    def top_scores(self, subjects, queries, numbers, records, diagonals, seeds, lower, upper, scoring, min_score,
+                   max_hits):
+        """Extension scores when only the max_hits best records are wanted
+
+        lower and upper bound each candidate's score. The cutoff starts at
+        the max_hits-th best lower bound over records: that many records
+        are known to reach it. Candidates are extended in blocks, highest
+        lower bound (then most seeds) first; the first block ends with the
+        candidates that set the starting cutoff. A bounded heap holds the best
+        score of each of the top max_hits records seen so far
+        (heapq.nlargest); once it is full, the cutoff rises past its
+        smallest entry. The cutoff is passed to the extension as the abandon
+        threshold, and candidates whose upper bound is below it are skipped
+        and keep score NEG. Ties at the cutoff go to the candidates extended
+        first, then to the lower record index.
+        """
+        scores = np.full(len(records), NEG, dtype=np.int32)
+        order = np.lexsort((-seeds, -lower))
+        # Best remaining upper bound from each position of order on
+        remaining = np.maximum.accumulate(upper[order][::-1])[::-1]
+        block = max(EXTEND_BLOCK, max_hits)
+        best = {}
+        # Each record's first place in order holds its best lower bound
+        firsts = np.sort(np.unique(records[order], return_index=True)[1])
+        cutoff, starts = min_score, range(0, len(order), block)
+        if len(firsts) >= max_hits:
+            cutoff = max(min_score, int(lower[order[firsts[max_hits - 1]]]))
+            starts = [0, *range(int(firsts[max_hits - 1]) + 1, len(order), block)]
+        for start, end in zip(starts, [*starts[1:], len(order)]):
+            if remaining[start] < cutoff:
+                metrics.count('extensions_skipped', len(order) - start)
+                break
+            sel = order[start:end]
+            viable = upper[sel] >= cutoff
+            metrics.count('extensions_skipped', len(sel) - int(viable.sum()))
+            sel = sel[viable]
+            scores[sel] = self.scores(subjects, queries, numbers, records, diagonals, scoring, cutoff, sel)
+            metrics.count('extensions', len(sel))
+            for record, score in zip(records[sel].tolist(), scores[sel].tolist()):
+                if score >= cutoff and score > best.get(record, NEG):
+                    best[record] = score
+            top = heapq.nlargest(max_hits, best.values())
+            if len(top) == max_hits:
+                cutoff = max(cutoff, top[-1] + 1)
+                best = {record: score for record, score in best.items() if score >= top[-1]}
+        return scores
+
+    @staticmethod
+    def min_score(stats, search_space, evalue_threshold):
+        if evalue_threshold is None:
+            return 1
+        return max(1, stats.min_score(evalue_threshold, search_space))
+
+    def search(self, query, scoring=DEFAULT_SCORING, evalue_threshold=None, strands='both', max_hits=None,
+               mode='Comprehensive', dust=True):
+        """Return the best gapped alignment per reference record of a PackedSequence query
+
+        Each hit is a dict with the record index, raw score, bit score, E-value,
+        strand, the oriented query (reverse complemented for Plus/Minus hits),
+        the subject sequence and the aligned query/subject positions (-1 for
+        gaps). An evalue_threshold is converted to a minimum raw score so
+        hopeless candidates are abandoned during extension, not after it. max_hits
+        keeps only that many records, ranked by alignment score. mode is a
+        key of SEARCH_MODES. With dust, low-complexity regions of the query
+        are excluded from seeding and the sketch (see preprocess.dust_mask).
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'unknown analysis mode {mode!r}')
+        settings = SEARCH_MODES[mode]
+        variants = [('Plus/Plus', query)]
+        if strands == 'both':
+            variants.append(('Plus/Minus', query.reverse_complement()))
+        with metrics.timer('statistics'):
+            stats = karlin_altschul(scoring)
+            search_space = stats.search_space(len(query), self.db_length, self.num_sequences)
+            min_score = self.min_score(stats, search_space, evalue_threshold)
+        if scoring.match * len(query) < min_score:
+            return []
+
+        queries = [oriented.codes() for _, oriented in variants]
+        seed_queries = queries
+        if dust:
+            with metrics.timer('mask'):
+                mask = dust_mask(queries[0])
+            metrics.count('masked_bases', int(mask.sum()))
+            # The minus strand's mask is the plus strand's, reversed
+            seed_queries = [masked_codes(codes, mask if number == 0 else mask[::-1])
+                            for number, codes in enumerate(queries)]
+
+        allowed = None
+        if settings['sketch_candidates']:
+            with metrics.timer('sketch'):
+                allowed = self.sketch.candidates(seed_queries[0], settings['sketch_candidates'])
+            metrics.count('sketch_candidates', len(allowed))
+            if not len(allowed):
+                return []
+        indexes = [self.index, self.spaced_index] if settings['spaced_seeds'] else [self.index]
+
+        hits = []
+        for number, record, score, q_idx, s_idx in self.extend(
+                indexes, self.reference.sequences, queries, scoring, min_score, max_hits, allowed, seed_queries):
+            strand, oriented = variants[number]
+            hits.append({
+                'record': record,
+                'score': score,
+                'bit_score': stats.bit_score(score),
+                'e_value': stats.evalue(score, search_space),
+                'strand': strand,
+                'query': oriented,
+                'subject': self.reference.sequences[record],
+                'query_index': q_idx,
+                'subject_index': s_idx,
+            })
+        return hits
+
+    def search_translated(self, query, scoring=DEFAULT_PROTEIN_SCORING, evalue_threshold=None, max_hits=None):
+        """Six-frame translated search of a PackedSequence query against the protein index
+
+        Hits carry the protein index, frame label and translated frame residues
+        in place of a record and strand.
+        """
+        if self.protein_index is None:
+            return []
+        frames = six_frames(query)
+        with metrics.timer('statistics'):
+            stats = karlin_altschul(scoring)
+            search_space = stats.search_space(len(query) // 3, self.protein_length, self.num_proteins)
+            min_score = self.min_score(stats, search_space, evalue_threshold)
+        if scoring.match * (len(query) // 3) < min_score:
+            return []
+
+        hits = []
+        queries = [residues for _, residues in frames]
+        for number, protein, score, q_idx, s_idx in self.extend(
+                [self.protein_index], self.proteins, queries, scoring, min_score, max_hits):
+            hits.append({
+                'protein': protein,
+                'score': score,
+                'bit_score': stats.bit_score(score),
+                'e_value': stats.evalue(score, search_space),
+                'frame': frames[number][0],
+                'query': frames[number][1],
+                'subject': self.proteins[protein],
+                'query_index': q_idx,
+                'subject_index': s_idx,
+            })
+        return hits
+
+
+class PartitionedEngine:
+    """SearchEngine's search interface over a database split into partitions (shards or segments)
+
+    Subclasses set record_offsets and protein_offsets (the global index of
+    each partition's first record and protein), the whole database's
+    db_length, num_sequences, protein_length and num_proteins, and retired
+    (per partition, the set of local record indexes to leave out). They
+    implement _call_all(method, *args, **kwargs), which runs a SearchEngine
+    method on every partition and returns the replies in partition order.
+    Every partition is expected to search with the whole database's totals,
+    so it applies the same score cutoff as a single unsplit engine.
+    """
+
+    TOTALS = ('db_length', 'num_sequences', 'protein_length', 'num_proteins')
+
+    def _merge(self, replies, offsets, key, max_hits):
+        """All partitions' live hits with global indexes, best score first (ties to the lower index)"""
+        hits = []
+        for offset, retired, part_hits in zip(offsets, self.retired, replies):
+            for hit in part_hits:
+                if key == 'record' and hit[key] in retired:
+                    continue
+                hit[key] += offset
+                hits.append(hit)
+        hits.sort(key=lambda hit: (-hit['score'], hit[key]))
+        return hits if max_hits is None else hits[:max_hits]
+
+    def search(self, query, scoring=DEFAULT_SCORING, evalue_threshold=None, strands='both', max_hits=None,
+               mode='Comprehensive', dust=True):
+        """SearchEngine.search over every partition; E-values are over the whole database"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'unknown analysis mode {mode!r}')
+        with metrics.timer('scatter_gather'):
+            replies = self._call_all('search', query, scoring, evalue_threshold, strands, mode=mode, dust=dust,
+                                     max_hits=max_hits)
+        hits = self._merge(replies, self.record_offsets, 'record', max_hits)
+        oriented = {'Plus/Plus': query}
+        if strands == 'both':
+            oriented['Plus/Minus'] = query.reverse_complement()
+        stats = karlin_altschul(scoring)
+        search_space = stats.search_space(len(query), self.db_length, self.num_sequences)
+        for hit in hits:
+            hit['query'] = oriented[hit['strand']]
+            hit['bit_score'] = stats.bit_score(hit['score'])
+            hit['e_value'] = stats.evalue(hit['score'], search_space)
+        return hits
+
+    def search_translated(self, query, scoring=DEFAULT_PROTEIN_SCORING, evalue_threshold=None, max_hits=None):
+        """SearchEngine.search_translated over every partition's proteins"""
+        if not self.num_proteins:
+            return []
+        with metrics.timer('scatter_gather'):
+            replies = self._call_all('search_translated', query, scoring, evalue_threshold, max_hits=max_hits)
+        hits = self._merge(replies, self.protein_offsets, 'protein', max_hits)
+        frames = dict(six_frames(query)) if hits else {}
+        stats = karlin_altschul(scoring)
+        search_space = stats.search_space(len(query) // 3, self.protein_length, self.num_proteins)
+        for hit in hits:
+            hit['query'] = frames[hit['frame']]
+            hit['bit_score'] = stats.bit_score(hit['score'])
+            hit['e_value'] = stats.evalue(hit['score'], search_space)
+        return hits
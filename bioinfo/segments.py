@@ -0,0 +1,331 @@
+"""Incrementally updated reference database.
+
+A database directory holds immutable segment files and JSON snapshots:
+
+    data/db/
+        CURRENT                 name of the live snapshot
+        snapshot-000004.json    {version, created, segments: [{file, version, retired}]}
+        segment-000000.bdb      base segment (the initial or compacted build)
+        segment-000003.bdb      delta segment: the records added by one update
+
+Segments are ordinary database files (database.write_database) and are
+never modified after they are written. An update
+(`python -m bioinfo.segments apply release.fasta --retire retired.txt`)
+writes only the new records, as one delta segment. Retirements are stored
+as tombstones: the accession is listed under 'retired' for the segment that
+holds it. An accession that reappears in an update is retired from its old
+segment, so the newest copy wins.
+
+Publishing a snapshot is atomic. The new snapshot file is written next to
+the old one, then CURRENT is replaced with os.replace, so a reader sees
+either the old snapshot or the new one, never a mix. Readers map the
+segment files of the snapshot they loaded and keep searching them until
+they load another. Publishing never deletes anything: compaction removes
+the snapshots that were superseded more than GRACE_SECONDS ago, and the
+segment files only those snapshots used, so a reader that has just read
+CURRENT always finds the files it names.
+
+Compaction (`python -m bioinfo.segments compact`) merges the live records
+of all segments into one new base segment and publishes it as a new
+snapshot. apply starts a compaction in a background process once there are
+more than MAX_DELTAS delta segments, or once more than MAX_RETIRED of the
+records are tombstoned. Writers (apply, compact) take turns on a lock file;
+readers never lock.
+
+SegmentedEngine searches every segment of a snapshot, with one SearchEngine
+each, and merges the hits like the shard coordinator (see
+search.PartitionedEngine). Retired records are dropped, and E-values are
+computed over the live records only.
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .database import load_database, write_database
+from .reference import DEFAULT_ANNOTATIONS, DEFAULT_REFERENCE, ReferenceDatabase
+from .search import PartitionedEngine, SearchEngine
+from .translate import DEFAULT_PROTEINS, load_proteins
+
+MAX_DELTAS = 8
+MAX_RETIRED = 0.2
+# Superseded snapshots and their segment files are kept at least this long for readers still loading them
+GRACE_SECONDS = 600
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def is_segmented(path):
+    """True if path is a segmented database directory"""
+    return os.path.isfile(os.path.join(path, 'CURRENT'))
+
+
+def current_snapshot(path):
+    """Name of the live snapshot of a segmented database directory, or None for anything else"""
+    try:
+        with open(os.path.join(path, 'CURRENT')) as handle:
+            return handle.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def read_snapshot(directory, name=None):
+    """Snapshot dict (the live one unless name is given)"""
+    name = name or current_snapshot(directory)
+    with open(os.path.join(directory, name)) as handle:
+        return dict(json.load(handle), name=name)
+
+
+@contextlib.contextmanager
+def writer_lock(directory):
+    """Exclusive lock held by apply and compact while they build and publish a snapshot"""
+    with open(os.path.join(directory, 'LOCK'), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _next_number(directory, prefix):
+    numbers = [int(name[len(prefix) + 1:].split('.')[0]) for name in os.listdir(directory)
+               if name.startswith(prefix + '-')]
+    return max(numbers, default=-1) + 1
+
+
+def _write_segment(directory, reference, proteins, k=11, protein_k=3):
+    """Write a new segment file; returns its snapshot entry"""
+    name = f'segment-{_next_number(directory, "segment"):06d}.bdb'
+    version = write_database(reference, proteins, os.path.join(directory, name), k, protein_k)
+    return {'file': name, 'version': version, 'retired': []}
+
+
+def _publish(directory, segments):
+    """Write a snapshot of segments and make it live; returns its version"""
+    digest = hashlib.sha256(json.dumps([[segment['version'], segment['retired']] for segment in segments],
+                                       sort_keys=True).encode())
+    name = f'snapshot-{_next_number(directory, "snapshot"):06d}.json'
+    snapshot = {'version': digest.hexdigest()[:16], 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'segments': segments}
+    for target, text in ((name, json.dumps(snapshot, indent=1)), ('CURRENT', name)):
+        with open(os.path.join(directory, target + '.tmp'), 'w') as handle:
+            handle.write(text)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(os.path.join(directory, target + '.tmp'), os.path.join(directory, target))
+    return snapshot['version']
+
+
+def collect_garbage(directory, grace=None):
+    """Delete snapshots superseded more than grace seconds ago and the files only they use; returns their names
+
+    A snapshot counts as superseded from the moment its successor was
+    written. Call with the writer lock held.
+    """
+    grace = GRACE_SECONDS if grace is None else grace
+    snapshots = sorted(entry for entry in os.listdir(directory)
+                       if entry.startswith('snapshot-') and entry.endswith('.json'))
+    live, now = current_snapshot(directory), time.time()
+    keep = set()
+    for name, successor in zip(snapshots, snapshots[1:] + [None]):
+        if name == live or successor is None or now - os.path.getmtime(os.path.join(directory, successor)) < grace:
+            keep.add(name)
+            keep.update(segment['file'] for segment in read_snapshot(directory, name)['segments'])
+    doomed = sorted(entry for entry in os.listdir(directory)
+                    if entry.startswith(('snapshot-', 'segment-')) and entry not in keep)
+    for entry in doomed:
+        os.remove(os.path.join(directory, entry))
+    return doomed
+
+
+def init_database(directory, fasta_path=DEFAULT_REFERENCE, annotation_path=DEFAULT_ANNOTATIONS,
+                  protein_path=DEFAULT_PROTEINS, k=11, protein_k=3):
+    """Create a segmented database whose base segment holds the whole reference; returns its version"""
+    os.makedirs(directory, exist_ok=True)
+    with writer_lock(directory):
+        if is_segmented(directory):
+            raise FileExistsError(f'{directory} already holds a segmented database')
+        reference = ReferenceDatabase.from_fasta(fasta_path, annotation_path)
+        segment = _write_segment(directory, reference, load_proteins(protein_path), k, protein_k)
+        return _publish(directory, [segment])
+
+
+def needs_compaction(snapshot, databases):
+    """True once the snapshot has too many delta segments or too many tombstones"""
+    total = sum(len(database.reference) for database in databases)
+    retired = sum(len(segment['retired']) for segment in snapshot['segments'])
+    return len(snapshot['segments']) - 1 > MAX_DELTAS or (total and retired / total > MAX_RETIRED)
+
+
+def apply_update(directory, fasta_path=None, annotation_path=None, retire=(), background_compaction=True):
+    """Add the records of fasta_path as a delta segment and retire the given accessions
+
+    Returns (snapshot version, records added, records retired).
+    """
+    with writer_lock(directory):
+        snapshot = read_snapshot(directory)
+        segments = [dict(segment, retired=list(segment['retired'])) for segment in snapshot['segments']]
+        databases = [load_database(os.path.join(directory, segment['file'])) for segment in segments]
+        added = ReferenceDatabase.from_fasta(fasta_path, annotation_path) if fasta_path else None
+        retiring = set(retire) | set(added.names if added else ())
+
+        retired = 0
+        for segment, database in zip(segments, databases):
+            live = set(database.reference.names) - set(segment['retired'])
+            newly = sorted(live & retiring)
+            segment['retired'] += newly
+            retired += len(newly)
+            if added is not None:
+                # A replaced record keeps its annotation unless the update brings a new one
+                for name in newly:
+                    if name in added.names and name not in added.annotations and name in database.reference.annotations:
+                        added.annotations[name] = database.reference.annotations[name]
+        if added is not None and len(added):
+            base = databases[0]
+            segments.append(_write_segment(directory, added, ([], []), base.index.k))
+            databases.append(load_database(os.path.join(directory, segments[-1]['file'])))
+        version = _publish(directory, segments)
+        compact_now = needs_compaction({'segments': segments}, databases)
+    if compact_now and background_compaction:
+        compact_in_background(directory)
+    return version, len(added) if added is not None else 0, retired
+
+
+def compact(directory):
+    """Merge the live records of every segment into one base segment and collect garbage; returns the version"""
+    with writer_lock(directory):
+        snapshot = read_snapshot(directory)
+        names, sequences, annotations, protein_names, proteins = [], [], {}, [], []
+        k = protein_k = None
+        for segment in snapshot['segments']:
+            database = load_database(os.path.join(directory, segment['file']))
+            reference = database.reference
+            k = k or database.index.k
+            if database.protein_index is not None:
+                protein_k = protein_k or database.protein_index.k
+            retired = set(segment['retired'])
+            for number, name in enumerate(reference.names):
+                if name not in retired:
+                    names.append(name)
+                    sequences.append(reference.sequences[number])
+                    if name in reference.annotations:
+                        annotations[name] = reference.annotations[name]
+            segment_proteins = database.proteins
+            protein_names += segment_proteins[0]
+            proteins += list(segment_proteins[1])
+        segment = _write_segment(directory, ReferenceDatabase(names, sequences, annotations),
+                                 (protein_names, proteins), k, protein_k or 3)
+        version = _publish(directory, [segment])
+        collect_garbage(directory)
+        return version
+
+
+def compact_in_background(directory):
+    """Start compact() in a detached process; readers keep searching the current snapshot meanwhile"""
+    return subprocess.Popen([sys.executable, '-m', 'bioinfo.segments', 'compact', directory], cwd=PACKAGE_ROOT,
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+class SegmentedEngine(PartitionedEngine):
+    """Searches every segment of one snapshot and merges their live hits
+
+    The segment files stay mapped for the engine's lifetime, so searches
+    keep seeing this snapshot after a newer one is published.
+    """
+
+    def __init__(self, directory, name=None):
+        snapshot = read_snapshot(directory, name)
+        self.snapshot = snapshot['name']
+        self.version = snapshot['version']
+        databases = [load_database(os.path.join(directory, segment['file'])) for segment in snapshot['segments']]
+        self.engines = [SearchEngine(database.reference, proteins=database.proteins, index=database.index,
+                                     protein_index=database.protein_index, sketch=database.sketch)
+                        for database in databases]
+
+        names, annotations, self.retired = [], {}, []
+        for segment, database in zip(snapshot['segments'], databases):
+            reference = database.reference
+            retired = set(segment['retired'])
+            self.retired.append({number for number, name in enumerate(reference.names) if name in retired})
+            names += reference.names
+            annotations.update((name, entry) for name, entry in reference.annotations.items() if name not in retired)
+        self.record_offsets = np.cumsum([0] + [len(engine.reference) for engine in self.engines[:-1]]).tolist()
+        self.protein_offsets = np.cumsum([0] + [engine.num_proteins for engine in self.engines[:-1]]).tolist()
+        self.protein_names = [name for engine in self.engines for name in engine.protein_names]
+
+        # Totals over the live records only, shared by every segment's engine
+        lengths = [np.asarray(database.reference.sequences.lengths) for database in databases]
+        self.db_length = int(sum(length.sum() - length[sorted(retired)].sum()
+                                 for length, retired in zip(lengths, self.retired)))
+        self.num_sequences = len(names) - sum(map(len, self.retired))
+        self.protein_length = sum(engine.protein_length for engine in self.engines)
+        self.num_proteins = sum(engine.num_proteins for engine in self.engines)
+        for engine in self.engines:
+            for total in self.TOTALS:
+                setattr(engine, total, getattr(self, total))
+        self.reference = ReferenceDatabase(names, (), annotations, total_length=self.db_length)
+
+    def _call_all(self, method, *args, max_hits=None, **kwargs):
+        # Ask each segment for enough hits that its top max_hits live ones survive the tombstones
+        return [getattr(engine, method)(*args, max_hits=None if max_hits is None else max_hits + len(retired),
+                                        **kwargs)
+                for engine, retired in zip(self.engines, self.retired)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bioinfo.segments',
+                                     description='Maintain an incrementally updated reference database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init = commands.add_parser('init', help='Create a segmented database from a reference FASTA')
+    init.add_argument('directory')
+    init.add_argument('fasta', nargs='?', default=DEFAULT_REFERENCE)
+    init.add_argument('--annotations', default=DEFAULT_ANNOTATIONS)
+    init.add_argument('--proteins', default=DEFAULT_PROTEINS)
+    init.add_argument('-k', type=int, default=11, help='nucleotide seed length')
+    apply = commands.add_parser('apply', help='Add new or changed records and retire accessions')
+    apply.add_argument('directory')
+    apply.add_argument('fasta', nargs='?', help='records to add; an existing accession is replaced')
+    apply.add_argument('--annotations', help='annotation table for the added records')
+    apply.add_argument('--retire', help='file of accessions to retire, one per line')
+    apply.add_argument('--no-compaction', action='store_true', help='never start a background compaction')
+    compaction = commands.add_parser('compact', help='Merge every segment into one')
+    compaction.add_argument('directory')
+    status = commands.add_parser('status', help='Show the live snapshot')
+    status.add_argument('directory')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == 'init':
+        version = init_database(args.directory, args.fasta, args.annotations, args.proteins, args.k)
+        print(f'Created {args.directory} (version {version})', file=sys.stderr)
+    elif args.command == 'apply':
+        retire = []
+        if args.retire:
+            with open(args.retire) as handle:
+                retire = [line.strip() for line in handle if line.strip()]
+        version, added, retired = apply_update(args.directory, args.fasta, args.annotations, retire,
+                                               not args.no_compaction)
+        print(f'Added {added} and retired {retired} records (version {version}) '
+              f'in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    elif args.command == 'compact':
+        version = compact(args.directory)
+        print(f'Compacted {args.directory} (version {version}) in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+    else:
+        snapshot = read_snapshot(args.directory)
+        print(f"{snapshot['name']} version {snapshot['version']} created {snapshot['created']}")
+        for segment in snapshot['segments']:
+            database = load_database(os.path.join(args.directory, segment['file']))
+            print(f"  {segment['file']}: {len(database.reference)} records, {len(segment['retired'])} retired")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""2-bit packed nucleotide sequences.
+
+A PackedSequence stores A/C/G/T at four bases per byte in a uint8 array.
+Any other symbol (N, IUPAC ambiguity codes, alignment gaps) is stored in a
+sparse side mask of (position, symbol) pairs and overrides the packed base
+on decode. All conversions are NumPy table lookups; there are no per-base
+Python loops.
+"""
+import hashlib
+
+import numpy as np
+
+BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+INVALID = 255
+
+BASE_CODES = np.full(256, INVALID, dtype=np.uint8)
+for _code, _base in enumerate(b'ACGT'):
+    BASE_CODES[_base] = _code
+    BASE_CODES[_base + 32] = _code
+
+UPPERCASE = np.arange(256, dtype=np.uint8)
+UPPERCASE[ord('a'):ord('z') + 1] -= 32
+
+COMPLEMENT = np.arange(256, dtype=np.uint8)
+for _a, _b in ('AT', 'CG', 'RY', 'KM', 'BV', 'DH'):
+    COMPLEMENT[ord(_a)], COMPLEMENT[ord(_b)] = ord(_b), ord(_a)
+
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+_MATCH_SYMBOLS = np.frombuffer(b' |', dtype=np.uint8)
+
+
+def encode_bases(sequence):
+    """Map a nucleotide string or bytes to codes 0-3 (255 for anything that is not ACGT)"""
+    if isinstance(sequence, str):
+        sequence = sequence.encode('ascii')
+    return BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+
+
+def match_line(matches):
+    """Render a boolean identity array as the '|' line of an alignment block"""
+    return _MATCH_SYMBOLS[matches.astype(np.uint8)].tobytes().decode('ascii')
+
+
+def pack_codes(codes):
+    """Pack codes 0-3 into bytes, four bases per byte, most significant first"""
+    padded = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes & 3
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+
+def unpack_codes(packed, start, end):
+    """Unpack codes for bases [start, end) from a packed byte array"""
+    first, last = start // 4, (end + 3) // 4
+    codes = (packed[first:last, None] >> _SHIFTS) & 3
+    offset = start - first * 4
+    return codes.ravel()[offset:offset + end - start]
+
+
+def decode_many(sequences):
+    """Decode many PackedSequences (other items go through str) with one unpack over their packed bytes"""
+    sequences = list(sequences)
+    packed = [(i, seq) for i, seq in enumerate(sequences) if isinstance(seq, PackedSequence)]
+    decoded = [None if isinstance(seq, PackedSequence) else str(seq) for seq in sequences]
+    if not packed:
+        return decoded
+    sizes = np.array([len(seq.packed) for _, seq in packed], dtype=np.int64)
+    starts = 4 * (np.cumsum(sizes) - sizes)
+    symbols = BASES[unpack_codes(np.concatenate([seq.packed for _, seq in packed]), 0, 4 * int(sizes.sum()))]
+    positions = np.concatenate([seq.mask_positions + start for (_, seq), start in zip(packed, starts.tolist())])
+    symbols[positions] = np.concatenate([seq.mask_symbols for _, seq in packed])
+    text = symbols.tobytes().decode('ascii')
+    for (i, seq), start in zip(packed, starts.tolist()):
+        decoded[i] = text[start:start + seq.length]
+    return decoded
+
+
+def decode_shared(values, convert=str):
+    """convert() of each value, decoding each distinct object (a query shared by its hits) once"""
+    decoded = {}
+    return [decoded[id(value)] if id(value) in decoded else decoded.setdefault(id(value), convert(value))
+            for value in values]
+
+
+class PackedSequence:
+    """Nucleotide sequence packed at 2 bits per base with a sparse non-ACGT mask"""
+
+    __slots__ = ('packed', 'length', 'mask_positions', 'mask_symbols')
+
+    def __init__(self, packed, length, mask_positions=None, mask_symbols=None):
+        self.packed = packed
+        self.length = length
+        self.mask_positions = mask_positions if mask_positions is not None else np.empty(0, dtype=np.int64)
+        self.mask_symbols = mask_symbols if mask_symbols is not None else np.empty(0, dtype=np.uint8)
+
+    @classmethod
+    def encode(cls, sequence):
+        """Pack a string (or ASCII bytes) of nucleotide symbols"""
+        if isinstance(sequence, str):
+            sequence = sequence.encode('ascii')
+        raw = np.frombuffer(sequence, dtype=np.uint8)
+        codes = BASE_CODES[raw]
+        positions = np.flatnonzero(codes == INVALID)
+        return cls(pack_codes(codes), len(raw), positions, UPPERCASE[raw[positions]])
+
+    @classmethod
+    def from_codes(cls, codes, mask_positions=None, mask_symbols=None):
+        """Pack codes 0-3; positions coded 255 default to N unless given in the mask"""
+        if mask_positions is None:
+            mask_positions = np.flatnonzero(codes == INVALID)
+            mask_symbols = np.full(len(mask_positions), ord('N'), dtype=np.uint8)
+        return cls(pack_codes(codes), len(codes), mask_positions, mask_symbols)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes + self.mask_positions.nbytes + self.mask_symbols.nbytes
+
+    def digest(self):
+        """Hex SHA-256 of the canonical (case-insensitive) sequence content"""
+        digest = hashlib.sha256(np.int64(self.length).tobytes())
+        digest.update(np.ascontiguousarray(self.packed).tobytes())
+        digest.update(np.asarray(self.mask_positions, dtype='<i8').tobytes())
+        digest.update(np.ascontiguousarray(self.mask_symbols).tobytes())
+        return digest.hexdigest()
+
+    def _mask_range(self, start, end):
+        lo, hi = np.searchsorted(self.mask_positions, [start, end])
+        return self.mask_positions[lo:hi] - start, self.mask_symbols[lo:hi]
+
+    def codes(self, start=0, end=None):
+        """Codes 0-3 for bases [start, end), with masked positions set to 255"""
+        end = self.length if end is None else min(end, self.length)
+        start = max(0, start)
+        if start >= end:
+            return np.empty(0, dtype=np.uint8)
+        codes = unpack_codes(self.packed, start, end)
+        positions, _ = self._mask_range(start, end)
+        codes[positions] = INVALID
+        return codes
+
+    def decode(self, start=0, end=None):
+        """Sequence symbols for bases [start, end) as a str"""
+        end = self.length if end is None else min(end, self.length)
+        start = max(0, start)
+        if start >= end:
+            return ''
+        symbols = BASES[unpack_codes(self.packed, start, end)]
+        positions, masked = self._mask_range(start, end)
+        symbols[positions] = masked
+        return symbols.tobytes().decode('ascii')
+
+    def __str__(self):
+        return self.decode()
+
+    def __repr__(self):
+        preview = self.decode(0, 20) + ('...' if self.length > 20 else '')
+        return f'PackedSequence({preview!r}, length={self.length})'
+
+    def __format__(self, spec):
+        return format(self.decode(), spec)
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self.decode() == other
+        if not isinstance(other, PackedSequence):
+            return NotImplemented
+        return (self.length == other.length
+                and np.array_equal(self.mask_positions, other.mask_positions)
+                and np.array_equal(self.mask_symbols, other.mask_symbols)
+                and np.array_equal(self.codes(), other.codes()))
+
+    __hash__ = None
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, end, step = item.indices(self.length)
+            if step != 1:
+                raise ValueError('PackedSequence slices do not support a step')
+            return self.slice(start, end)
+        if item < 0:
+            item += self.length
+        return self.decode(item, item + 1)
+
+    def slice(self, start, end):
+        """New PackedSequence holding bases [start, end)"""
+        end = max(start, min(end, self.length))
+        positions, symbols = self._mask_range(start, end)
+        return PackedSequence(pack_codes(unpack_codes(self.packed, start, end)),
+                              end - start, positions.copy(), symbols.copy())
+
+    def reverse_complement(self):
+        """New PackedSequence holding the reverse complement"""
+        codes = unpack_codes(self.packed, 0, self.length)[::-1]
+        positions = (self.length - 1 - self.mask_positions)[::-1]
+        symbols = COMPLEMENT[self.mask_symbols][::-1]
+        return PackedSequence(pack_codes(3 - codes), self.length, positions, symbols)
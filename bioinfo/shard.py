@@ -0,0 +1,338 @@
+"""Sharded reference database with scatter-gather search.
+
+A reference too large for one node's memory is split by `python -m
+bioinfo.shard build` into N shard databases of about equal total length.
+Each shard is a regular .bdb file (see database.py). Each shard is served
+by `python -m bioinfo.shard serve`, on this host or another one. Requests
+go over multiprocessing.connection: pickled (method, args, kwargs) messages
+on a socket, authenticated with BIOINFO_SHARD_KEY. A client holding the
+key can run code on the server (requests are unpickled), so servers only
+bind loopback addresses unless BIOINFO_SHARD_KEY is set to a key other
+than the built-in default.
+
+ShardedEngine is the coordinator, a search.PartitionedEngine, so it has the
+SearchEngine search interface and BioinformaticsAnalyzer uses it unchanged (set BIOINFO_SHARDS to
+host:port,host:port,...). On connecting, it collects every shard's names,
+annotations and lengths and sends the global totals back to every shard.
+Each shard then discards weak candidates at the same minimum score as one
+unsharded search would. A query is sent to every shard before any reply is
+read, so the shards search in parallel. Each shard returns its own top
+max_hits, carrying only the aligned slice of each subject. The coordinator
+then:
+
+- maps local record indexes to global ones;
+- recomputes bit scores and E-values from the raw scores over the global
+  effective search space;
+- keeps the overall top max_hits.
+
+    python -m bioinfo.shard build --shards 4 -o data/shards
+    python -m bioinfo.shard local data/shards    # one server process per shard
+
+Fast Scan picks its sketch candidates per shard, so a sharded Fast Scan
+extends up to N times as many candidates as an unsharded one.
+"""
+import argparse
+import glob
+import hashlib
+import ipaddress
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .database import load_database, write_database
+from .reference import DATA_DIR, DEFAULT_ANNOTATIONS, DEFAULT_REFERENCE, ReferenceDatabase
+from .search import PartitionedEngine, SearchEngine, trim_subject
+from .translate import DEFAULT_PROTEINS, load_proteins
+
+DEFAULT_SHARDS = os.environ.get('BIOINFO_SHARDS', '')
+DEFAULT_SHARD_DIR = os.path.join(DATA_DIR, 'shards')
+DEFAULT_AUTHKEY = b'bioinfo'
+AUTHKEY = os.environ.get('BIOINFO_SHARD_KEY', '').encode() or DEFAULT_AUTHKEY
+METHODS = ('info', 'configure', 'search', 'search_translated')
+# Idle connection sets a coordinator keeps open per process
+POOL_SIZE = 4
+# Pending connections a shard server queues; Listener's default of 1 drops concurrent connects
+BACKLOG = 64
+
+
+class ShardError(RuntimeError):
+    """A shard server failed a request or could not be reached"""
+
+
+def parse_address(text):
+    """('host', port) for 'host:port' (host defaults to localhost)"""
+    host, _, port = text.strip().rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def is_loopback(host):
+    """Whether every address host resolves to is a loopback address"""
+    try:
+        addresses = socket.getaddrinfo(host, None)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return all(ipaddress.ip_address(address[4][0].split('%')[0]).is_loopback for address in addresses)
+
+
+def check_exposure(host, authkey=AUTHKEY):
+    """Refuse to serve on a non-loopback host with the public default key"""
+    if authkey == DEFAULT_AUTHKEY and not is_loopback(host):
+        raise ShardError(f'refusing to serve on {host or "all interfaces"} with the default shard key: anyone who '
+                         'can reach the port could run code on this host. Set BIOINFO_SHARD_KEY to a secret key')
+
+
+def partition(lengths, shards):
+    """Shard number of each item: longest first, each onto the least-loaded shard"""
+    loads = np.zeros(shards, dtype=np.int64)
+    assignment = np.empty(len(lengths), dtype=np.int64)
+    for item in np.argsort(lengths, kind='stable')[::-1].tolist():
+        shard = int(np.argmin(loads))
+        assignment[item] = shard
+        loads[shard] += lengths[item]
+    return assignment
+
+
+def build_shards(fasta_path=DEFAULT_REFERENCE, annotation_path=DEFAULT_ANNOTATIONS, protein_path=DEFAULT_PROTEINS,
+                 output_dir=DEFAULT_SHARD_DIR, shards=2, k=11, protein_k=3):
+    """Split the reference and proteins into shard databases in output_dir; returns their paths"""
+    reference = ReferenceDatabase.from_fasta(fasta_path, annotation_path)
+    protein_names, proteins = load_proteins(protein_path)
+    shards = max(1, min(shards, len(reference)))
+    records = partition([len(seq) for seq in reference.sequences], shards)
+    owners = partition([len(protein) for protein in proteins], shards)
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, 'shard-*.bdb')):
+        os.remove(stale)
+
+    paths = []
+    for shard in range(shards):
+        chosen = np.flatnonzero(records == shard).tolist()
+        names = [reference.names[i] for i in chosen]
+        part = ReferenceDatabase(names, [reference.sequences[i] for i in chosen],
+                                 {name: reference.annotations[name] for name in names if name in reference.annotations})
+        mine = np.flatnonzero(owners == shard).tolist()
+        path = os.path.join(output_dir, f'shard-{shard:03d}.bdb')
+        write_database(part, ([protein_names[i] for i in mine], [proteins[i] for i in mine]), path, k, protein_k)
+        paths.append(path)
+    return paths
+
+
+def _shipped(hit):
+    """A hit without its query (the coordinator has it) and with only the aligned slice of its subject"""
+    hit = trim_subject(hit)
+    del hit['query']
+    return hit
+
+
+class ShardServer:
+    """Serves searches of one shard database; hits carry shard-local record and protein indexes"""
+
+    def __init__(self, path):
+        self.database = load_database(path)
+        self.engine = SearchEngine(self.database.reference, proteins=self.database.proteins,
+                                   index=self.database.index, protein_index=self.database.protein_index,
+                                   sketch=self.database.sketch)
+        self.local_totals = {name: getattr(self.engine, name) for name in PartitionedEngine.TOTALS}
+
+    def info(self):
+        reference = self.database.reference
+        return dict(self.local_totals, version=self.database.version, names=reference.names,
+                    annotations=reference.annotations, protein_names=self.engine.protein_names)
+
+    def configure(self, totals):
+        """Compute search spaces and score cutoffs over the whole sharded database"""
+        for name in PartitionedEngine.TOTALS:
+            setattr(self.engine, name, totals[name])
+
+    def search(self, query, *args, **kwargs):
+        return [_shipped(hit) for hit in self.engine.search(query, *args, **kwargs)]
+
+    def search_translated(self, query, *args, **kwargs):
+        return [_shipped(hit) for hit in self.engine.search_translated(query, *args, **kwargs)]
+
+    def handle(self, connection):
+        """Answer (method, args, kwargs) requests on one connection until it closes"""
+        with connection:
+            while True:
+                try:
+                    method, args, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if method not in METHODS:
+                        raise ValueError(f'unknown method {method!r}')
+                    reply = ('ok', getattr(self, method)(*args, **kwargs))
+                except Exception as error:
+                    reply = ('error', f'{type(error).__name__}: {error}')
+                connection.send(reply)
+
+    def serve(self, address, authkey=AUTHKEY, ready=None):
+        """Accept connections forever, one thread each; sends the bound address to ready if given"""
+        check_exposure(address[0], authkey)
+        with Listener(address, backlog=BACKLOG, authkey=authkey) as listener:
+            if ready is not None:
+                ready.send(listener.address)
+                ready.close()
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError):
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+
+def serve(path, address, authkey=AUTHKEY, ready=None):
+    ShardServer(path).serve(address, authkey, ready)
+
+
+def start_local_shards(paths, authkey=AUTHKEY):
+    """Serve each shard file from its own process on a free localhost port; returns (addresses, processes)"""
+    context = multiprocessing.get_context('spawn')
+    addresses, processes = [], []
+    for path in paths:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=serve, args=(path, ('127.0.0.1', 0), authkey, sender), daemon=True)
+        process.start()
+        sender.close()
+        processes.append(process)
+        try:
+            addresses.append('%s:%d' % receiver.recv())
+        except EOFError:
+            raise ShardError(f'shard server for {path} exited during startup') from None
+    return addresses, processes
+
+
+class ShardedEngine(PartitionedEngine):
+    """Scatter-gather coordinator over shard servers
+
+    addresses is a list of 'host:port' strings or one comma-separated
+    string. Each process keeps a small pool of connection sets, one
+    connection per shard, and each call takes one from it, so concurrent
+    sessions and forked batch workers never share a socket.
+    """
+
+    def __init__(self, addresses, authkey=AUTHKEY):
+        if isinstance(addresses, str):
+            addresses = [address for address in addresses.split(',') if address.strip()]
+        self.addresses = [parse_address(address) for address in addresses]
+        self.authkey = authkey
+        self._idle, self._pid, self._lock = [], None, None
+
+        infos = self._call_all('info')
+        self.record_offsets = np.cumsum([0] + [len(info['names']) for info in infos[:-1]]).tolist()
+        self.protein_offsets = np.cumsum([0] + [len(info['protein_names']) for info in infos[:-1]]).tolist()
+        self.retired = [set() for _ in infos]
+        for name in self.TOTALS:
+            setattr(self, name, sum(info[name] for info in infos))
+        annotations = {}
+        for info in infos:
+            annotations.update(info['annotations'])
+        self.reference = ReferenceDatabase([name for info in infos for name in info['names']], (), annotations,
+                                           total_length=self.db_length)
+        self.protein_names = [name for info in infos for name in info['protein_names']]
+        self.version = hashlib.sha256(','.join(info['version'] for info in infos).encode()).hexdigest()[:16]
+        self._call_all('configure', {name: getattr(self, name) for name in self.TOTALS})
+
+    def _checkout(self):
+        """An idle set of connections (one per shard) from this process's pool, or a newly opened one
+
+        A forked child drops the parent's pool and lock unused: sharing the
+        parent's sockets would interleave replies, and the lock may have been
+        held by another parent thread at fork time.
+        """
+        if self._pid != os.getpid():
+            self._idle, self._pid, self._lock = [], os.getpid(), threading.Lock()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return [Client(address, authkey=self.authkey) for address in self.addresses]
+
+    def _checkin(self, connections):
+        """Return a set of connections to the pool, closing it if the pool is full"""
+        with self._lock:
+            if len(self._idle) < POOL_SIZE:
+                self._idle.append(connections)
+                return
+        for connection in connections:
+            connection.close()
+
+    def _call_all(self, method, *args, **kwargs):
+        """Send one request to every shard, then collect the replies in shard order
+
+        Each call holds its own set of connections, so concurrent sessions
+        search the shards in parallel instead of queueing on one socket.
+        """
+        host, port = self.addresses[0]
+        connections = []
+        try:
+            connections = self._checkout()
+            for (host, port), connection in zip(self.addresses, connections):
+                connection.send((method, args, kwargs))
+            replies = []
+            for (host, port), connection in zip(self.addresses, connections):
+                replies.append(connection.recv())
+        except (OSError, EOFError) as error:
+            # Drop this set: the other shards may still have replies in flight on it
+            for connection in connections:
+                connection.close()
+            raise ShardError(f'shard {host}:{port}: connection failed ({error})') from error
+        self._checkin(connections)
+        for (host, port), (status, value) in zip(self.addresses, replies):
+            if status != 'ok':
+                raise ShardError(f'shard {host}:{port}: {value}')
+        return [value for _, value in replies]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bioinfo.shard',
+                                     description='Build and serve a sharded reference database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Split a reference FASTA into shard databases')
+    build.add_argument('fasta', nargs='?', default=DEFAULT_REFERENCE)
+    build.add_argument('--annotations', default=DEFAULT_ANNOTATIONS)
+    build.add_argument('--proteins', default=DEFAULT_PROTEINS)
+    build.add_argument('-n', '--shards', type=int, default=2)
+    build.add_argument('-o', '--output', default=DEFAULT_SHARD_DIR, help='output directory')
+    build.add_argument('-k', type=int, default=11, help='nucleotide seed length')
+    build.add_argument('--protein-k', type=int, default=3, help='protein seed length')
+    server = commands.add_parser('serve', help='Serve one shard database')
+    server.add_argument('path')
+    server.add_argument('--host', default='127.0.0.1',
+                        help='interface to listen on (default localhost only). Requests are pickled, so anyone with '
+                             'the shard key can run code on the server: other interfaces need BIOINFO_SHARD_KEY set '
+                             'to a secret key')
+    server.add_argument('--port', type=int, required=True)
+    local = commands.add_parser('local', help='Serve every shard in a directory from local processes')
+    local.add_argument('directory', nargs='?', default=DEFAULT_SHARD_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        paths = build_shards(args.fasta, args.annotations, args.proteins, args.output, args.shards, args.k,
+                             args.protein_k)
+        print(f'Wrote {len(paths)} shards to {args.output}', file=sys.stderr)
+    elif args.command == 'serve':
+        try:
+            check_exposure(args.host)
+        except ShardError as error:
+            parser.error(str(error))
+        serve(args.path, (args.host, args.port))
+    else:
+        paths = sorted(glob.glob(os.path.join(args.directory, 'shard-*.bdb')))
+        if not paths:
+            parser.error(f'no shard-*.bdb files in {args.directory}')
+        addresses, processes = start_local_shards(paths)
+        print(f"BIOINFO_SHARDS={','.join(addresses)}", flush=True)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
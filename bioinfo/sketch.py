@@ -0,0 +1,102 @@
+"""Minimizer sketches for pruning references before alignment.
+
+Each reference record is reduced to its set of (w, k) minimizers. In every
+run of w consecutive canonical k-mers, the minimizer is the k-mer with the
+smallest hash. Canonical k-mers (the smaller of a k-mer and its reverse
+complement) make the sketch strand-independent. Two sequences sharing an
+exact match of at least w + k - 1 bases share at least one minimizer.
+
+The fraction of a query's minimizers found in a record (its containment)
+estimates how much of the query the record covers. containment ** (1 / k)
+is the Mash-style estimate of their identity.
+
+The sketch keeps the distinct (hash, record) pairs sorted by hash, so
+scoring a query against every record takes one searchsorted and one
+bincount. No alignment is involved.
+"""
+import numpy as np
+
+from .index import kmer_codes
+
+SKETCH_K = 12
+SKETCH_W = 6
+_NO_HASH = np.uint64(np.iinfo(np.uint64).max)
+
+
+def _mix(values):
+    """splitmix64 finalizer: spreads packed k-mer codes uniformly over 64 bits"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def minimizers(codes, k=SKETCH_K, w=SKETCH_W):
+    """Sorted distinct minimizer hashes of a 2-bit encoded nucleotide sequence"""
+    forward, valid = kmer_codes(codes, k)
+    if not len(forward):
+        return np.empty(0, dtype=np.uint64)
+    reverse, _ = kmer_codes((3 - codes[::-1]).astype(np.uint8), k)
+    hashes = np.where(valid, _mix(np.minimum(forward, reverse[::-1])), _NO_HASH)
+    if len(hashes) > w:
+        hashes = np.lib.stride_tricks.sliding_window_view(hashes, w).min(axis=1)
+    else:
+        hashes = hashes.min(keepdims=True)
+    hashes = np.unique(hashes)
+    return hashes[hashes != _NO_HASH]
+
+
+class MinimizerSketch:
+    """Sorted (minimizer hash, record) pairs over the reference records"""
+
+    def __init__(self, sequences, k=SKETCH_K, w=SKETCH_W, max_occurrences=1000):
+        self.k, self.w, self.max_occurrences = k, w, max_occurrences
+        self.num_records = len(sequences)
+        all_hashes, all_records = [], []
+        for record, seq in enumerate(sequences):
+            hashes = minimizers(seq.codes(), k, w)
+            all_hashes.append(hashes)
+            all_records.append(np.full(len(hashes), record, dtype=np.int64))
+        hashes = np.concatenate(all_hashes) if all_hashes else np.empty(0, dtype=np.uint64)
+        records = np.concatenate(all_records) if all_records else np.empty(0, dtype=np.int64)
+        order = np.argsort(hashes, kind='stable')
+        self.hashes, self.records = hashes[order], records[order]
+
+    @classmethod
+    def from_arrays(cls, hashes, records, num_records, k=SKETCH_K, w=SKETCH_W, max_occurrences=1000):
+        """Wrap prebuilt (e.g. memory-mapped) sorted hashes and their records"""
+        sketch = cls.__new__(cls)
+        sketch.k, sketch.w, sketch.max_occurrences = k, w, max_occurrences
+        sketch.num_records = num_records
+        sketch.hashes, sketch.records = hashes, records
+        return sketch
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def containment(self, query_codes):
+        """(records, containment) for every record sharing a minimizer with the query
+
+        Minimizers found in more than max_occurrences records (repeats) are
+        ignored, as in seeding.
+        """
+        query = minimizers(query_codes, self.k, self.w)
+        lo = np.searchsorted(self.hashes, query, side='left')
+        hi = np.searchsorted(self.hashes, query, side='right')
+        counts = hi - lo
+        keep = (counts > 0) & (counts <= self.max_occurrences)
+        lo, counts = lo[keep], counts[keep]
+        if not len(lo):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        total = int(counts.sum())
+        run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        records = self.records[np.repeat(lo, counts) + (np.arange(total) - run_starts)]
+        records, shared = np.unique(records, return_counts=True)
+        return records, shared / len(query)
+
+    def candidates(self, query_codes, limit):
+        """Up to limit record indices, best estimated containment first"""
+        records, containment = self.containment(query_codes)
+        order = np.lexsort((records, -containment))[:limit]
+        return records[order]
@@ -0,0 +1,136 @@
+"""Karlin-Altschul alignment statistics: bit scores, E-values, search space.
+
+Ungapped lambda, K and H are computed from the scoring scheme and a uniform
+base composition. Gapped parameters cannot be derived analytically. They are
+looked up in the published BLASTN and BLASTP tables. Schemes missing from those tables
+fall back to the ungapped values. That is a close approximation when gaps
+are expensive and slightly optimistic when they are cheap.
+"""
+import functools
+import math
+
+import numpy as np
+
+BASE_FREQUENCY = 0.25
+
+# (match, mismatch, gap_open, gap_extend) or (matrix, gap_open, gap_extend) -> (lambda, K, H)
+# from the NCBI BLASTN / BLASTP tables
+GAPPED_PARAMETERS = {
+    (2, -3, 5, 2): (0.625, 0.41, 0.78),
+    (1, -3, 5, 2): (1.374, 0.711, 1.31),
+    (1, -3, 2, 2): (1.37, 0.70, 1.2),
+    ('BLOSUM62', 11, 1): (0.267, 0.041, 0.14),
+}
+
+# Ungapped (lambda, K, H) of substitution matrices, used for unlisted gap costs
+UNGAPPED_MATRIX_PARAMETERS = {
+    'BLOSUM62': (0.3176, 0.134, 0.4012),
+}
+
+
+def _score_distribution(match, mismatch):
+    """Probabilities of each per-column score under uniform base composition"""
+    p_match = 4 * BASE_FREQUENCY * BASE_FREQUENCY
+    low = mismatch
+    probs = np.zeros(match - mismatch + 1)
+    probs[match - low] += p_match
+    probs[0] += 1 - p_match
+    return low, probs
+
+
+def ungapped_lambda(match, mismatch):
+    """Solve sum_s p(s) exp(lambda * s) = 1 for the positive root"""
+    low, probs = _score_distribution(match, mismatch)
+    scores = np.arange(low, low + len(probs))
+    f = lambda lam: float(np.sum(probs * np.exp(lam * scores))) - 1
+    lo, hi = 1e-6, 1.0
+    while f(hi) < 0:
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if f(mid) < 0:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def ungapped_parameters(match, mismatch, iterations=100):
+    """Ungapped (lambda, K, H) for a match/mismatch scheme (Karlin & Altschul 1990)"""
+    low, probs = _score_distribution(match, mismatch)
+    scores = np.arange(low, low + len(probs))
+    delta = math.gcd(match, -mismatch)
+    lam = ungapped_lambda(match, mismatch)
+    h = lam * float(np.sum(scores * probs * np.exp(lam * scores)))
+
+    # sigma = sum_k 1/k * (E[exp(lambda S_k); S_k < 0] + P(S_k >= 0))
+    sigma = 0.0
+    dist, dist_low = np.array([1.0]), 0
+    for k in range(1, iterations + 1):
+        dist, dist_low = np.convolve(dist, probs), dist_low + low
+        values = np.arange(dist_low, dist_low + len(dist))
+        term = float(np.sum(dist[values < 0] * np.exp(lam * values[values < 0])) + np.sum(dist[values >= 0]))
+        sigma += term / k
+        if term / k < 1e-12:
+            break
+    k_param = lam * delta * math.exp(-2 * sigma) / (h * (1 - math.exp(-lam * delta)))
+    return lam, k_param, h
+
+
+@functools.lru_cache(maxsize=64)
+def karlin_altschul(scoring):
+    """KarlinAltschul statistics for a Scoring scheme, cached per scheme"""
+    return KarlinAltschul(scoring)
+
+
+class KarlinAltschul:
+    """Bit scores and E-values for one scoring scheme"""
+
+    def __init__(self, scoring):
+        self.scoring = scoring
+        gapped = GAPPED_PARAMETERS.get(scoring.as_tuple())
+        self.gapped = gapped is not None
+        if gapped:
+            self.lam, self.k, self.h = gapped
+        elif isinstance(scoring.as_tuple()[0], str):
+            self.lam, self.k, self.h = UNGAPPED_MATRIX_PARAMETERS[scoring.as_tuple()[0]]
+        else:
+            self.lam, self.k, self.h = ungapped_parameters(scoring.match, scoring.mismatch)
+
+    def bit_score(self, raw_score):
+        return (self.lam * raw_score - math.log(self.k)) / math.log(2)
+
+    def length_adjustment(self, query_length, db_length, num_sequences):
+        """Expected HSP length correction, iterated as in BLAST"""
+        adjustment = 0.0
+        for _ in range(20):
+            m_eff = max(query_length - adjustment, 1)
+            n_eff = max(db_length - num_sequences * adjustment, 1)
+            updated = math.log(self.k * m_eff * n_eff) / self.h
+            if abs(updated - adjustment) < 0.5:
+                adjustment = updated
+                break
+            adjustment = updated
+        return min(max(int(adjustment), 0), query_length - 1) if query_length > 1 else 0
+
+    def search_space(self, query_length, db_length, num_sequences):
+        """Effective search space m' * n' of a query against a database"""
+        adjustment = self.length_adjustment(query_length, db_length, num_sequences)
+        m_eff = max(query_length - adjustment, 1)
+        n_eff = max(db_length - num_sequences * adjustment, 1)
+        return float(m_eff) * float(n_eff)
+
+    def evalue(self, raw_score, search_space):
+        return search_space * self.k * math.exp(-self.lam * raw_score)
+
+    def raw_score(self, bits):
+        """Smallest raw score worth at least bits"""
+        return math.ceil((bits * math.log(2) + math.log(self.k)) / self.lam)
+
+    def score_drop(self, bits):
+        """Raw score difference worth bits (an X-drop)"""
+        return math.ceil(bits * math.log(2) / self.lam)
+
+    def min_score(self, evalue_threshold, search_space):
+        """Smallest raw score whose E-value is within evalue_threshold"""
+        return math.ceil(math.log(self.k * search_space / evalue_threshold) / self.lam)
@@ -0,0 +1,21 @@
+"""Random sequences and simulated sequencing errors for benchmarks and tests"""
+import numpy as np
+
+from .sequence import BASES
+
+
+def random_bases(rng, length):
+    """length uniformly random A/C/G/T codes (uint8 ASCII) drawn from rng"""
+    return BASES[rng.integers(0, 4, length)]
+
+
+def mutate(rng, bases, error_rate):
+    """Apply substitutions (80%) and single-base indels (20%) at error_rate per base"""
+    errors = np.flatnonzero(rng.random(len(bases)) < error_rate)
+    kinds = rng.random(len(errors))
+    out = bases.copy()
+    out[errors[kinds < 0.8]] = random_bases(rng, int((kinds < 0.8).sum()))
+    deletions = errors[(kinds >= 0.8) & (kinds < 0.9)]
+    insertions = errors[kinds >= 0.9]
+    out = np.insert(out, insertions, random_bases(rng, len(insertions)))
+    return np.delete(out, deletions + np.searchsorted(insertions, deletions))
@@ -0,0 +1,264 @@
+"""Concurrent cross-reference resolution for result citations.
+
+Each citation key (clinvar_id, uniprot_id, ...) maps to a Source that knows
+how to fetch a batch of IDs in one request and summarize the response. The
+fetcher groups the requested IDs by source and batch, then drives all
+batches with asyncio:
+
+* each API host has its own requests.Session, whose connection pool keeps
+  connections alive across batches and across runs;
+* each host has its own request-rate limit, so the three NCBI E-utilities
+  sources share NCBI's budget;
+* resolved IDs are kept in a TTL cache, and only misses go to the network.
+
+The blocking HTTP calls run on a thread pool. Asyncio handles scheduling,
+rate limiting and completion order, and a progress callback fires as each
+batch finishes. base_url (or BIOINFO_XREF_URL) points every source at one
+host, such as a local stub server in tests.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+EUTILS = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi'
+HOST_RATES = {
+    'eutils.ncbi.nlm.nih.gov': 10 if os.environ.get('NCBI_API_KEY') else 3,
+    'rest.ensembl.org': 15,
+    'rest.uniprot.org': 10,
+    'api.omim.org': 4,
+}
+DEFAULT_RATE = 5
+
+
+class Source:
+    """One citation key's API: how to request a batch of IDs and read the reply"""
+
+    def __init__(self, name, citation_key, url, batch_size, build, parse, enabled=True):
+        self.name = name
+        self.citation_key = citation_key
+        self.url = url
+        self.batch_size = batch_size
+        self.build = build
+        self.parse = parse
+        self.enabled = enabled
+
+
+def _esummary(db, to_uid=str):
+    def build(ids):
+        params = {'db': db, 'id': ','.join(to_uid(i) for i in ids), 'retmode': 'json'}
+        if os.environ.get('NCBI_API_KEY'):
+            params['api_key'] = os.environ['NCBI_API_KEY']
+        return 'GET', {'params': params}
+
+    def parse(payload, ids):
+        result = payload.get('result', {})
+        by_uid = {to_uid(i): i for i in ids}
+        summaries = {}
+        for uid in result.get('uids', []):
+            doc = result.get(uid, {})
+            # nuccore is queried by accession but answers by GI number
+            original = by_uid.get(uid) or by_uid.get(doc.get('accessionversion', ''))
+            if original is not None:
+                genes = ', '.join(gene.get('name', '') for gene in doc.get('genes', []))
+                summaries[original] = doc.get('title') or genes or uid
+        return summaries
+    return build, parse
+
+
+def _clinvar_uid(accession):
+    return str(int(accession[3:])) if accession.upper().startswith('VCV') else accession
+
+
+def _dbsnp_uid(rsid):
+    return rsid[2:] if rsid.lower().startswith('rs') else rsid
+
+
+def _ensembl_build(ids):
+    return 'POST', {'json': {'ids': list(ids)}, 'headers': {'Accept': 'application/json'}}
+
+
+def _ensembl_parse(payload, ids):
+    return {stable_id: ' '.join(filter(None, [entry.get('display_name'), entry.get('description')]))
+            for stable_id, entry in payload.items() if entry}
+
+
+def _uniprot_build(ids):
+    return 'GET', {'params': {'accessions': ','.join(ids), 'format': 'json'}}
+
+
+def _uniprot_parse(payload, ids):
+    summaries = {}
+    for entry in payload.get('results', []):
+        name = entry.get('proteinDescription', {}).get('recommendedName', {}).get('fullName', {})
+        summaries[entry.get('primaryAccession')] = name.get('value', entry.get('uniProtkbId', ''))
+    return summaries
+
+
+def _omim_build(ids):
+    return 'GET', {'params': {'mimNumber': ','.join(ids), 'format': 'json',
+                              'apiKey': os.environ.get('OMIM_API_KEY', '')}}
+
+
+def _omim_parse(payload, ids):
+    summaries = {}
+    for item in payload.get('omim', {}).get('entryList', []):
+        entry = item.get('entry', {})
+        summaries[str(entry.get('mimNumber'))] = entry.get('titles', {}).get('preferredTitle', '')
+    return summaries
+
+
+SOURCES = {source.citation_key: source for source in [
+    Source('ClinVar', 'clinvar_id', EUTILS, 200, *_esummary('clinvar', _clinvar_uid)),
+    Source('dbSNP', 'dbsnp_id', EUTILS, 200, *_esummary('snp', _dbsnp_uid)),
+    Source('PubMed', 'pubmed_pmid', EUTILS, 200, *_esummary('pubmed')),
+    Source('GenBank', 'genbank_accession', EUTILS, 200, *_esummary('nuccore')),
+    Source('RefSeq', 'refseq_id', EUTILS, 200, *_esummary('nuccore')),
+    Source('Ensembl', 'ensembl_id', 'https://rest.ensembl.org/lookup/id', 1000, _ensembl_build, _ensembl_parse),
+    Source('UniProt', 'uniprot_id', 'https://rest.uniprot.org/uniprotkb/accessions', 100,
+           _uniprot_build, _uniprot_parse),
+    Source('OMIM', 'omim_id', 'https://api.omim.org/api/entry', 20, _omim_build, _omim_parse,
+           enabled=bool(os.environ.get('OMIM_API_KEY'))),
+]}
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class CrossReferenceFetcher:
+    """Resolve (citation key, ID) pairs to short summaries, concurrently and cached
+
+    resolve() returns {(key, id): {'source', 'id', 'status', 'summary'}}.
+    status is 'ok', 'not_found', 'error' or 'skipped' (no API for the key,
+    or the source needs credentials). Only 'ok' and 'not_found' are cached.
+    """
+
+    def __init__(self, sources=None, base_url=None, ttl=3600, timeout=10, max_connections=4):
+        self.sources = SOURCES if sources is None else sources
+        self.base_url = base_url or os.environ.get('BIOINFO_XREF_URL') or None
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._sessions = {}
+        self._limiters = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_connections * 4, thread_name_prefix='xref')
+
+    def url(self, source):
+        if not self.base_url:
+            return source.url
+        base = urlsplit(self.base_url)
+        return urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + urlsplit(source.url).path, '', ''))
+
+    def _session(self, host):
+        """Pooled session and rate limiter for one upstream API host"""
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+                self._limiters[host] = RateLimiter(HOST_RATES.get(host, DEFAULT_RATE))
+            return self._sessions[host], self._limiters[host]
+
+    def _cached(self, pair):
+        entry = self._cache.get(pair)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _fetch(self, session, method, url, options):
+        for attempt in range(2):
+            response = session.request(method, url, timeout=self.timeout, **options)
+            if response.status_code in (429, 503) and attempt == 0:
+                time.sleep(min(float(response.headers.get('Retry-After') or 1), 5))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def _resolve_batch(self, source, ids, semaphore):
+        url = self.url(source)
+        session, limiter = self._session(urlsplit(source.url).netloc)
+        method, options = source.build(ids)
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                payload = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._fetch, session, method, url, options)
+                summaries = source.parse(payload, ids)
+            except (requests.RequestException, ValueError) as error:
+                return source, {i: {'source': source.name, 'id': i, 'status': 'error', 'summary': str(error)}
+                                for i in ids}
+        expires = time.monotonic() + self.ttl
+        resolved = {}
+        for i in ids:
+            found = i in summaries
+            resolved[i] = {'source': source.name, 'id': i, 'status': 'ok' if found else 'not_found',
+                           'summary': summaries.get(i, '')}
+            with self._lock:
+                self._cache[(source.citation_key, i)] = (expires, resolved[i])
+        return source, resolved
+
+    async def _resolve(self, pairs, progress):
+        resolved, pending = {}, {}
+        for key, value in dict.fromkeys(pairs):
+            source = self.sources.get(key)
+            if source is None or not source.enabled:
+                name = source.name if source else key
+                resolved[(key, value)] = {'source': name, 'id': value, 'status': 'skipped', 'summary': ''}
+                continue
+            cached = self._cached((key, value))
+            if cached is not None:
+                resolved[(key, value)] = cached
+            else:
+                pending.setdefault(key, []).append(value)
+
+        batches = [(self.sources[key], ids[start:start + self.sources[key].batch_size])
+                   for key, ids in pending.items()
+                   for start in range(0, len(ids), self.sources[key].batch_size)]
+        semaphores, tasks = {}, []
+        for source, ids in batches:
+            host = urlsplit(source.url).netloc
+            semaphore = semaphores.setdefault(host, asyncio.Semaphore(self.max_connections))
+            tasks.append(self._resolve_batch(source, ids, semaphore))
+        if progress:
+            progress(0, len(tasks))
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            source, batch = await task
+            for value, entry in batch.items():
+                resolved[(source.citation_key, value)] = entry
+            if progress:
+                progress(done, len(tasks))
+        return resolved
+
+    def resolve(self, pairs, progress=None):
+        """Resolve (citation key, ID) pairs; progress(done, total) is called per finished batch"""
+        return asyncio.run(self._resolve(list(pairs), progress))
+
+    def resolve_citations(self, citations, progress=None):
+        """Resolve a sequence of citation dicts; returns one list of entries per dict"""
+        citations = list(citations)
+        pairs = [(key, str(value)) for cited in citations for key, value in cited.items()]
+        resolved = self.resolve(pairs, progress)
+        return [[resolved[(key, str(value))] for key, value in cited.items()] for cited in citations]
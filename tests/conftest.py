@@ -0,0 +1,64 @@
+"""Shared fixtures: a small synthetic reference of related record families"""
+import numpy as np
+import pytest
+
+from bioinfo.reference import ReferenceDatabase
+from bioinfo.search import SearchEngine
+from bioinfo.sequence import COMPLEMENT
+from bioinfo.synthetic import mutate, random_bases
+from bioinfo.translate import DEFAULT_PROTEINS, load_proteins
+
+FAMILIES = 10
+MEMBERS = 3
+RECORD_LENGTH = 1500
+
+
+def reverse_complement(text):
+    return COMPLEMENT[np.frombuffer(text.encode(), dtype=np.uint8)][::-1].tobytes().decode()
+
+
+def write_fasta(path, records):
+    with open(path, 'w') as handle:
+        for name, text in records:
+            handle.write(f'>{name}\n')
+            for start in range(0, len(text), 70):
+                handle.write(text[start:start + 70] + '\n')
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def records():
+    """[(name, bases)]: FAMILIES families of MEMBERS records diverged about 10% from a common ancestor"""
+    rng = np.random.default_rng(7)
+    out = []
+    for family in range(FAMILIES):
+        ancestor = random_bases(rng, RECORD_LENGTH)
+        for member in range(MEMBERS):
+            out.append((f'SYN_{family:02d}_{member}.1', mutate(rng, ancestor, 0.1).tobytes().decode()))
+    return out
+
+
+@pytest.fixture(scope='session')
+def reference_fasta(records, tmp_path_factory):
+    return write_fasta(tmp_path_factory.mktemp('reference') / 'reference.fasta', records)
+
+
+@pytest.fixture(scope='session')
+def engine(reference_fasta):
+    """A flat SearchEngine over the synthetic reference and the bundled proteins"""
+    return SearchEngine(ReferenceDatabase.from_fasta(reference_fasta, None), proteins=load_proteins(DEFAULT_PROTEINS))
+
+
+@pytest.fixture
+def queries(records):
+    """Mutated fragments of reference records, half of them reverse complemented, plus one random query"""
+    rng = np.random.default_rng(11)
+    out = []
+    for number in range(0, len(records), 4):
+        text = records[number][1]
+        start = int(rng.integers(0, len(text) - 400))
+        fragment = mutate(rng, np.frombuffer(text[start:start + 400].encode(), dtype=np.uint8), 0.03)
+        fragment = fragment.tobytes().decode()
+        out.append(reverse_complement(fragment) if number % 8 == 4 else fragment)
+    out.append(random_bases(rng, 400).tobytes().decode())
+    return out
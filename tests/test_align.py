@@ -0,0 +1,171 @@
+"""Banded aligner against a plain O(mn) Gotoh dynamic program"""
+import numpy as np
+import pytest
+
+from bioinfo.align import NEG as BAND_NEG
+from bioinfo.align import PAD, Scoring, band_alignments, band_scores, subject_window, ungapped_scores
+
+SCORING = Scoring()
+NEG = -10 ** 9
+
+
+def reference_score(query, subject, scoring, local, in_band=lambda i, j: True):
+    """Best score over the cells in_band(query row, subject column); row and column 0 are the borders
+
+    Local: Smith-Waterman. Global: end-to-end in the query, free subject overhangs.
+    """
+    m, n = len(query), len(subject)
+    go, ge = scoring.gap_open, scoring.gap_extend
+    h = np.full((m + 1, n + 1), NEG, dtype=np.int64)
+    e, f = h.copy(), h.copy()
+    h[0, [j for j in range(n + 1) if in_band(0, j)]] = 0
+    for i in range(1, m + 1):
+        if in_band(i, 0):
+            h[i, 0] = 0 if local else -(go + i * ge)
+        for j in range(1, n + 1):
+            if not in_band(i, j):
+                continue
+            e[i, j] = max(e[i, j - 1] - ge, h[i, j - 1] - go - ge)
+            f[i, j] = max(f[i - 1, j] - ge, h[i - 1, j] - go - ge)
+            best = max(h[i - 1, j - 1] + scoring.matrix[query[i - 1], subject[j - 1]], e[i, j], f[i, j])
+            h[i, j] = max(best, 0) if local else best
+    return int(h.max() if local else h[m].max())
+
+
+def column_score(query, subject, query_index, subject_index, scoring):
+    """Score of an alignment given column by column"""
+    total, gap = 0, None
+    for q, s in zip(query_index.tolist(), subject_index.tolist()):
+        if q >= 0 and s >= 0:
+            total += int(scoring.matrix[query[q], subject[s]])
+            gap = None
+        else:
+            kind = 'query' if q < 0 else 'subject'
+            total -= scoring.gap_extend + (scoring.gap_open if kind != gap else 0)
+            gap = kind
+    return total
+
+
+def random_pair(rng):
+    """A random query and a subject that often contains a mutated piece of it"""
+    query = rng.integers(0, 4, int(rng.integers(1, 40))).astype(np.uint8)
+    subject = rng.integers(0, 4, int(rng.integers(1, 40))).astype(np.uint8)
+    if rng.random() < 0.5:
+        piece = query[int(rng.integers(0, len(query))):].copy()
+        piece[rng.random(len(piece)) < 0.1] = rng.integers(0, 4)
+        cut = int(rng.integers(0, len(subject) + 1))
+        subject = np.concatenate([subject[:cut], piece, subject[cut:]]).astype(np.uint8)
+    return query, subject
+
+
+class Codes:
+    """The codes(start, end) view subject_window reads"""
+
+    def __init__(self, codes):
+        self.array = codes
+
+    def __len__(self):
+        return len(self.array)
+
+    def codes(self, start, end):
+        return self.array[start:end]
+
+
+@pytest.mark.parametrize('local', [True, False])
+def test_full_band_matches_reference(local):
+    rng = np.random.default_rng(3)
+    for _ in range(300):
+        query, subject = random_pair(rng)
+        band = max(len(query), len(subject))
+        window = subject_window(Codes(subject), -band, len(query) + band)[None]
+        expected = reference_score(query, subject, SCORING, local)
+        assert band_scores(query, window, SCORING, band, local)[0] == expected
+        score, query_index, window_index = band_alignments(query, window, SCORING, band, local)[0]
+        assert score == expected
+        subject_index = np.where(window_index >= 0, window_index - band, -1)
+        if local and score == 0:
+            continue
+        assert column_score(query, subject, query_index, subject_index, SCORING) == score
+        if not local:
+            assert query_index[query_index >= 0].tolist() == list(range(len(query)))
+
+
+@pytest.mark.parametrize('local', [True, False])
+def test_narrow_band_matches_banded_reference(local):
+    rng = np.random.default_rng(4)
+    scoring = Scoring(match=1, mismatch=-2, gap_open=3, gap_extend=1)
+    for _ in range(300):
+        query, subject = random_pair(rng)
+        band = int(rng.integers(1, 6))
+        start = int(rng.integers(-len(query) - band, len(subject)))
+        window = subject_window(Codes(subject), start, start + len(query) + 2 * band)
+        inside = np.flatnonzero(window != PAD)
+        if not len(inside):
+            continue
+        offset = int(inside[0])
+        # Query row i (1-based) sees window columns i - 1 .. i - 1 + 2 * band; subject column j is window column
+        # offset + j - 1, and column 0 is the padding just before the subject
+        expected = reference_score(query, window[inside], scoring, local,
+                                   lambda i, j: i - 1 <= offset + j - 1 <= i - 1 + 2 * band)
+        score = int(band_scores(query, window[None], scoring, band, local)[0])
+        if expected <= NEG // 2:
+            # No path through the band (global: the query cannot be aligned end to end)
+            assert score <= BAND_NEG // 2
+            continue
+        assert score == expected
+        traced, query_index, window_index = band_alignments(query, window[None], scoring, band, local)[0]
+        assert traced == expected
+        if traced > 0 or not local:
+            subject_index = np.where(window_index >= 0, window_index - offset, -1)
+            assert column_score(query, window[inside], query_index, subject_index, scoring) == traced
+
+def test_alignment_starts_on_the_first_subject_base():
+    query = np.array([3, 3, 3, 3, 3, 0, 1, 2, 3, 0, 1, 2, 3], dtype=np.uint8)
+    subject = np.array([0, 1, 2, 3, 0, 1, 2, 3], dtype=np.uint8)
+    window = subject_window(Codes(subject), -5 - 4, len(query) - 5 + 4)[None]
+    score, query_index, window_index = band_alignments(query, window, SCORING, 4)[0]
+    assert score == 16
+    assert query_index.tolist() == list(range(5, 13))
+    assert (window_index - 4 - 5).tolist() == list(range(8))
+
+
+def test_pruned_scores_are_exact_or_abandoned():
+    rng = np.random.default_rng(5)
+    for _ in range(100):
+        query, subject = random_pair(rng)
+        band = max(len(query), len(subject))
+        window = subject_window(Codes(subject), -band, len(query) + band)[None]
+        exact = int(band_scores(query, window, SCORING, band)[0])
+        min_score = int(rng.integers(1, 30))
+        pruned = int(band_scores(query, window, SCORING, band, min_score=min_score)[0])
+        assert pruned == exact or (pruned < min_score and exact < min_score)
+
+
+def reference_ungapped(pairs, anchor, xdrop):
+    """X-drop extension of the (query, subject) code pairs of one diagonal, right from anchor and left of it"""
+    total = 0
+    for columns in (range(anchor, len(pairs)), range(anchor - 1, -1, -1)):
+        running = best = 0
+        for i in columns:
+            q, s = pairs[i]
+            if s == PAD:
+                break
+            running += int(SCORING.matrix[q, s])
+            if running < best - xdrop:
+                break
+            best = max(best, running)
+        total += best
+    return total
+
+
+def test_ungapped_scores_match_reference():
+    rng = np.random.default_rng(6)
+    for _ in range(100):
+        query, subject = random_pair(rng)
+        band = int(rng.integers(0, 4))
+        diagonal = int(rng.integers(-len(query), len(subject)))
+        window = subject_window(Codes(subject), diagonal - band, diagonal + len(query) + band)
+        anchor = int(rng.integers(0, len(query) + 1))
+        xdrop = int(rng.integers(0, 12))
+        score = ungapped_scores(query, window[None], np.array([anchor]), SCORING, xdrop, band, step=3)[0]
+        assert score == reference_ungapped(list(zip(query, window[band:])), anchor, xdrop)
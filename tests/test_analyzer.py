@@ -0,0 +1,43 @@
+"""Query analysis through BioinformaticsAnalyzer"""
+import pytest
+
+from bioinfo.analyzer import BioinformaticsAnalyzer
+from bioinfo.fastx import parse_text
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return BioinformaticsAnalyzer(cache_path='')
+
+
+@pytest.fixture(scope='module')
+def query(analyzer):
+    return str(analyzer.reference.sequences[0])[:800]
+
+
+def test_results_are_ranked_by_similarity(analyzer, query):
+    results = analyzer.analyze_sequence(query, similarity_threshold=0, evalue_threshold=10, min_align_length=10,
+                                        translated=True)
+    frame = results.frame
+    assert len(results) > 2
+    assert list(frame['similarity_score']) == sorted(frame['similarity_score'], reverse=True)
+    assert list(frame['id']) == list(range(1, len(results) + 1))
+    top = analyzer.analyze_sequence(query, similarity_threshold=0, evalue_threshold=10, min_align_length=10,
+                                    translated=True, max_hits=2)
+    assert list(top.frame['id']) == [1, 2]
+
+
+def test_exact_query_matches_its_record(analyzer, query):
+    best = analyzer.analyze_sequence(query)[0]
+    assert best['matched_sequence'].startswith(analyzer.reference.names[0])
+    assert best['similarity_score'] == 100.0
+    assert best['query_id'] == 'query'
+    assert best['alignment']['frame'] == 'N/A'
+
+
+def test_batch_results_follow_their_records(analyzer, query):
+    text = f'>a\n{query}\n>b\n{query[200:600]}\n>c\n{"ACGT" * 30}\n'
+    rows = sorted(analyzer.analyze_batch(parse_text(text), workers=2, chunk_size=1), key=lambda row: row[0])
+    assert [record.name for _, record, _ in rows] == ['a', 'b', 'c']
+    assert [len(results) > 0 for _, _, results in rows] == [True, True, False]
+    assert set(rows[1][2].frame['query_id']) == {'b'}
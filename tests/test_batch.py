@@ -0,0 +1,51 @@
+"""Process-pool batches"""
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from bioinfo.batch import run_batch
+
+fork = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+
+
+def test_serial_batch_keeps_every_record():
+    rows = run_batch(lambda record, scale: record * scale, range(5), (3,), workers=1)
+    assert sorted((index, result) for index, _, result in rows) == [(i, 3 * i) for i in range(5)]
+
+
+@fork
+def test_pool_batch_keeps_every_record():
+    rows = run_batch(lambda record, scale: record * scale, range(50), (3,), workers=2, chunk_size=4)
+    assert sorted((index, result) for index, _, result in rows) == [(i, 3 * i) for i in range(50)]
+
+
+@fork
+def test_concurrent_batches_use_their_own_function():
+    results, errors = {}, []
+    barrier = threading.Barrier(2)
+
+    def analyze(name, offset):
+        def tagged(record):
+            time.sleep(0.002)
+            return name, record + offset
+        return tagged
+
+    def run(name, offset):
+        try:
+            for _ in range(5):
+                barrier.wait(timeout=30)
+                rows = run_batch(analyze(name, offset), range(40), (), workers=2, chunk_size=2)
+                results.setdefault(name, []).append(sorted(result for _, _, result in rows))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(name, offset)) for name, offset in (('a', 0), ('b', 1000))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert results['a'] == [[('a', i) for i in range(40)]] * 5
+    assert results['b'] == [[('b', i + 1000) for i in range(40)]] * 5
@@ -0,0 +1,29 @@
+"""Two-tier result cache shared by analyzers on different database versions"""
+import time
+
+from bioinfo import cache
+from bioinfo.cache import ResultCache, cache_key
+
+
+def test_versions_share_the_file_without_purging_each_other(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    old, new = ResultCache('v1', path), ResultCache('v2', path)
+    old.put(cache_key('digest', (), 'v1'), 'old result')
+    new.put(cache_key('digest', (), 'v2'), 'new result')
+    reopened_old, reopened_new = ResultCache('v1', path), ResultCache('v2', path)
+    assert reopened_old.get(cache_key('digest', (), 'v1')) == 'old result'
+    assert reopened_new.get(cache_key('digest', (), 'v2')) == 'new result'
+    assert reopened_new.get(cache_key('digest', (), 'v1')) is None
+
+
+def test_trimming_purges_stale_rows_of_other_versions(tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.sqlite')
+    old = ResultCache('v1', path)
+    for number in range(3):
+        old.put(cache_key(str(number), (), 'v1'), 'x' * 1000)
+    monkeypatch.setattr(cache, 'STALE_SECONDS', 0)
+    time.sleep(0.01)
+    new = ResultCache('v2', path, max_bytes=2500)
+    new.put(cache_key('fresh', (), 'v2'), 'y' * 1000)
+    rows = new._connect().execute('SELECT db_version, COUNT(*) FROM results GROUP BY db_version').fetchall()
+    assert rows == [(new.tag, 1)]
@@ -0,0 +1,38 @@
+"""On-disk database freshness"""
+import os
+import shutil
+
+from bioinfo.analyzer import BioinformaticsAnalyzer
+from bioinfo.database import build_database, is_current, load_database
+from bioinfo.reference import DEFAULT_ANNOTATIONS, DEFAULT_REFERENCE
+from bioinfo.translate import DEFAULT_PROTEINS
+
+SOURCES = (DEFAULT_REFERENCE, DEFAULT_ANNOTATIONS, DEFAULT_PROTEINS)
+
+
+def test_database_is_current_only_for_its_sources(tmp_path):
+    path = str(tmp_path / 'reference.bdb')
+    build_database(*SOURCES, output_path=path)
+    assert is_current(path, *SOURCES)
+
+    custom = str(tmp_path / 'custom.fasta')
+    with open(DEFAULT_REFERENCE) as source, open(custom, 'w') as handle:
+        handle.write(source.read().split('>')[1].join(['>', '']))
+    os.utime(custom, (0, 0))
+    assert not is_current(path, custom, DEFAULT_ANNOTATIONS, DEFAULT_PROTEINS)
+
+    analyzer = BioinformaticsAnalyzer(custom, database_path=path, cache_path='')
+    assert len(analyzer.reference) == 1
+
+
+def test_database_is_stale_when_a_source_changes(tmp_path):
+    reference = str(tmp_path / 'reference.fasta')
+    shutil.copy(DEFAULT_REFERENCE, reference)
+    path = str(tmp_path / 'reference.bdb')
+    build_database(reference, DEFAULT_ANNOTATIONS, DEFAULT_PROTEINS, path)
+    assert is_current(path, reference, DEFAULT_ANNOTATIONS, DEFAULT_PROTEINS)
+    assert len(load_database(path).reference) == len(BioinformaticsAnalyzer(cache_path='').reference)
+
+    built = os.path.getmtime(path)
+    os.utime(reference, (built + 10, built + 10))
+    assert not is_current(path, reference, DEFAULT_ANNOTATIONS, DEFAULT_PROTEINS)
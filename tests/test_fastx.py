@@ -0,0 +1,29 @@
+"""FASTA/FASTQ parsing"""
+import gzip
+import io
+
+import pytest
+
+from bioinfo.fastx import iter_records, parse_text
+from bioinfo.preprocess import SequenceError
+
+
+def test_fasta_and_fastq_records_stream_from_gzip():
+    fasta = b'>one first record\nACGT\nacgu\n>two\nNNAC-GT\n'
+    records = list(iter_records(io.BytesIO(gzip.compress(fasta))))
+    assert [(record.name, record.description, str(record.sequence)) for record in records] == [
+        ('one', 'first record', 'ACGTACGT'), ('two', '', 'NNACGT')]
+    fastq = b'@read1\nACGT\n+\nIIII\n@read2\nGGCC\n+\n!!!!\n'
+    records = list(iter_records(io.BytesIO(fastq)))
+    assert [(record.name, str(record.sequence), record.quality) for record in records] == [
+        ('read1', 'ACGT', b'IIII'), ('read2', 'GGCC', b'!!!!')]
+
+
+def test_pasted_text_without_header_is_one_query():
+    records = list(parse_text('ACGT ACGT\n12 acgt'))
+    assert [(record.name, str(record.sequence)) for record in records] == [('query', 'ACGTACGTACGT')]
+
+
+def test_symbols_outside_iupac_are_rejected():
+    with pytest.raises(SequenceError):
+        list(parse_text('>bad\nACGTXJ\n'))
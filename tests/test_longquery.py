@@ -0,0 +1,81 @@
+"""Long-query mode against whole-query search"""
+import numpy as np
+import pytest
+
+from bioinfo.analyzer import BioinformaticsAnalyzer
+from bioinfo.fastx import FastxRecord
+from bioinfo.longquery import query_windows
+from bioinfo.results import ResultSet
+from bioinfo.sequence import PackedSequence
+
+from conftest import random_bases, reverse_complement
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return BioinformaticsAnalyzer(cache_path='')
+
+
+@pytest.fixture(scope='module')
+def scaffold(analyzer):
+    """Random bases around a plus-strand copy of one record (with a substitution and a deletion) and a
+    minus-strand copy of another"""
+    rng = np.random.default_rng(1)
+    sequences = [str(sequence) for sequence in analyzer.reference.sequences]
+    first = list(sequences[0])
+    first[300] = 'A' if first[300] != 'A' else 'C'
+    del first[700]
+    parts = [random_bases(rng, 2000).tobytes().decode(), ''.join(first), random_bases(rng, 1500).tobytes().decode(),
+             reverse_complement(sequences[3]), random_bases(rng, 999).tobytes().decode()]
+    return FastxRecord('scaffold', '', PackedSequence.encode(''.join(parts)), None)
+
+
+def summary(results):
+    return sorted(zip(results.frame['query_id'], results.frame['matched_sequence'], results.frame['bit_score'],
+                      results.frame['similarity_score']))
+
+
+def best_per_match(results):
+    """(matched sequence, bit score, E-value, similarity) of the best hit to each record or protein
+
+    A whole-query search keeps one hit per record; long-query mode also reports weaker loci elsewhere.
+    """
+    frame = results.frame.sort_values('bit_score', ascending=False, kind='stable')
+    frame = frame.drop_duplicates('matched_sequence')
+    return sorted(zip(frame['matched_sequence'], frame['bit_score'], frame['e_value'], frame['similarity_score']))
+
+
+def test_windows_cover_the_query_on_codon_boundaries():
+    spans = query_windows(10_000, 1200, 300)
+    assert spans[0][0] == 0 and spans[-1][1] == 10_000
+    assert all(start % 3 == 0 for start, _ in spans)
+    assert all(next_start < end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    assert query_windows(0, 1200, 300) == []
+    assert query_windows(500, 1200, 300) == [(0, 500)]
+    with pytest.raises(ValueError):
+        query_windows(10_000, 300, 300)
+
+
+@pytest.mark.parametrize('translated', [False, True])
+@pytest.mark.parametrize('window, overlap', [(600, 150), (1200, 300), (30_000, 1500)])
+def test_chained_hits_match_whole_query_search(analyzer, scaffold, translated, window, overlap):
+    whole = analyzer.analyze_sequence(scaffold, translated=translated)
+    chunks = list(analyzer.analyze_long_sequence(scaffold, translated=translated, window=window, overlap=overlap,
+                                                 workers=1))
+    assert best_per_match(ResultSet.concat(chunks)) == best_per_match(whole)
+
+
+def test_hits_are_labelled_with_their_query_region(analyzer, scaffold):
+    results = ResultSet.concat(analyzer.analyze_long_sequence(scaffold, window=1200, overlap=300, workers=1))
+    text = str(scaffold.sequence)
+    for query_id, region in zip(results.frame['query_id'], results.frame['input_sequence']):
+        name, _, span = query_id.partition(':')
+        start, end = map(int, span.split('-'))
+        assert name == 'scaffold'
+        assert str(region) == text[start - 1:end]
+
+
+def test_parallel_windows_match_serial_windows(analyzer, scaffold):
+    serial = ResultSet.concat(analyzer.analyze_long_sequence(scaffold, window=600, overlap=150, workers=1))
+    parallel = ResultSet.concat(analyzer.analyze_long_sequence(scaffold, window=600, overlap=150, workers=2))
+    assert summary(parallel) == summary(serial)
@@ -0,0 +1,35 @@
+"""Text report and file exports of a result set"""
+import io
+import json
+
+import pytest
+
+from bioinfo.analyzer import BioinformaticsAnalyzer
+from bioinfo.export import write_results
+from bioinfo.report import generate_comprehensive_report
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return BioinformaticsAnalyzer(cache_path='')
+
+
+@pytest.fixture(scope='module')
+def query(analyzer):
+    return str(analyzer.reference.sequences[0])[:800]
+
+
+def test_report_and_exports_cover_every_hit(analyzer, query):
+    results = analyzer.analyze_sequence(query, translated=True)
+    report = generate_comprehensive_report(results, query)
+    assert report.count('Matched Sequence:') == len(results)
+    exported = {}
+    for format in ('jsonl', 'csv'):
+        sink = io.BytesIO()
+        write_results(results, format, sink)
+        exported[format] = sink.getvalue().decode().splitlines()
+    assert len(exported['jsonl']) == len(results)
+    assert len(exported['csv']) == len(results) + 1
+    first = json.loads(exported['jsonl'][0])
+    assert first['matched_sequence'] == results[0]['matched_sequence']
+    assert first['input_sequence'] == query
@@ -0,0 +1,72 @@
+"""Seed-and-extend search"""
+import pytest
+
+from bioinfo import metrics
+from bioinfo.align import DEFAULT_SCORING
+from bioinfo.longquery import column_scores
+from bioinfo.sequence import PackedSequence
+
+from conftest import MEMBERS, reverse_complement
+
+
+def search(engine, text, **kwargs):
+    return engine.search(PackedSequence.encode(text), DEFAULT_SCORING, 1e-5, **kwargs)
+
+
+def test_exact_fragment_is_found_on_both_strands(engine, records):
+    name, text = records[5]
+    fragment = text[300:700]
+    for query, strand in ((fragment, 'Plus/Plus'), (reverse_complement(fragment), 'Plus/Minus')):
+        best = max(search(engine, query), key=lambda hit: hit['score'])
+        assert engine.reference.names[best['record']] == name
+        assert best['strand'] == strand
+        assert best['score'] == DEFAULT_SCORING.match * len(fragment)
+
+
+def test_hit_scores_match_their_alignment_columns(engine, queries):
+    for query in queries:
+        for hit in search(engine, query):
+            assert column_scores(hit['query'].codes(), hit['subject'].codes(), hit['query_index'],
+                                 hit['subject_index'], DEFAULT_SCORING).sum() == hit['score']
+
+
+def test_random_query_has_no_hits(engine, queries):
+    assert search(engine, queries[-1]) == []
+
+
+@pytest.mark.parametrize('max_hits', [1, 2, MEMBERS + 1])
+def test_top_k_matches_exhaustive_search(engine, queries, max_hits):
+    for query in queries:
+        exhaustive = sorted(search(engine, query), key=lambda hit: (-hit['score'], hit['record']))
+        top = search(engine, query, max_hits=max_hits)
+        assert len(top) == min(max_hits, len(exhaustive))
+        assert sorted(hit['score'] for hit in top) == sorted(hit['score'] for hit in exhaustive[:max_hits])
+        scores = {hit['record']: hit['score'] for hit in exhaustive}
+        assert all(scores[hit['record']] == hit['score'] for hit in top)
+
+
+def test_top_k_skips_candidates_that_cannot_beat_the_cutoff(engine, records):
+    # A whole record scores every base; no other candidate's window can pair more bases than that
+    counters = []
+    for max_hits in (None, 1):
+        with metrics.recording() as recorder:
+            hits = search(engine, records[5][1], max_hits=max_hits)
+        counters.append(recorder.snapshot()['counters'])
+    assert [hit['record'] for hit in hits] == [5]
+    assert counters[1]['extensions_skipped'] > 0
+    assert counters[1]['extensions'] < counters[0]['extensions']
+
+
+def test_modes_find_the_source_family(engine, queries, records):
+    for number, query in zip(range(0, len(records), 4), queries):
+        comprehensive = {hit['record'] for hit in search(engine, query)}
+        assert number in comprehensive
+        fast = {hit['record'] for hit in search(engine, query, mode='Fast Scan')}
+        assert number in fast and fast <= comprehensive
+        sensitive = {hit['record'] for hit in search(engine, query, mode='High Sensitivity')}
+        assert comprehensive <= sensitive
+
+
+def test_unknown_mode_is_rejected(engine, queries):
+    with pytest.raises(ValueError):
+        search(engine, queries[0], mode='Quick')
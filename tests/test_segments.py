@@ -0,0 +1,76 @@
+"""Segmented database search against one flat engine over the same live records"""
+import pytest
+
+from bioinfo.align import DEFAULT_SCORING
+from bioinfo.reference import ReferenceDatabase
+from bioinfo.search import SearchEngine
+from bioinfo import segments
+from bioinfo.segments import SegmentedEngine, apply_update, compact, init_database, read_snapshot
+from bioinfo.sequence import PackedSequence
+from bioinfo.translate import DEFAULT_PROTEINS, load_proteins
+
+from conftest import write_fasta
+
+
+def summary(engine, hits):
+    return sorted((engine.reference.names[hit['record']], hit['score'], pytest.approx(hit['e_value'], rel=1e-9),
+                   hit['strand']) for hit in hits)
+
+
+def flat_engine(records, path):
+    reference = ReferenceDatabase.from_fasta(write_fasta(path, records), None)
+    return SearchEngine(reference, proteins=load_proteins(DEFAULT_PROTEINS))
+
+
+def assert_same_hits(segmented, flat, queries):
+    for query in queries:
+        packed = PackedSequence.encode(query)
+        for max_hits in (None, 2):
+            assert (summary(segmented, segmented.search(packed, DEFAULT_SCORING, 1e-5, max_hits=max_hits)) ==
+                    summary(flat, flat.search(packed, DEFAULT_SCORING, 1e-5, max_hits=max_hits)))
+
+
+def test_updates_and_compaction_match_a_flat_database(records, queries, tmp_path):
+    directory = str(tmp_path / 'db')
+    init_database(directory, write_fasta(tmp_path / 'base.fasta', records[:18]), None, DEFAULT_PROTEINS)
+    before = SegmentedEngine(directory)
+    assert_same_hits(before, flat_engine(records[:18], tmp_path / 'flat-base.fasta'), queries)
+
+    # Add the other records, replace one with its first half and retire another
+    replaced = (records[1][0], records[1][1][:750])
+    update = write_fasta(tmp_path / 'update.fasta', records[18:] + [replaced])
+    version, added, removed = apply_update(directory, update, retire=[records[2][0]], background_compaction=False)
+    assert (added, removed) == (len(records) - 18 + 1, 2)
+    live = [replaced if name == replaced[0] else (name, text) for name, text in records if name != records[2][0]]
+    flat = flat_engine(live, tmp_path / 'flat-live.fasta')
+    updated = SegmentedEngine(directory)
+    assert updated.version == version and len(read_snapshot(directory)['segments']) == 2
+    assert_same_hits(updated, flat, queries)
+
+    # A reader of the old snapshot keeps searching it
+    assert_same_hits(before, flat_engine(records[:18], tmp_path / 'flat-base.fasta'), queries[:2])
+
+    compact(directory)
+    compacted = SegmentedEngine(directory)
+    assert len(read_snapshot(directory)['segments']) == 1
+    assert_same_hits(compacted, flat, queries)
+
+
+def test_superseded_files_outlive_the_grace_period(records, queries, tmp_path, monkeypatch):
+    directory = tmp_path / 'db'
+    init_database(str(directory), write_fasta(tmp_path / 'base.fasta', records[:18]), None, DEFAULT_PROTEINS)
+    first = read_snapshot(str(directory))['name']
+    apply_update(str(directory), write_fasta(tmp_path / 'update.fasta', records[18:]), background_compaction=False)
+    compact(str(directory))
+    files = sorted(entry.name for entry in directory.iterdir() if entry.name.startswith(('snapshot-', 'segment-')))
+    assert len(files) == 6
+    # A reader that read CURRENT just before the compaction can still load what it named
+    assert_same_hits(SegmentedEngine(str(directory), first),
+                     flat_engine(records[:18], tmp_path / 'flat-base.fasta'), queries[:2])
+
+    monkeypatch.setattr(segments, 'GRACE_SECONDS', 0)
+    compact(str(directory))
+    live = read_snapshot(str(directory))
+    assert sorted(entry.name for entry in directory.iterdir() if entry.name.startswith(('snapshot-', 'segment-'))) == \
+        [segment['file'] for segment in live['segments']] + [live['name']]
+    assert_same_hits(SegmentedEngine(str(directory)), flat_engine(records, tmp_path / 'flat.fasta'), queries[:2])
@@ -0,0 +1,16 @@
+"""Packed sequences"""
+from bioinfo.sequence import PackedSequence
+
+
+def test_packed_sequence_round_trips_iupac_symbols():
+    text = 'ACGTNRYACGTTGCAWSKMBDHVN' * 5
+    packed = PackedSequence.encode(text)
+    assert len(packed) == len(text)
+    assert packed.decode() == text
+    assert packed.decode(7, 31) == text[7:31]
+    assert packed.slice(3, 40).decode() == text[3:40]
+
+
+def test_reverse_complement():
+    assert PackedSequence.encode('AACGTN').reverse_complement().decode() == 'NACGTT'
+    assert PackedSequence.encode('ACGRY').reverse_complement().reverse_complement().decode() == 'ACGRY'
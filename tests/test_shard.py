@@ -0,0 +1,84 @@
+"""Sharded search against one flat engine, with every shard served from its own local process"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bioinfo.align import DEFAULT_SCORING
+from bioinfo.reference import DEFAULT_REFERENCE, ReferenceDatabase
+from bioinfo.sequence import PackedSequence
+from bioinfo.shard import (DEFAULT_AUTHKEY, POOL_SIZE, ShardedEngine, ShardError, build_shards, check_exposure,
+                           is_loopback, start_local_shards)
+from bioinfo.translate import DEFAULT_PROTEINS
+
+SHARDS = 3
+
+
+def summary(engine, hits, key='record', names=None):
+    """Engine-independent view of hits: (name, score, E-value, strand or frame)"""
+    names = names or engine.reference.names
+    return sorted((names[hit[key]], hit['score'], pytest.approx(hit['e_value'], rel=1e-9),
+                   hit.get('strand', hit.get('frame'))) for hit in hits)
+
+
+@pytest.fixture(scope='module')
+def sharded(reference_fasta, tmp_path_factory):
+    paths = build_shards(reference_fasta, None, DEFAULT_PROTEINS, str(tmp_path_factory.mktemp('shards')),
+                         shards=SHARDS)
+    addresses, processes = start_local_shards(paths)
+    try:
+        yield ShardedEngine(addresses)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def test_shards_split_the_reference(sharded, engine):
+    assert len(sharded.addresses) == SHARDS
+    assert sorted(sharded.reference.names) == sorted(engine.reference.names)
+    assert sharded.db_length == engine.db_length
+
+
+@pytest.mark.parametrize('max_hits', [None, 2])
+def test_sharded_search_matches_flat_search(sharded, engine, queries, max_hits):
+    for query in queries:
+        packed = PackedSequence.encode(query)
+        expected = engine.search(packed, DEFAULT_SCORING, 1e-5, max_hits=max_hits)
+        hits = sharded.search(packed, DEFAULT_SCORING, 1e-5, max_hits=max_hits)
+        assert summary(sharded, hits) == summary(engine, expected)
+        for hit in hits:
+            assert hit['query'] == (packed if hit['strand'] == 'Plus/Plus' else packed.reverse_complement())
+
+
+def test_concurrent_searches_use_their_own_connections(sharded, queries):
+    packed = [PackedSequence.encode(query) for query in queries] * 3
+    expected = [summary(sharded, sharded.search(query, DEFAULT_SCORING, 1e-5)) for query in packed]
+    with ThreadPoolExecutor(6) as pool:
+        results = list(pool.map(lambda query: summary(sharded, sharded.search(query, DEFAULT_SCORING, 1e-5)),
+                                packed))
+    assert results == expected
+    assert 1 <= len(sharded._idle) <= POOL_SIZE
+
+
+def test_sharded_translated_search_matches_flat_search(sharded, engine):
+    packed = ReferenceDatabase.from_fasta(DEFAULT_REFERENCE, None).sequences[0]
+    expected = engine.search_translated(packed, evalue_threshold=1e-5)
+    hits = sharded.search_translated(packed, evalue_threshold=1e-5)
+    assert expected
+    assert summary(sharded, hits, 'protein', sharded.protein_names) == summary(
+        engine, expected, 'protein', engine.protein_names)
+
+
+def test_loopback_hosts():
+    assert is_loopback('127.0.0.1')
+    assert is_loopback('localhost')
+    assert is_loopback('::1')
+    assert not is_loopback('0.0.0.0')
+    assert not is_loopback('')
+
+
+def test_default_key_only_serves_loopback():
+    check_exposure('127.0.0.1', DEFAULT_AUTHKEY)
+    check_exposure('0.0.0.0', b'a secret key')
+    with pytest.raises(ShardError, match='BIOINFO_SHARD_KEY'):
+        check_exposure('0.0.0.0', DEFAULT_AUTHKEY)
@@ -0,0 +1,123 @@
+"""Cross-reference resolution against a local stub server"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from bioinfo.xref import SOURCES, CrossReferenceFetcher, Source
+
+CLINVAR = {'12345': 'NM_000546.6(TP53):c.215C>G'}
+PUBMED = {'28123456': 'A study of TP53'}
+NUCCORE = {'NM_000546.6': ('1000', 'Homo sapiens tumor protein p53 (TP53), mRNA')}
+ENSEMBL = {'ENSG00000141510': {'display_name': 'TP53', 'description': 'tumor protein p53'}}
+UNIPROT = {'P04637': 'Cellular tumor antigen p53'}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers the E-utilities, Ensembl and UniProt requests the fetcher sends; dbSNP always fails"""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, query))
+        if url.path == '/entrez/eutils/esummary.fcgi':
+            ids = query['id'].split(',')
+            if query['db'] == 'snp':
+                return self.reply(500, {'error': 'unavailable'})
+            result = {'uids': []}
+            for uid in ids:
+                if query['db'] == 'nuccore' and uid in NUCCORE:
+                    gi, title = NUCCORE[uid]
+                    result['uids'].append(gi)
+                    result[gi] = {'accessionversion': uid, 'title': title}
+                elif uid in {'clinvar': CLINVAR, 'pubmed': PUBMED}.get(query['db'], {}):
+                    result['uids'].append(uid)
+                    result[uid] = {'title': {'clinvar': CLINVAR, 'pubmed': PUBMED}[query['db']][uid]}
+            return self.reply(200, {'result': result})
+        if url.path == '/uniprotkb/accessions':
+            return self.reply(200, {'results': [
+                {'primaryAccession': accession, 'proteinDescription': {'recommendedName': {'fullName': {
+                    'value': UNIPROT[accession]}}}}
+                for accession in query['accessions'].split(',') if accession in UNIPROT]})
+        self.reply(404, {})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, payload))
+        self.reply(200, {stable_id: ENSEMBL.get(stable_id) for stable_id in payload['ids']})
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fetcher(stub):
+    return CrossReferenceFetcher(base_url='http://%s:%d' % stub.server_address, timeout=5)
+
+
+def test_resolves_each_source(fetcher):
+    resolved = fetcher.resolve([('clinvar_id', 'VCV000012345'), ('pubmed_pmid', '28123456'),
+                                ('genbank_accession', 'NM_000546.6'), ('ensembl_id', 'ENSG00000141510'),
+                                ('uniprot_id', 'P04637'), ('uniprot_id', 'P99999')])
+    assert resolved[('clinvar_id', 'VCV000012345')]['summary'] == CLINVAR['12345']
+    assert resolved[('pubmed_pmid', '28123456')]['summary'] == PUBMED['28123456']
+    assert resolved[('genbank_accession', 'NM_000546.6')]['summary'] == NUCCORE['NM_000546.6'][1]
+    assert resolved[('ensembl_id', 'ENSG00000141510')]['summary'] == 'TP53 tumor protein p53'
+    assert resolved[('uniprot_id', 'P04637')] == {'source': 'UniProt', 'id': 'P04637', 'status': 'ok',
+                                                  'summary': UNIPROT['P04637']}
+    assert resolved[('uniprot_id', 'P99999')]['status'] == 'not_found'
+
+
+def test_errors_and_unsupported_keys_are_reported(fetcher):
+    resolved = fetcher.resolve([('dbsnp_id', 'rs28934578'), ('omim_id', '191170'), ('unknown_id', 'x')])
+    assert resolved[('dbsnp_id', 'rs28934578')]['status'] == 'error'
+    assert resolved[('omim_id', '191170')]['status'] == ('skipped' if not SOURCES['omim_id'].enabled else 'error')
+    assert resolved[('unknown_id', 'x')]['status'] == 'skipped'
+
+
+def test_requests_are_batched_and_answers_cached(stub):
+    source = SOURCES['uniprot_id']
+    sources = {'uniprot_id': Source(source.name, source.citation_key, source.url, 2, source.build, source.parse)}
+    fetcher = CrossReferenceFetcher(sources, base_url='http://%s:%d' % stub.server_address, timeout=5)
+    pairs = [('uniprot_id', accession) for accession in ('P04637', 'P1', 'P2', 'P3', 'P04637')]
+    progress = []
+    first = fetcher.resolve(pairs, lambda done, total: progress.append((done, total)))
+    assert len(stub.requests) == 2
+    assert progress[-1] == (2, 2)
+    assert fetcher.resolve(pairs) == first
+    assert len(stub.requests) == 2
+
+
+def test_failed_lookups_are_retried(fetcher, stub):
+    fetcher.resolve([('dbsnp_id', 'rs1')])
+    fetcher.resolve([('dbsnp_id', 'rs1')])
+    assert len(stub.requests) == 2
+
+
+def test_resolve_citations_keeps_the_citation_order(fetcher):
+    entries = fetcher.resolve_citations([{'uniprot_id': 'P04637', 'pubmed_pmid': 28123456}, {}])
+    assert [entry['source'] for entry in entries[0]] == ['UniProt', 'PubMed']
+    assert entries[1] == []